@@ -0,0 +1,80 @@
+"""
+Compiled formula kernels (formulas.py)
+Times EngineIEC62305.compute_all_risks() on synthetic studies (zones with
+random flags and R2/R4 overrides, so several kernel variants are used),
+also without the intermediate values (report=False, what portfolio rows
+need), and BatchEngineIEC62305.compute_all_risks() on many studies. The
+first call is timed with an empty kernel cache: it includes compiling the
+kernels, which happens once per zone variant and process.
+
+Usage: python benchmarks/bench_formulas.py
+"""
+import random
+import time
+from dataclasses import replace
+
+from synthetic import make_study
+from iec_62305 import EngineIEC62305
+from batch_engine import BatchEngineIEC62305
+import formulas
+
+ZONES = [1, 10, 60, 250]
+BATCH_STUDIES = [100, 1_000, 10_000]
+OVERRIDE_SHARE = 0.2  # Zones with R2/R4 overrides and flags set
+
+
+def best_time(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def varied(zones, seed: int):
+    """Zones with some flags and overrides set, so several kernel variants are used"""
+    rng = random.Random(seed)
+    out = []
+    for z in zones:
+        if rng.random() < OVERRIDE_SHARE:
+            z = replace(z, is_hospital=rng.random() < 0.5, has_animal_loss=rng.random() < 0.5,
+                        nz_r2=z.nz / 2, uw_r2=2.0, rt_r4=1e-3)
+        out.append(z)
+    return out
+
+
+def main():
+    start = time.perf_counter()
+    for risks in [tuple(formulas.RISKS)] + [(risk,) for risk in formulas.RISKS]:
+        formulas.vector_kernel(risks)
+    print(f"vectorized kernels compiled in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    print(f"\n{'zones':>6} {'first ms':>9} {'all ms':>9} {'components ms':>14} {'zones/s':>9} {'variants':>9}")
+    for n_zones in ZONES:
+        geom, zones, lines = make_study(n_zones, 2, seed=n_zones)
+        engine = EngineIEC62305(geom, varied(zones, n_zones), lines)
+        formulas._scalar_kernels.clear()
+        start = time.perf_counter()
+        engine.compute_all_risks()
+        t_first = time.perf_counter() - start
+        t_all = best_time(engine.compute_all_risks)
+        t_short = best_time(lambda: engine.compute_all_risks(report=False))
+        variants = len({formulas.zone_signature(z) for z in engine.zones})
+        print(f"{n_zones:>6} {t_first * 1e3:>9.3f} {t_all * 1e3:>9.3f} {t_short * 1e3:>14.3f} "
+              f"{n_zones / t_all:>9.0f} {variants:>9}")
+    print(f"scalar kernels compiled: {len(formulas._scalar_kernels)}")
+
+    print(f"\n{'studies':>8} {'zones':>7} {'batch ms':>9} {'zones/s':>10}")
+    for n in BATCH_STUDIES:
+        studies = []
+        for k in range(n):
+            geom, zones, lines = make_study(5, 2, seed=k)
+            studies.append((geom, varied(zones, k), lines))
+        batch = BatchEngineIEC62305.from_studies(studies)
+        t_batch = best_time(batch.compute_all_risks)
+        print(f"{n:>8} {batch.n_zones:>7} {t_batch * 1e3:>9.2f} {batch.n_zones / t_batch:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Import-time benchmark for the headless modules
+Imports each module in a fresh interpreter (best of several runs), reports
+the time on top of a bare interpreter start and lists the heavy optional
+dependencies it loaded. The headless modules must not load NumPy, Streamlit
+or difflib: those belong to the batch, UI and fuzzy-matching features and
+are imported when they are used. Each module also has an import-time
+budget (BUDGET_MS, about twice the time measured on a development laptop;
+--budget-scale adjusts them for slower machines). Exit status 1 if a module
+loads a heavy dependency or exceeds its budget.
+
+Usage: python benchmarks/bench_import.py [--repeat 7] [--budget-scale 1.0]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import synthetic  # noqa: F401  (puts the repository root on sys.path)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Headless module -> import-time budget (ms)
+BUDGET_MS = {
+    "tables": 10, "iec_62305": 60, "table_registry": 30, "portfolio": 80, "incremental": 150,
+    "sensitivity": 80, "optimizer": 160, "cache": 100, "profiling": 80, "service": 200,
+    "jobs": 160, "sharding": 130, "formulas": 80, "report": 200,
+}
+HEADLESS = list(BUDGET_MS)
+BATCH_BUDGET_MS = 250  # iec_62305 plus the NumPy batch engine on first use
+HEAVY = ["numpy", "streamlit", "difflib"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1e3, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(statement: str, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(statement=statement, heavy=HEAVY)],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        result = json.loads(out)
+        if best is None or result["ms"] < best["ms"]:
+            best = result
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import time of the headless modules")
+    parser.add_argument("--repeat", type=int, default=7, help="Fresh interpreters per module (best is kept)")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiplier of every budget")
+    args = parser.parse_args(argv)
+
+    print(f"{'module':<16} {'ms':>8} {'budget':>8}  heavy dependencies loaded")
+    failures, slow = [], []
+    for module in HEADLESS:
+        result = probe(f"import {module}", args.repeat)
+        budget = BUDGET_MS[module] * args.budget_scale
+        print(f"{module:<16} {result['ms']:>8.1f} {budget:>8.0f}  {', '.join(result['heavy']) or '-'}")
+        if result["heavy"]:
+            failures.append(module)
+        if result["ms"] > budget:
+            slow.append(module)
+    # The optional NumPy features load on first use
+    result = probe("import iec_62305; iec_62305.BatchEngineIEC62305", args.repeat)
+    budget = BATCH_BUDGET_MS * args.budget_scale
+    print(f"{'+ batch engine':<16} {result['ms']:>8.1f} {budget:>8.0f}  {', '.join(result['heavy']) or '-'}")
+    if result["ms"] > budget:
+        slow.append("+ batch engine")
+    if failures:
+        print(f"heavy dependencies imported by: {', '.join(failures)}", file=sys.stderr)
+    if slow:
+        print(f"over the import-time budget: {', '.join(slow)}", file=sys.stderr)
+    return 1 if failures or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Zone memory benchmark
+Retained memory per zone (tracemalloc) of:
+  dict     - ZoneParameters fields in a regular (non-slotted) dataclass,
+             the layout used before the parameter classes were slotted
+  slots    - frozen slotted ZoneParameters
+  table    - ZoneTable typed array columns
+plus the time of one compute_all_risks() over each form.
+
+Usage: python benchmarks/bench_memory.py
+"""
+import gc
+import random
+import time
+import tracemalloc
+from dataclasses import MISSING, field, fields, make_dataclass
+
+from synthetic import make_geometry, make_line, make_zone
+from iec_62305 import ZoneParameters, EngineIEC62305
+from zone_table import ZoneTable
+
+SIZES = [10_000, 100_000]
+
+DictZone = make_dataclass("DictZone", [
+    (f.name, f.type) if f.default is MISSING else (f.name, f.type, field(default=f.default))
+    for f in fields(ZoneParameters)
+])
+
+
+def retained(build) -> tuple:
+    """(bytes retained by the object returned by build, the object)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, obj
+
+
+def zones_of(n: int):
+    rng = random.Random(n)
+    return [make_zone(rng, i, 0.2, 0.1) for i in range(n)]
+
+
+def main():
+    rng = random.Random(0)
+    geom = make_geometry(rng)
+    lines = [make_line(rng, j) for j in range(3)]
+
+    print(f"{'zones':>8} {'form':>6} {'MB':>9} {'B/zone':>8} {'compute s':>10}")
+    for n in SIZES:
+        builders = {
+            "dict": lambda: [DictZone(**{f.name: getattr(z, f.name) for f in fields(z)}) for z in zones_of(n)],
+            "slots": lambda: zones_of(n),
+            "table": lambda: ZoneTable.from_zones(zones_of(n)),
+        }
+        for form, build in builders.items():
+            size, zones = retained(build)
+            start = time.perf_counter()
+            EngineIEC62305(geom, zones, lines).compute_all_risks()
+            t = time.perf_counter() - start
+            print(f"{n:>8} {form:>6} {size / 2**20:>9.1f} {size / n:>8.0f} {t:>10.2f}")
+            del zones
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Ng raster lookup benchmark
+Writes a synthetic national-size Ng grid, then times batch lookups of
+random sites and reports how many tiles were read from the memory map.
+
+Usage: python benchmarks/bench_ng_raster.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401  (puts the repository root on sys.path)
+from ng_raster import NgRaster, write_ng_grid
+
+GRID = (2000, 2000)  # 0.01° cells
+SITES = [1_000, 10_000, 100_000]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    path = os.path.join(tempfile.mkdtemp(), "ng.ngr")
+    write_ng_grid(path, rng.uniform(0.5, 10.0, GRID), north=12.0, west=-80.0, cell_lat=0.01, cell_lon=0.01)
+    south, west, north, east = NgRaster(path).bounds
+
+    print(f"{'sites':>8} {'method':>9} {'ms':>9} {'µs/site':>8} {'tiles read':>11}")
+    for n in SITES:
+        lat = rng.uniform(south, north, n)
+        lon = rng.uniform(west, east, n)
+        for method in ("nearest", "bilinear"):
+            raster = NgRaster(path)
+            start = time.perf_counter()
+            raster.lookup_many(lat, lon, method)
+            t = time.perf_counter() - start
+            print(f"{n:>8} {method:>9} {t * 1e3:>9.2f} {t * 1e6 / n:>8.2f} {raster.stats['tile_reads']:>11}")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Report and export throughput
+Times the HTML report, the component CSV and the XLSX workbook of
+single-structure synthetic studies (the engine results are computed
+beforehand and reported separately), and the peak memory traced while
+writing against the size of the written document: the writers stream zone
+by zone, so the peak stays far below the document size.
+
+Usage: python benchmarks/bench_report.py
+"""
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import make_study
+from portfolio import Study
+import report
+
+ZONES = [200, 2_000, 10_000]
+
+
+class Sink:
+    """Text stream that only counts what is written"""
+
+    def __init__(self):
+        self.chars = 0
+
+    def write(self, text: str):
+        self.chars += len(text)
+
+
+def html(evaluated):
+    sink = Sink()
+    report.write_html_report(sink, evaluated)
+    return sink.chars
+
+
+def components_csv(evaluated):
+    sink = Sink()
+    report.write_csv(sink, evaluated, "components")
+    return sink.chars
+
+
+def xlsx(evaluated):
+    with tempfile.TemporaryFile() as f:
+        report.write_xlsx(f, evaluated)
+        return f.tell()
+
+
+def peak_mb(fn, *args) -> float:
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    print(f"{'zones':>6} {'engine s':>9} {'export':>11} {'seconds':>8} {'zones/s':>8} "
+          f"{'size MB':>8} {'peak MB':>8}")
+    for n_zones in ZONES:
+        geom, zones, lines = make_study(n_zones, 2, seed=n_zones)
+        study = Study(f"S{n_zones}", geom, zones, lines)
+        start = time.perf_counter()
+        evaluated = list(report.evaluate([study]))
+        engine_s = time.perf_counter() - start
+        for name, fn in (("html", html), ("csv", components_csv), ("xlsx", xlsx)):
+            start = time.perf_counter()
+            size = fn(evaluated)
+            seconds = time.perf_counter() - start
+            print(f"{n_zones:>6} {engine_s:>9.3f} {name:>11} {seconds:>8.3f} {n_zones / seconds:>8.0f} "
+                  f"{size / 2**20:>8.1f} {peak_mb(fn, evaluated):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
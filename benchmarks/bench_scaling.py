@@ -0,0 +1,38 @@
+"""
+Zone/line scaling benchmark for EngineIEC62305.compute_all_risks()
+Line frequencies are summed once per study, so the cost should grow
+with zones + lines, not zones × lines.
+
+Usage: python benchmarks/bench_scaling.py
+"""
+import time
+
+from synthetic import make_study
+from iec_62305 import EngineIEC62305
+
+ZONES = [1, 10, 60, 250]
+LINES = [1, 12, 50]
+
+
+def best_time(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'zones':>6} {'lines':>6} {'ms':>10} {'µs/(z+l)':>10} {'µs/(z·l)':>10}")
+    for n_zones in ZONES:
+        for n_lines in LINES:
+            geom, zones, lines = make_study(n_zones, n_lines, seed=n_zones * 1000 + n_lines)
+            engine = EngineIEC62305(geom, zones, lines)
+            t = best_time(engine.compute_all_risks)
+            print(f"{n_zones:>6} {n_lines:>6} {t * 1e3:>10.3f} "
+                  f"{t * 1e6 / (n_zones + n_lines):>10.2f} {t * 1e6 / (n_zones * n_lines):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+HTTP service benchmark (localhost)
+Starts RiskService in this process, then measures single-study requests
+from several client threads over keep-alive connections and batch requests
+of increasing size. Prints studies/s and the server-side latency percentiles.
+
+Usage: python benchmarks/bench_service.py [--workers N]
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from dataclasses import asdict
+
+from synthetic import make_study
+from service import RiskService
+
+CLIENTS = 4
+SINGLE_REQUESTS = 500  # Per client
+BATCH_SIZES = [100, 1000, 10000]
+
+
+def study_dict(seed: int) -> dict:
+    geom, zones, lines = make_study(3, 2, seed=seed)
+    return {"id": f"B-{seed}", "geometry": asdict(geom),
+            "lines": [asdict(l) for l in lines], "zones": [asdict(z) for z in zones]}
+
+
+def post(conn: http.client.HTTPConnection, path: str, payload) -> dict:
+    body = json.dumps(payload)
+    conn.request("POST", path, body, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    if response.status != 200:
+        raise RuntimeError(data)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    server = RiskService("127.0.0.1", 0, args.workers)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    studies = [study_dict(seed) for seed in range(max(BATCH_SIZES))]
+
+    def client(k: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        for i in range(SINGLE_REQUESTS):
+            post(conn, "/v1/risks?detail=totals", studies[(k * SINGLE_REQUESTS + i) % len(studies)])
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(CLIENTS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    t = time.perf_counter() - start
+    print(f"single: {CLIENTS * SINGLE_REQUESTS} requests, {CLIENTS} clients: "
+          f"{CLIENTS * SINGLE_REQUESTS / t:,.0f} studies/s")
+
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for size in BATCH_SIZES:
+        start = time.perf_counter()
+        results = post(conn, "/v1/risks/batch?detail=totals", {"studies": studies[:size]})["results"]
+        t = time.perf_counter() - start
+        assert len(results) == size
+        print(f"batch {size:>6}: {t * 1e3:8.1f} ms  {size / t:,.0f} studies/s")
+
+    conn.request("GET", "/v1/stats")
+    print(json.dumps(json.loads(conn.getresponse().read())["endpoints"], indent=1))
+    conn.close()
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Study file benchmark
+Saves a synthetic portfolio (100 zones and 2 lines per structure, up to a
+million zones) as JSON and as binary study files, then times opening each
+file, building the all-zones ZoneTable and reading one study.
+
+Usage: python benchmarks/bench_studyfile.py
+"""
+import os
+import tempfile
+import time
+
+from synthetic import make_study
+from portfolio import Study
+from zone_table import ZoneTable
+import studyfile
+
+STRUCTURES = [100, 1_000, 10_000]
+JSON_MAX = 100  # JSON is only timed up to this many structures
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def main():
+    base = []
+    for seed in range(20):
+        geom, zones, lines = make_study(100, 2, seed=seed)
+        base.append((geom, ZoneTable.from_zones(zones), lines))
+    folder = tempfile.mkdtemp()
+
+    print(f"{'zones':>9} {'variant':>12} {'MB':>8} {'save s':>8} {'open ms':>9} {'table ms':>9} {'study ms':>9}")
+    for n in STRUCTURES:
+        studies = [Study(f"B{k}", *base[k % len(base)]) for k in range(n)]
+        variants = [("binary", None, ".i62s"), ("binary+zlib", "zlib", ".i62s")]
+        if n <= JSON_MAX:
+            variants.append(("json", None, ".json"))
+        for label, compression, suffix in variants:
+            path = os.path.join(folder, f"portfolio{suffix}")
+            _, t_save = timed(lambda: studyfile.save(path, studies, compression=compression))
+            loaded, t_open = timed(lambda: studyfile.load(path))
+            if label == "json":
+                _, t_table = timed(lambda: [ZoneTable.from_zones(s.zones) for s in loaded])
+            else:
+                _, t_table = timed(loaded.zone_table)
+            _, t_study = timed(lambda: loaded[n // 2])
+            print(f"{n * 100:>9} {label:>12} {os.path.getsize(path) / 2**20:>8.1f} {t_save:>8.2f} "
+                  f"{t_open * 1e3:>9.2f} {t_table * 1e3:>9.1f} {t_study * 1e3:>9.3f}")
+            if hasattr(loaded, "close"):
+                loaded.close()
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
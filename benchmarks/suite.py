@@ -0,0 +1,271 @@
+"""
+Benchmark suite for EngineIEC62305
+For every (zones, lines) case of a synthetic grid (critical/hospital and
+animal-loss zones included) it times compute_risk_R1/R2/R4 on their own and
+compute_all_risks(), and records the peak traced memory of
+compute_all_risks(). Each of them runs once untimed first, so compiling
+its zone kernels (formulas.py) is not in the figures. Before timing, every
+engine (GOLDEN_ENGINES: scalar, batch, incremental through its update
+path) is checked against the golden corpus (golden.json: fixed inputs and reference results), so a
+speed-up in any of them that changes the numbers fails the run.
+
+Usage:
+  python benchmarks/suite.py                      # full grid, JSON to stdout
+  python benchmarks/suite.py --quick -o run.json  # small grid
+  python benchmarks/suite.py --compare run.json   # speed ratios against an earlier run
+  python benchmarks/suite.py --update-golden      # rewrite golden.json
+Exit status 1 when a golden result differs.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+
+from synthetic import make_study
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters, EngineIEC62305
+from batch_engine import BatchEngineIEC62305
+from incremental import IncrementalEngineIEC62305
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(HERE, "golden.json")
+
+ZONES = [1, 10, 100, 1000, 10000]
+LINES = [1, 10, 50]
+QUICK_ZONES = [1, 10, 100]
+QUICK_LINES = [1, 10]
+
+# Golden corpus: small studies covering lines/no lines and every zone flag
+GOLDEN_CASES = [(n_zones, n_lines, seed) for seed, (n_zones, n_lines) in enumerate(
+    [(z, l) for z in (1, 2, 5) for l in (0, 1, 3)] * 2)]
+RISKS = ("R1", "R2", "R4")
+REL_TOL = 1e-12
+
+
+# ========================================
+# === GOLDEN CORPUS ===
+# ========================================
+
+def _zone_values(zone_data: dict) -> dict:
+    return {k: v for k, v in zone_data.items() if not isinstance(v, bool)}
+
+
+def build_golden() -> list:
+    corpus = []
+    for n_zones, n_lines, seed in GOLDEN_CASES:
+        # Critical and animal ratios of 0.5 exercise the conditional components
+        geom, zones, lines = make_study(n_zones, n_lines, seed=seed, critical_ratio=0.5, animal_ratio=0.5)
+        results = EngineIEC62305(geom, zones, lines).compute_all_risks()
+        corpus.append({
+            "geometry": asdict(geom),
+            "zones": [asdict(z) for z in zones],
+            "lines": [asdict(l) for l in lines],
+            "expected": {
+                risk: {
+                    "total": results[risk]["total"],
+                    "zones": {name: _zone_values(d) for name, d in results[risk]["zones"].items()},
+                }
+                for risk in RISKS
+            },
+        })
+    return corpus
+
+
+def _close(a: float, b: float) -> bool:
+    return math.isclose(a, b, rel_tol=REL_TOL, abs_tol=1e-300)
+
+
+def _batch_results(geom, zones, lines) -> dict:
+    """BatchEngineIEC62305 results of one study in the per-zone form of EngineIEC62305"""
+    results = BatchEngineIEC62305.from_studies([(geom, zones, lines)]).compute_all_risks()
+    return {
+        risk: {"total": float(result["total"][0]),
+               "zones": {z.name: {key: values[k].item() for key, values in result["zones"].items()}
+                         for k, z in enumerate(zones)}}
+        for risk, result in results.items()
+    }
+
+
+def _incremental_results(geom, zones, lines) -> dict:
+    """
+    IncrementalEngineIEC62305 results reached through update(): the engine
+    starts from default parameters and every field is set to the study's value
+    """
+    start_geom = GeometricParameters(L=1.0, W=1.0, H=1.0)
+    engine = IncrementalEngineIEC62305(start_geom, [ZoneParameters(name=z.name) for z in zones],
+                                       [LineParameters(name=l.name, length=1.0) for l in lines])
+    for name, value in asdict(geom).items():
+        if getattr(start_geom, name) != value:
+            engine.update(None, name, value)
+    for j, line in enumerate(lines):
+        for name, value in asdict(line).items():
+            if getattr(engine.lines[j], name) != value:
+                engine.update_line(j, name, value)
+    for i, zone in enumerate(zones):
+        for name, value in asdict(zone).items():
+            if getattr(engine.zones[i], name) != value:
+                engine.update(i, name, value)
+    return engine.results
+
+
+GOLDEN_ENGINES = {
+    "EngineIEC62305": lambda geom, zones, lines: EngineIEC62305(geom, zones, lines).compute_all_risks(),
+    "BatchEngineIEC62305": _batch_results,
+    "IncrementalEngineIEC62305": _incremental_results,
+}
+
+
+def check_golden(corpus: list, engines: dict = GOLDEN_ENGINES) -> dict:
+    """
+    Compare every engine with every golden study; returns {"studies", "values",
+    "failures", "engines": {engine: {"values", "failures"}}} (values and
+    failures summed over the engines, each failure naming its engine)
+    """
+    failures, values, per_engine = [], 0, {}
+    for engine, evaluate in engines.items():
+        engine_failures, engine_values = [], 0
+        for k, case in enumerate(corpus):
+            geom = GeometricParameters(**case["geometry"])
+            zones = [ZoneParameters(**z) for z in case["zones"]]
+            lines = [LineParameters(**l) for l in case["lines"]]
+            results = evaluate(geom, zones, lines)
+            for risk, expected in case["expected"].items():
+                engine_values += 1
+                if not _close(results[risk]["total"], expected["total"]):
+                    engine_failures.append({"engine": engine, "study": k, "risk": risk, "key": "total",
+                                            "expected": expected["total"], "got": results[risk]["total"]})
+                for name, keys in expected["zones"].items():
+                    for key, value in keys.items():
+                        engine_values += 1
+                        got = results[risk]["zones"][name][key]
+                        if not _close(got, value):
+                            engine_failures.append({"engine": engine, "study": k, "risk": risk, "zone": name,
+                                                    "key": key, "expected": value, "got": got})
+        per_engine[engine] = {"values": engine_values, "failures": len(engine_failures)}
+        failures += engine_failures
+        values += engine_values
+    return {"studies": len(corpus), "values": values, "failures": failures, "engines": per_engine}
+
+
+# ========================================
+# === TIMING ===
+# ========================================
+
+def best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(fn) -> int:
+    """Peak traced memory (bytes) allocated while fn runs"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(n_zones: int, n_lines: int, repeat: int) -> dict:
+    geom, zones, lines = make_study(n_zones, n_lines, seed=n_zones * 1000 + n_lines)
+    engine = EngineIEC62305(geom, zones, lines)
+    # Fewer repeats on the large cases keep the full grid within a few minutes
+    repeat = max(1, repeat if n_zones * (n_lines + 1) < 50_000 else repeat // 3)
+    out = {"zones": n_zones, "lines": n_lines, "repeat": repeat}
+    passes = (("R1", engine.compute_risk_R1), ("R2", engine.compute_risk_R2),
+              ("R4", engine.compute_risk_R4), ("all", engine.compute_all_risks))
+    for _, fn in passes:
+        fn()  # Warm-up: compiles the kernels of this risk set and zone variants
+    for name, fn in passes:
+        out[f"{name}_ms"] = best_time(fn, repeat) * 1e3
+    out["all_us_per_zone"] = out["all_ms"] * 1e3 / n_zones
+    out["peak_kb"] = peak_memory(engine.compute_all_risks) / 1024
+    return out
+
+
+def compare(previous: dict, cases: list):
+    """Print the compute_all_risks() time ratio (new / previous) for the cases of both runs"""
+    before = {(c["zones"], c["lines"]): c for c in previous["cases"]}
+    print(f"vs {previous['meta'].get('commit') or previous['meta']['timestamp']}:", file=sys.stderr)
+    for case in cases:
+        old = before.get((case["zones"], case["lines"]))
+        if old:
+            print(f"{case['zones']:>6} zones {case['lines']:>3} lines: "
+                  f"all ×{case['all_ms'] / old['all_ms']:.2f}  peak ×{case['peak_kb'] / old['peak_kb']:.2f}",
+                  file=sys.stderr)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="EngineIEC62305 benchmark suite")
+    parser.add_argument("-o", "--output", help="JSON results file (default: stdout)")
+    parser.add_argument("--quick", action="store_true", help="Small grid for a fast check")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats (best is kept)")
+    parser.add_argument("--compare", help="Earlier JSON results to compare with")
+    parser.add_argument("--update-golden", action="store_true", help="Rewrite golden.json and exit")
+    args = parser.parse_args(argv)
+
+    if args.update_golden:
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(build_golden(), f, ensure_ascii=False, indent=1)
+        print(f"Wrote {GOLDEN_PATH}", file=sys.stderr)
+        return 0
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = check_golden(json.load(f))
+    for engine, counts in golden["engines"].items():
+        print(f"golden {engine}: {golden['studies']} studies, {counts['values']} values, "
+              f"{counts['failures']} mismatches", file=sys.stderr)
+
+    zones_grid, lines_grid = (QUICK_ZONES, QUICK_LINES) if args.quick else (ZONES, LINES)
+    cases = []
+    for n_zones in zones_grid:
+        for n_lines in lines_grid:
+            case = run_case(n_zones, n_lines, args.repeat)
+            cases.append(case)
+            print(f"{n_zones:>6} zones {n_lines:>3} lines: all {case['all_ms']:9.3f} ms "
+                  f"(R1 {case['R1_ms']:.3f} / R2 {case['R2_ms']:.3f} / R4 {case['R4_ms']:.3f}) "
+                  f"peak {case['peak_kb']:9.1f} KB", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "golden": golden,
+        "cases": cases,
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), cases)
+    text = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if golden["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Synthetic IEC 62305-2 studies for benchmarks
+Deterministic (seeded) structures, zones and lines drawn from tables.py
+"""
+import os
+import random
+import sys
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tables as T
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters
+
+
+def _pick(rng: random.Random, table: dict) -> float:
+    return rng.choice(list(table.values()))
+
+
+def make_geometry(rng: random.Random) -> GeometricParameters:
+    return GeometricParameters(
+        L=rng.uniform(5.0, 120.0), W=rng.uniform(5.0, 80.0), H=rng.uniform(3.0, 40.0),
+        Ng=rng.uniform(0.5, 8.0), Cd=_pick(rng, T.CD_FACTOR),
+    )
+
+
+def make_line(rng: random.Random, index: int) -> LineParameters:
+    has_adjacent = rng.random() < 0.3
+    return LineParameters(
+        name=f"Línea {index + 1}",
+        length=rng.uniform(100.0, 2000.0),
+        ci=_pick(rng, T.CI_FACTOR), ce=_pick(rng, T.CE_LINE_FACTOR), ct=_pick(rng, T.CT_FACTOR),
+        Lj=rng.uniform(5.0, 30.0) if has_adjacent else 0.0,
+        Wj=rng.uniform(5.0, 30.0) if has_adjacent else 0.0,
+        Hj=rng.uniform(3.0, 15.0) if has_adjacent else 0.0,
+        Cdj=_pick(rng, T.CD_FACTOR),
+    )
+
+
+def make_zone(rng: random.Random, index: int,
+              critical_ratio: float = 0.2, animal_ratio: float = 0.1) -> ZoneParameters:
+    is_critical = rng.random() < critical_ratio
+    nt = rng.uniform(10.0, 500.0)
+    return ZoneParameters(
+        name=f"Zona {index + 1}",
+        is_explosion_risk=is_critical and rng.random() < 0.5,
+        is_hospital=is_critical,
+        pta=_pick(rng, T.PTA_VALUES), pb=_pick(rng, T.PB_VALUES),
+        rt=_pick(rng, T.RT_VALUES), nz=rng.uniform(0.0, nt), nt=nt, tz=rng.uniform(0.0, 8760.0),
+        rp=_pick(rng, T.RP_VALUES), rf=_pick(rng, T.RF_VALUES),
+        hz=_pick(rng, T.HZ_VALUES), lf1=_pick(rng, T.LF1_VALUES),
+        pspd=_pick(rng, T.PSPD_VALUES), lo1=_pick(rng, T.LO1_VALUES) if is_critical else 0.0,
+        wm1=rng.uniform(0.5, 10.0), wm2=rng.uniform(0.5, 10.0),
+        ks3=_pick(rng, T.KS3_VALUES), uw=rng.choice([1.0, 1.5, 2.5, 4.0, 6.0]),
+        ptu=_pick(rng, T.PTU_VALUES), peb=_pick(rng, T.PEB_VALUES),
+        peb_v=_pick(rng, T.PEB_VALUES), pspd_w=_pick(rng, T.PSPD_VALUES),
+        pspd_z=_pick(rng, T.PSPD_VALUES), pli=_pick(rng, T.PLI_VALUES_LP),
+        lf2=_pick(rng, T.LF2_VALUES), lo2=_pick(rng, T.LO2_VALUES),
+        has_animal_loss=rng.random() < animal_ratio,
+        ca=rng.uniform(0.0, 100.0), cb=rng.uniform(100.0, 1000.0),
+        cc=rng.uniform(10.0, 200.0), cs=rng.uniform(10.0, 200.0), ct=rng.uniform(500.0, 2000.0),
+        lf4=_pick(rng, T.LF4_VALUES), lo4=_pick(rng, T.LO4_VALUES),
+    )
+
+
+def make_study(n_zones: int, n_lines: int, seed: int = 0, critical_ratio: float = 0.2,
+               animal_ratio: float = 0.1) -> Tuple[GeometricParameters, List[ZoneParameters], List[LineParameters]]:
+    """One structure with n_zones zones and n_lines incoming lines"""
+    rng = random.Random(seed)
+    geom = make_geometry(rng)
+    zones = [make_zone(rng, i, critical_ratio, animal_ratio) for i in range(n_zones)]
+    lines = [make_line(rng, j) for j in range(n_lines)]
+    return geom, zones, lines
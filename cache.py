@@ -0,0 +1,368 @@
+"""
+IEC 62305-2 Result Cache - canonical study keys and a bounded LRU cache
+A study (GeometricParameters, zones, lines) is reduced to a canonical tuple
+of its field values: equal inputs give equal keys however the objects were
+built (ints vs floats, new dataclass instances on every Streamlit rerun).
+ResultCache is thread-safe, so one instance can be shared by every session
+of the app; cached results are shared objects and must be treated as
+read-only.
+
+DiskResultCache keeps bytes values across runs in a SQLite file, under a
+key and a version (by default ENGINE_VERSION, a digest of the engine,
+formula and table sources): editing the engine makes the old entries
+unreachable. Entries of other versions are kept (checkouts of different
+versions may share the file) and age out through the eviction, which is
+bounded in bytes and drops the least recently used entries of any version.
+Lookups and stores go in batches (get_many / put_many, one query or
+transaction per batch): a round trip per entry costs about as much as
+evaluating a small study. portfolio.py keeps the per-zone component results
+of each study there under its study_hash() (see portfolio.cached_values).
+  cache = DiskResultCache("results.sqlite", max_bytes=512 * 2**20)
+  found = cache.get_many(keys)
+  cache.put_many([(key, blob), ...])
+"""
+import hashlib
+import operator
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import fields
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import formulas
+import iec_62305
+import tables
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters, EngineIEC62305
+
+
+# Per-class getter of all field values, built once (fields() is slow on hot paths)
+_GETTERS: Dict[type, Callable] = {}
+_HASH_LAYOUTS: Dict[type, Tuple[Callable, Callable]] = {}
+_NEGATIVE_ZERO = struct.pack("<d", -0.0)
+
+
+def _values(obj) -> Tuple:
+    getter = _GETTERS.get(obj.__class__)
+    if getter is None:
+        getter = _GETTERS[obj.__class__] = operator.attrgetter(*(f.name for f in fields(obj)))
+    return getter(obj)
+
+
+def canonical_study(geom: GeometricParameters, zones: List[ZoneParameters],
+                    lines: List[LineParameters]) -> Tuple:
+    """
+    Hashable canonical form of a study (zone and line order is significant).
+    Raw values are enough as an in-process key: 10 == 10.0 == np.float64(10)
+    and -0.0 == 0.0, with equal hashes. A ZoneTable gives the key of its
+    ZoneParameters rows.
+    """
+    if hasattr(zones, "to_zones"):
+        zones = zones.to_zones()
+    return (_values(geom), tuple(map(_values, zones)), tuple(map(_values, lines or [])))
+
+
+def _tuple_getter(names: List[str]) -> Callable:
+    if not names:
+        return lambda obj: ()
+    if len(names) == 1:
+        name = names[0]
+        return lambda obj: (getattr(obj, name),)
+    return operator.attrgetter(*names)
+
+
+def _hash_layout(cls) -> Tuple[Callable, Callable]:
+    """(numeric field getter, other field getter) of a parameter class"""
+    layout = _HASH_LAYOUTS.get(cls)
+    if layout is None:
+        numeric = [f.name for f in fields(cls) if f.type in (float, int, "float", "int")]
+        other = [f.name for f in fields(cls) if f.name not in numeric]
+        layout = _HASH_LAYOUTS[cls] = (_tuple_getter(numeric), _tuple_getter(other))
+    return layout
+
+
+def study_hash(geom: GeometricParameters, zones: List[ZoneParameters], lines: List[LineParameters]) -> str:
+    """
+    Stable SHA-256 hex digest of the canonical study (same across processes and
+    machines). Numeric fields are hashed as one little-endian float64 block,
+    names, flags and optional values through their normalized repr. A
+    ZoneTable gives the digest of its ZoneParameters rows.
+    """
+    if hasattr(zones, "to_zones"):
+        zones = zones.to_zones()
+    lines = lines or []
+    numbers, others = [], []
+    for obj in (geom, *zones, *lines):
+        numeric, other = _hash_layout(obj.__class__)
+        numbers.extend(numeric(obj))
+        others.extend([v if v is None or v.__class__ is str or v.__class__ is bool else float(v) + 0.0
+                       for v in other(obj)])
+    block = struct.pack(f"<{len(numbers)}d", *numbers)
+    if _NEGATIVE_ZERO in block:  # -0.0 hashes as 0.0 (rare; the bytes may also straddle two values)
+        block = struct.pack(f"<{len(numbers)}d", *[value + 0.0 for value in numbers])
+    digest = hashlib.sha256(block)
+    digest.update(repr((len(zones), len(lines), others)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Bounded LRU cache with hit/miss/eviction counters"""
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """Cached value for key, computing and storing it on a miss"""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            # Computed outside the lock: concurrent misses may both compute, last one wins
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "size": len(self._data), "maxsize": self.maxsize,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def cached_risks(cache: ResultCache, geom: GeometricParameters, zones: List[ZoneParameters],
+                 lines: List[LineParameters], key: Optional[Hashable] = None) -> Dict:
+    """compute_all_risks() of the study, memoized in cache"""
+    key = key if key is not None else canonical_study(geom, zones, lines)
+    return cache.get_or_compute(("risks", key), lambda: EngineIEC62305(geom, zones, lines).compute_all_risks())
+
+
+def cached_sensitivities(cache: ResultCache, geom: GeometricParameters, zones: List[ZoneParameters],
+                         lines: List[LineParameters], key: Optional[Hashable] = None) -> Dict:
+    """sensitivities() of the study, memoized in cache"""
+    key = key if key is not None else canonical_study(geom, zones, lines)
+    return cache.get_or_compute(("sensitivities", key), lambda: EngineIEC62305(geom, zones, lines).sensitivities())
+
+
+# ========================================
+# === PERSISTENT CACHE ===
+# ========================================
+
+def source_digest(*paths: str, extra: str = "") -> str:
+    """Short digest of source files (and of extra)"""
+    digest = hashlib.sha256(extra.encode("utf-8"))
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+# Version tag of the cached results: changes whenever the engine, the formula spec or the tables change
+ENGINE_VERSION = source_digest(iec_62305.__file__, formulas.__file__, tables.__file__)
+
+_DISK_SCHEMA = """
+DROP TABLE IF EXISTS results;  -- Layout before entries were keyed by version
+CREATE TABLE IF NOT EXISTS entries (
+    version TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (version, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+_EVICT_BATCH = 64
+_TOUCH_BATCH = 256  # Access times are written in batches, not on every hit
+_QUERY_KEYS = 500   # Keys per SELECT of get_many (below the SQLite variable limit)
+
+
+class DiskResultCache:
+    """Persistent LRU cache (SQLite) of bytes values, bounded in bytes, with the ResultCache counters"""
+
+    def __init__(self, path: str, max_bytes: int = 256 * 2**20, version: str = ENGINE_VERSION):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be >= 1")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_DISK_SCHEMA)
+        self._bytes = self._stored_bytes()
+        self._touched: List[Tuple[float, str, str]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self._bytes > max_bytes:
+            with self._lock:
+                self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def __len__(self) -> int:
+        """Entries of this version"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries WHERE version = ?",
+                                    (self.version,)).fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM entries WHERE version = ? AND key = ?",
+                                    (self.version, key)).fetchone() is not None
+
+    def get(self, key: str, default: Optional[bytes] = None) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE version = ? AND key = ?",
+                                   (self.version, key)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self._touched.append((time.time(), self.version, key))
+            if len(self._touched) >= _TOUCH_BATCH:
+                self._flush_touched()
+            self.hits += 1
+        return row[0]
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, bytes]:
+        """Values of the keys that are cached, read with one query per _QUERY_KEYS keys"""
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_KEYS):
+                chunk = keys[start:start + _QUERY_KEYS]
+                found.update(self._db.execute(
+                    f"SELECT key, value FROM entries WHERE version = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [self.version, *chunk]).fetchall())
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            now = time.time()
+            self._touched.extend((now, self.version, key) for key in found)
+            if len(self._touched) >= _TOUCH_BATCH:
+                self._flush_touched()
+        return found
+
+    @contextmanager
+    def _transaction(self):
+        """One write transaction (the connection autocommits every statement otherwise)"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _flush_touched(self):
+        if self._touched:
+            with self._transaction():
+                self._db.executemany("UPDATE entries SET accessed = ? WHERE version = ? AND key = ?",
+                                     self._touched)
+            self._touched.clear()
+
+    def _store(self, key: str, blob: bytes, now: float):
+        old = self._db.execute("SELECT size FROM entries WHERE version = ? AND key = ?",
+                               (self.version, key)).fetchone()
+        self._db.execute("INSERT OR REPLACE INTO entries (version, key, value, size, accessed) "
+                         "VALUES (?, ?, ?, ?, ?)", (self.version, key, blob, len(blob), now))
+        self._bytes += len(blob) - (old[0] if old else 0)
+
+    def put(self, key: str, blob: bytes):
+        with self._lock:
+            self._store(key, blob, time.time())
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]):
+        """Store several values in one transaction"""
+        with self._lock:
+            now = time.time()
+            with self._transaction():
+                for key, blob in items:
+                    self._store(key, blob, now)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        self._flush_touched()
+        with self._transaction():
+            # Other processes may share the file: start from the stored total
+            self._bytes = self._stored_bytes()
+            while self._bytes > self.max_bytes:
+                # Least recently used first, whatever their version: other versions are not hit here
+                rows = self._db.execute("SELECT version, key, size FROM entries ORDER BY accessed LIMIT ?",
+                                        (_EVICT_BATCH,)).fetchall()
+                if not rows:
+                    break
+                for version, key, size in rows:
+                    if self._bytes <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM entries WHERE version = ? AND key = ?", (version, key))
+                    self._bytes -= size
+                    self.evictions += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        """Cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._db.execute("DELETE FROM entries")
+            self._bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.close()
+
+    def info(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "size": len(self), "bytes": self._bytes, "max_bytes": self.max_bytes,
+            "hit_rate": self.hits / total if total else 0.0, "version": self.version,
+        }
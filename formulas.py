@@ -0,0 +1,420 @@
+"""
+IEC 62305-2 Formula Spec - R1, R2 and R4 written once, compiled into kernels
+Every component is frequency × probability × loss, optionally switched off
+by a zone condition. The spec below lists the zone terms (probabilities and
+losses), the components of each risk and the extra values each risk
+reports, as expressions over ZoneParameters fields, other terms and the
+frequencies (Nd, Nm, Nl, Ndj, Ni, N_line = Nl + Ndj). Besides arithmetic
+the expressions use:
+  first(x_r2, x)   the override when it is set, else the base field
+  when(flag, x)    x if the condition holds, else 0
+  ratio(a, ct)     a / ct, 0 when ct is 0
+  pms(wm1, wm2, ks3, uw)   Calculators.calculate_Pms (inlined in scalar kernels)
+Conditions are is_critical, has_animals (FLAGS) and has_lines.
+
+The spec is compiled (generated Python source, cached) into:
+  - scalar kernels, one per zone variant (conditions and which overrides
+    are set): the conditions and override fallbacks are resolved at
+    compile time, so a kernel is straight-line arithmetic over the zone
+    fields it needs, and terms a variant does not use are left out
+  - a vectorized kernel over BatchEngineIEC62305 columns (np.where masks,
+    NaN overrides)
+  - one evaluator per term or flag, overrides resolved at run time
+    (IncrementalEngineIEC62305 re-evaluates single terms)
+EngineIEC62305 and BatchEngineIEC62305 evaluate every risk through these
+kernels and IncrementalEngineIEC62305 builds its dependency graph from the
+spec, so adding a risk means adding its entry to RISKS (and its components
+to iec_62305.SOURCE_COMPONENTS).
+"""
+import ast
+from dataclasses import fields
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from iec_62305 import ZoneParameters
+
+# ========================================
+# === SPEC ===
+# ========================================
+
+# Zone conditions: name -> expression over the zone flags
+FLAGS = {
+    "is_critical": "is_explosion_risk or is_hospital",
+    "has_animals": "has_animal_loss",
+}
+
+# Zone terms, in dependency order
+TERMS = {
+    # Probabilities
+    "Pa": "pta * pb",
+    "Pb": "pb",
+    "Pc": "pspd * cld",
+    "Pms": "pms(wm1, wm2, ks3, uw)",
+    "Pms_r2": "pms(first(wm1_r2, wm1), first(wm2_r2, wm2), first(ks3_r2, ks3), first(uw_r2, uw))",
+    "Pm": "pspd * Pms",
+    "Pm_r2": "pspd * Pms_r2",
+    "Pu": "ptu * peb * pld * cld_u",
+    "Pv": "peb_v * pld_v * cld_v",
+    "Pw": "pspd_w * pld_w * cld_w",
+    "Pz": "pspd_z * pli * cli",
+    # Losses (Equations C.1-C.13)
+    "La1": "rt * lt * (nz / nt) * (tz / 8760.0)",
+    "Lb1": "rp * rf * hz * lf1 * (nz_rb / nt_rb) * (tz_rb / 8760.0)",
+    "Lc1": "lo1 * (nz_rc / nt_rc) * (tz_rc / 8760.0)",
+    "Lu1": "rt_u * lt_u * (nz_u / nt_u) * (tz_u / 8760.0)",
+    "Lb2": "rp * rf * lf2 * (first(nz_r2, nz) / first(nt_r2, nt))",
+    "Lc2": "lo2 * (first(nz_r2, nz) / first(nt_r2, nt))",
+    "La4": "first(rt_r4, rt) * first(lt_r4, lt) * ratio(ca, ct)",
+    "Lb4": "first(rp_r4, rp) * first(rf_r4, rf) * lf4 * ratio(ca + cb + cc + cs, ct)",
+    "Lc4": "lo4 * ratio(cs, ct)",
+}
+
+
+class Component(NamedTuple):
+    """Component = frequency × probability × loss, 0 unless `when` holds"""
+    name: str
+    frequency: str
+    probability: str
+    loss: str
+    when: Optional[str] = None
+
+
+class Risk(NamedTuple):
+    flag: Optional[str]             # Condition reported in the zone results
+    components: Tuple[Component, ...]
+    report: Dict[str, str]          # Intermediate values of the zone results
+
+
+RISKS = {
+    "R1": Risk("is_critical", (
+        Component("Ra", "Nd", "Pa", "La1"),
+        Component("Rb", "Nd", "Pb", "Lb1"),
+        Component("Rc", "Nd", "Pc", "Lc1", "is_critical"),
+        Component("Rm", "Nm", "Pm", "Lc1", "is_critical"),
+        Component("Ru", "N_line", "Pu", "Lu1"),
+        Component("Rv", "N_line", "Pv", "Lb1"),
+        Component("Rw", "N_line", "Pw", "Lc1", "is_critical"),
+        Component("Rz", "Ni", "Pz", "Lc1", "is_critical"),
+    ), {
+        "Nd": "Nd", "Nm": "Nm",
+        "Pa": "Pa", "La1": "La1",
+        "Pb": "Pb", "Lb1": "Lb1",
+        "Pc": "when(is_critical, Pc)", "Lc1": "Lc1",
+        "Pm": "when(is_critical, Pm)", "Pms": "when(is_critical, Pms)",
+        "Nl": "Nl", "Ndj": "Ndj", "Ni": "Ni",
+        "Pu": "when(has_lines, Pu)", "Lu1": "when(has_lines, Lu1)",
+        "Pv": "when(has_lines, Pv)", "Lv1": "Lb1",
+        "Pw": "when(is_critical and has_lines, Pw)", "Lw1": "when(is_critical, Lc1)",
+        "Pz": "when(is_critical and has_lines, Pz)", "Lz1": "when(is_critical, Lc1)",
+    }),
+    "R2": Risk(None, (
+        Component("Rb2", "Nd", "Pb", "Lb2"),
+        Component("Rc2", "Nd", "Pc", "Lc2"),
+        Component("Rm2", "Nm", "Pm_r2", "Lc2"),
+        Component("Rv2", "N_line", "Pv", "Lb2"),
+        Component("Rw2", "N_line", "Pw", "Lc2"),
+        Component("Rz2", "Ni", "Pz", "Lc2"),
+    ), {
+        "Nd": "Nd", "Nm": "Nm",
+        "Pb": "Pb", "Lb2": "Lb2",
+        "Pc": "Pc", "Lc2": "Lc2",
+        "Pm": "Pm_r2", "Pms": "Pms_r2",
+        "Nl": "Nl", "Ndj": "Ndj", "Ni": "Ni",
+        "Pv": "when(has_lines, Pv)", "Lv2": "Lb2",
+        "Pw": "when(has_lines, Pw)", "Lw2": "Lc2",
+        "Pz": "when(has_lines, Pz)", "Lz2": "Lc2",
+    }),
+    "R4": Risk("has_animals", (
+        Component("Ra4", "Nd", "Pa", "La4", "has_animals"),
+        Component("Rb4", "Nd", "Pb", "Lb4"),
+        Component("Rc4", "Nd", "Pc", "Lc4"),
+        Component("Rm4", "Nm", "Pm_r2", "Lc4"),
+        Component("Ru4", "N_line", "Pu", "La4", "has_animals"),
+        Component("Rv4", "N_line", "Pv", "Lb4"),
+        Component("Rw4", "N_line", "Pw", "Lc4"),
+        Component("Rz4", "Ni", "Pz", "Lc4"),
+    ), {
+        "Nd": "Nd", "Nm": "Nm",
+        "Pa": "when(has_animals, Pa)", "La4": "when(has_animals, La4)",
+        "Pb": "Pb", "Lb4": "Lb4",
+        "Pc": "Pc", "Lc4": "Lc4",
+        "Pm": "Pm_r2", "Pms": "Pms_r2",
+        "Nl": "Nl", "Ndj": "Ndj", "Ni": "Ni",
+        "Pu": "when(has_animals and has_lines, Pu)", "Lu4": "when(has_animals, La4)",
+        "Pv": "when(has_lines, Pv)", "Lv4": "Lb4",
+        "Pw": "when(has_lines, Pw)", "Lw4": "Lc4",
+        "Pz": "when(has_lines, Pz)", "Lz4": "Lc4",
+        "ca": "ca", "cb": "cb", "cc": "cc", "cs": "cs", "ct": "ct",
+        "lf4": "lf4", "lo4": "lo4",
+    }),
+}
+
+ZONE_FIELDS = [f.name for f in fields(ZoneParameters) if f.name != "name"]
+
+
+def _parse(expression: str) -> ast.expr:
+    return ast.parse(expression, mode="eval").body
+
+
+def _overrides() -> Tuple[str, ...]:
+    """Override fields of first(...) calls in the spec, in spec order"""
+    found = []
+    for expression in TERMS.values():
+        for node in ast.walk(_parse(expression)):
+            if isinstance(node, ast.Call) and node.func.id == "first" and node.args[0].id not in found:
+                found.append(node.args[0].id)
+    return tuple(found)
+
+
+OVERRIDES = _overrides()
+
+
+# ========================================
+# === COMPILER ===
+# ========================================
+
+class _Lower(ast.NodeTransformer):
+    """
+    Rewrites a spec expression for one target. Scalar: conditions and set
+    overrides are known (a zone variant) and are folded away, or with
+    overrides=None each override is checked at run time. Vector:
+    conditions are bool arrays and overrides NaN-able columns.
+    """
+
+    def __init__(self, vector: bool, conditions: Optional[Dict[str, bool]] = None,
+                 overrides: Optional[frozenset] = frozenset()):
+        self.vector = vector
+        self.conditions = conditions or {}
+        self.overrides = overrides
+        self.names = set()  # Names the lowered expressions read
+
+    def lower(self, expression: str) -> ast.expr:
+        return self.visit(_parse(expression))
+
+    def visit_Name(self, node: ast.Name):
+        if not self.vector and node.id in self.conditions:
+            return ast.Constant(self.conditions[node.id])
+        self.names.add(node.id)
+        return node
+
+    def visit_BoolOp(self, node: ast.BoolOp):
+        values = [self.visit(v) for v in node.values]
+        if all(isinstance(v, ast.Constant) for v in values):
+            result = all(v.value for v in values) if isinstance(node.op, ast.And) else \
+                any(v.value for v in values)
+            return ast.Constant(bool(result))
+        if self.vector:
+            op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+            result = values[0]
+            for v in values[1:]:
+                result = ast.BinOp(result, op, v)
+            return result
+        return ast.BoolOp(node.op, values)
+
+    def visit_Call(self, node: ast.Call):
+        name = node.func.id
+        if name == "first":
+            override, base = node.args
+            if self.vector:
+                return self._call("_fallback", [self.visit(override), self.visit(base)])
+            if self.overrides is None:
+                override = self.visit(override)
+                return ast.IfExp(ast.Compare(override, [ast.IsNot()], [ast.Constant(None)]),
+                                 override, self.visit(base))
+            return self.visit(override if override.id in self.overrides else base)
+        if name == "when":
+            condition, value = self.visit(node.args[0]), node.args[1]
+            if isinstance(condition, ast.Constant):
+                return self.visit(value) if condition.value else ast.Constant(0.0)
+            if self.vector:
+                return ast.Call(ast.Attribute(ast.Name("np", ast.Load()), "where", ast.Load()),
+                                [condition, self.visit(value), ast.Constant(0.0)], [])
+            return ast.IfExp(condition, self.visit(value), ast.Constant(0.0))
+        if name == "ratio":
+            numerator, ct = (self.visit(a) for a in node.args)
+            if self.vector:
+                return self._call("_ratio_ct", [numerator, ct])
+            return ast.IfExp(ast.Compare(ct, [ast.Eq()], [ast.Constant(0)]), ast.Constant(0.0),
+                             ast.BinOp(numerator, ast.Div(), ct))
+        if name == "pms":
+            args = [self.visit(a) for a in node.args]
+            if self.vector:
+                return self._call("_pms", args)
+            # Calculators.calculate_Pms inlined: (Ks1 × Ks2 × Ks3 × Ks4)²
+            wm1, wm2, ks3, uw = (_source(a) if isinstance(a, ast.Name) else f"({_source(a)})" for a in args)
+            return _parse(f"(min(0.12 * {wm1}, 1.0) * min(0.12 * {wm2}, 1.0) * {ks3} "
+                          f"* (1.0 if {uw} <= 0 else min(1.0 / {uw}, 1.0))) ** 2")
+        raise ValueError(f"unknown spec function '{name}'")
+
+    @staticmethod
+    def _call(function: str, args: List[ast.expr]) -> ast.Call:
+        return ast.Call(ast.Name(function, ast.Load()), args, [])
+
+
+def _source(node: ast.expr) -> str:
+    return ast.unparse(ast.fix_missing_locations(node))
+
+
+def _risk_outputs(lower: _Lower, risk: Risk,
+                  report: bool = True) -> Tuple[List[Tuple[str, str]], List[str], List[Tuple[str, str]]]:
+    """(component, source) assignments, live component names and (key, source) report entries"""
+    assignments, live = [], []
+    for comp in risk.components:
+        product = f"{comp.frequency} * {comp.probability} * {comp.loss}"
+        expression = f"when({comp.when}, {product})" if comp.when else product
+        node = lower.lower(expression)
+        assignments.append((comp.name, _source(node)))
+        if not (isinstance(node, ast.Constant) and node.value == 0.0):
+            live.append(comp.name)
+    values = [(key, _source(lower.lower(expression))) for key, expression in risk.report.items()] \
+        if report else []
+    return assignments, live, values
+
+
+def _term_lines(lower: _Lower, indent: str) -> Tuple[List[str], set]:
+    """
+    Assignments of the terms the lowered outputs read (transitively), in
+    dependency order, and every name read by the outputs or those terms
+    """
+    needed = set(lower.names)
+    terms = _Lower(lower.vector, lower.conditions, lower.overrides)
+    lowered = {name: terms.lower(expression) for name, expression in TERMS.items()}
+    for name in reversed(list(TERMS)):
+        if name in needed:
+            needed |= {n.id for n in ast.walk(lowered[name]) if isinstance(n, ast.Name)}
+    lines, seen = [], {}
+    for name in TERMS:
+        if name in needed:
+            source = _source(lowered[name])
+            # A term equal to an earlier one (Pms_r2 without overrides) reuses it
+            lines.append(f"{indent}{name} = {seen.get(source, source)}")
+            seen.setdefault(source, name)
+    return lines, needed
+
+
+def scalar_source(risks: Sequence[str], conditions: Dict[str, bool], overrides: frozenset,
+                  report: bool = True) -> str:
+    """
+    Source of the kernel of one zone variant: kernel(z, Nd, Nm, Nl, Ndj, Ni, N_line) -> zone dicts.
+    report=False leaves the intermediate values out (Total, flag and components only)
+    """
+    lower = _Lower(False, conditions, overrides)
+    body, returns = [], []
+    for risk_name in risks:
+        risk = RISKS[risk_name]
+        assignments, live, values = _risk_outputs(lower, risk, report)
+        suffix = risk_name.lower()
+        body += [f"    {name} = {source}" for name, source in assignments]
+        body.append(f"    total_{suffix} = {' + '.join(live) if live else '0.0'}")
+        entries = [f'"Total": total_{suffix}']
+        if risk.flag:
+            entries.append(f'"{risk.flag}": {conditions[risk.flag]!r}')
+        entries += [f'"{name}": {name}' for name, _ in assignments]
+        entries += [f'"{key}": {source}' for key, source in values]
+        returns.append("{" + ", ".join(entries) + "}")
+    terms, needed = _term_lines(lower, "    ")
+    loads = [f"    {name} = z.{name}" for name in ZONE_FIELDS if name in needed]
+    return "\n".join(["def kernel(z, Nd, Nm, Nl, Ndj, Ni, N_line):"] + loads + terms + body
+                     + [f"    return ({', '.join(returns)},)"])
+
+
+def vector_source(risks: Sequence[str]) -> str:
+    """Source of the vectorized kernel: kernel(z, t) -> {risk: zone arrays} over BatchEngine columns"""
+    lower = _Lower(True)
+    body, returns = [], []
+    for risk_name in risks:
+        risk = RISKS[risk_name]
+        assignments, _, values = _risk_outputs(lower, risk)
+        suffix = risk_name.lower()
+        body += [f"    {name} = {source}" for name, source in assignments]
+        body.append(f"    total_{suffix} = {' + '.join(name for name, _ in assignments)}")
+        entries = [f'"Total": total_{suffix}']
+        if risk.flag:
+            entries.append(f'"{risk.flag}": {risk.flag}')
+        entries += [f'"{name}": {name}' for name, _ in assignments]
+        entries += [f'"{key}": {source}' for key, source in values]
+        returns.append(f'"{risk_name}": {{' + ", ".join(entries) + "}")
+    flags = [f"    {name} = {_source(lower.lower(expression))}" for name, expression in FLAGS.items()]
+    terms, needed = _term_lines(lower, "    ")
+    loads = [f'    {name} = z["{name}"]' for name in ZONE_FIELDS if name in needed]
+    frequencies = [f'    {name} = t["{name}"]' for name in ("Nd", "Nm", "Nl", "Ndj", "Ni", "has_lines")]
+    return "\n".join(["def kernel(z, t):"] + loads + flags + frequencies + ["    N_line = Nl + Ndj"]
+                     + terms + body + ["    return {" + ", ".join(returns) + "}"])
+
+
+def _compile(source: str, namespace: Dict):
+    namespace = dict(namespace)
+    exec(compile(source, "<formulas>", "exec"), namespace)
+    return namespace["kernel"]
+
+
+_SCALAR_NAMESPACE: Dict = {}
+_scalar_kernels: Dict[tuple, object] = {}
+_vector_kernels: Dict[tuple, object] = {}
+
+
+class _ZoneAttributes(ast.NodeTransformer):
+    def visit_Name(self, node: ast.Name):
+        return ast.Attribute(ast.Name("z", ast.Load()), node.id, ast.Load())
+
+
+def _signature_source() -> str:
+    """Source of zone_signature(z): the FLAGS values, then whether each of OVERRIDES is set"""
+    checks = [f"bool({_source(_ZoneAttributes().visit(_parse(expression)))})" for expression in FLAGS.values()]
+    checks += [f"z.{name} is not None" for name in OVERRIDES]
+    return "def kernel(z):\n    return (" + ", ".join(checks) + ",)"
+
+
+zone_signature = _compile(_signature_source(), {})
+
+
+def scalar_kernel(risks: Tuple[str, ...], signature: tuple, has_lines: bool, report: bool = True):
+    """Compiled kernel of a zone variant (signature: FLAGS values, then set OVERRIDES)"""
+    key = (risks, signature, has_lines, report)
+    kernel = _scalar_kernels.get(key)
+    if kernel is None:
+        conditions = dict(zip(FLAGS, signature), has_lines=has_lines)
+        overrides = frozenset(name for name, is_set in zip(OVERRIDES, signature[len(FLAGS):]) if is_set)
+        kernel = _scalar_kernels[key] = _compile(scalar_source(risks, conditions, overrides, report),
+                                                 _SCALAR_NAMESPACE)
+    return kernel
+
+
+def vector_kernel(risks: Tuple[str, ...]):
+    kernel = _vector_kernels.get(risks)
+    if kernel is None:
+        import numpy as np
+        from batch_engine import _calculate_Pms, _fallback, _ratio_ct
+        namespace = {"np": np, "_pms": _calculate_Pms, "_fallback": _fallback, "_ratio_ct": _ratio_ct}
+        kernel = _vector_kernels[risks] = _compile(vector_source(risks), namespace)
+    return kernel
+
+
+def term_source(name: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Source of the evaluator of one term or flag, kernel(z) -> value with the
+    overrides checked at run time, and the zone fields it reads
+    """
+    lower = _Lower(False, overrides=None)
+    if name in FLAGS:
+        result = f"bool({_source(lower.lower(FLAGS[name]))})"
+    else:
+        result = _source(lower.lower(name))
+    terms, needed = _term_lines(lower, "    ")
+    read = tuple(field for field in ZONE_FIELDS if field in needed)
+    loads = [f"    {field} = z.{field}" for field in read]
+    return "\n".join(["def kernel(z):"] + loads + terms + [f"    return {result}"]), read
+
+
+def term_kernel(name: str) -> Tuple[Tuple[str, ...], object]:
+    """(zone fields read, evaluator(z)) of a term (TERMS) or flag (FLAGS)"""
+    source, read = term_source(name)
+    return read, _compile(source, _SCALAR_NAMESPACE)
+
+
+def conditional(expression: str) -> Tuple[str, Tuple[str, ...]]:
+    """(value name, conditions) of a report expression: x, or when(a and b, x)"""
+    node = _parse(expression)
+    if isinstance(node, ast.Call) and node.func.id == "when":
+        condition, value = node.args
+        return value.id, tuple(n.id for n in ast.walk(condition) if isinstance(n, ast.Name))
+    return node.id, ()
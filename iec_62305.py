@@ -4,12 +4,30 @@ Implements:
   R1 = Ra1 + Rb1 + Rc1* + Rm1* + Ru1 + Rv1 + Rw1* + Rz1*
   R2 = Rb2 + Rc2 + Rm2 + Rv2 + Rw2 + Rz2
   R4 = Ra4* + Rb4 + Rc4 + Rm4 + Ru4* + Rv4 + Rw4 + Rz4
+The zone formulas are the spec in formulas.py, compiled on first use.
+Only the standard library is imported; the NumPy-based BatchEngineIEC62305,
+ZoneTable and ZoneResults can be imported from here and load on first use.
 """
 import math
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional, List, Dict
 
-@dataclass
+# Tolerable risk limits RT used for compliance checks (same values as app.py)
+TOLERABLE_RISK = {"R1": 1e-5, "R2": 1e-3, "R4": 1e-3}
+
+# Frequency sources (all proportional to Ng) and the components each one feeds:
+# every component is N × P × L with P and L independent of N
+FREQUENCY_SOURCES = {"structure": "Nd", "near": "Nm", "line": "Nl", "adjacent": "Ndj", "induced": "Ni"}
+_LINE_COMPONENTS = ("Ru", "Rv", "Rw", "Rv2", "Rw2", "Ru4", "Rv4", "Rw4")  # (Nl + Ndj) × P × L
+SOURCE_COMPONENTS = {
+    "structure": ("Ra", "Rb", "Rc", "Rb2", "Rc2", "Ra4", "Rb4", "Rc4"),
+    "near": ("Rm", "Rm2", "Rm4"),
+    "line": _LINE_COMPONENTS,
+    "adjacent": _LINE_COMPONENTS,
+    "induced": ("Rz", "Rz2", "Rz4"),
+}
+
+@dataclass(frozen=True, slots=True)
 class GeometricParameters:
     """Global geometric parameters for the structure"""
     L: float  # Length (m)
@@ -20,7 +38,7 @@ class GeometricParameters:
     Ad_manual: Optional[float] = None  # Manual override for Ad
     Am_manual: Optional[float] = None  # Manual override for Am
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class LineParameters:
     """Parameters for incoming service lines"""
     name: str
@@ -35,7 +53,7 @@ class LineParameters:
     Hj: float = 0.0  # Adjacent structure height (m)
     Cdj: float = 1.0  # Adjacent structure location factor (Table A.1)
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ZoneParameters:
     """Parameters for a single zone - R1 components only"""
     name: str
@@ -227,13 +245,25 @@ class Calculators:
         return (ks1 * ks2 * ks3 * ks4) ** 2
 
 
+def _zone_results_builder(n_zones: int):
+    """Columnar result builder (imported on demand: numpy is only needed for columnar results)"""
+    from results import ZoneResultsBuilder
+    return ZoneResultsBuilder(n_zones)
+
+
 class EngineIEC62305:
     """IEC 62305-2 Risk Calculation Engine - R1 Only"""
     
     def __init__(self, geom: GeometricParameters, zones: List[ZoneParameters], lines: List[LineParameters]):
+        """zones: list of ZoneParameters, or a ZoneTable (zone_table.py) for large studies"""
         self.geom = geom
         self.zones = zones
         self.lines = lines if lines else []
+        self._calculate_areas()
+    
+    def _calculate_areas(self):
+        """Calculate collection areas Ad and Am (manual overrides take precedence)"""
+        geom = self.geom
         
         # Calculate structure area Ad
         if geom.Ad_manual:
@@ -255,26 +285,6 @@ class EngineIEC62305:
         """Calculate Nm = Ng × Am × 10^-6"""
         return self.geom.Ng * self.Am * 1e-6
     
-    def _calculate_Pa(self, z: ZoneParameters) -> float:
-        """Calculate Pa = Pta × Pb"""
-        return z.pta * z.pb
-    
-    def _calculate_La1(self, z: ZoneParameters) -> float:
-        """Calculate La1 = rt × Lt × (nz/nt) × (tz/8760) - Equation C.1"""
-        return z.rt * z.lt * (z.nz / z.nt) * (z.tz / 8760.0)
-    
-    def _calculate_Lb1(self, z: ZoneParameters) -> float:
-        """Calculate Lb1 = rp × rf × hz × Lf1 × (nz/nt) × (tz/8760) - Equation C.3"""
-        return z.rp * z.rf * z.hz * z.lf1 * (z.nz_rb / z.nt_rb) * (z.tz_rb / 8760.0)
-    
-    def _calculate_Lc1(self, z: ZoneParameters) -> float:
-        """Calculate Lc1 = Lo1 × (nz/nt) × (tz/8760) - Equation C.4"""
-        return z.lo1 * (z.nz_rc / z.nt_rc) * (z.tz_rc / 8760.0)
-    
-    def _calculate_Lu1(self, z: ZoneParameters) -> float:
-        """Calculate Lu1 = rt × Lt × (nz/nt) × (tz/8760) - Equation C.2"""
-        return z.rt_u * z.lt_u * (z.nz_u / z.nt_u) * (z.tz_u / 8760.0)
-    
     def _calculate_Nl(self, line: LineParameters) -> float:
         """Calculate Nl = Ng × Al × Ci × Ce × Ct × 10^-6"""
         Al = 40.0 * line.length
@@ -293,405 +303,145 @@ class EngineIEC62305:
         Ai = 100.0 * line.length  # Ai = 100 × Ll (induced surges)
         return self.geom.Ng * Ai * line.ci * line.ce * line.ct * 1e-6
     
-    def _calculate_Pu(self, z: ZoneParameters) -> float:
-        """Calculate Pu = Ptu × Peb × Pld × Cld - Equation B.8"""
-        return z.ptu * z.peb * z.pld * z.cld_u
-    
-    def _calculate_Pv(self, z: ZoneParameters) -> float:
-        """Calculate Pv = Peb × Pld × Cld - Equation B.9"""
-        return z.peb_v * z.pld_v * z.cld_v
-    
-    def _calculate_Pw(self, z: ZoneParameters) -> float:
-        """Calculate Pw = Pspd × Pld × Cld"""
-        return z.pspd_w * z.pld_w * z.cld_w
-    
-    def _calculate_Pz(self, z: ZoneParameters) -> float:
-        """Calculate Pz = Pspd × Pli × Cli"""
-        return z.pspd_z * z.pli * z.cli
-    
-    # ========================================
-    # === R2 RISK CALCULATION METHODS ===
-    # ========================================
-    
-    def _calculate_Lb2(self, z: ZoneParameters) -> float:
-        """Calculate Lb2 = rp × rf × Lf2 × (nz/nt) - Equation C.7"""
-        nz_val = z.nz_r2 if z.nz_r2 is not None else z.nz
-        nt_val = z.nt_r2 if z.nt_r2 is not None else z.nt
-        return z.rp * z.rf * z.lf2 * (nz_val / nt_val)
-    
-    def _calculate_Lc2(self, z: ZoneParameters) -> float:
-        """Calculate Lc2 = Lo2 × (nz/nt) - Equation C.8"""
-        nz_val = z.nz_r2 if z.nz_r2 is not None else z.nz
-        nt_val = z.nt_r2 if z.nt_r2 is not None else z.nt
-        return z.lo2 * (nz_val / nt_val)
+    def _line_frequencies(self) -> Dict[str, float]:
+        """
+        Sum the line frequencies over all incoming lines.
+        Every line component is (Nl + Ndj) × P × L or Ni × P × L with P and L
+        independent of the line, so Σ(Nl + Ndj) and ΣNi are all a zone needs.
+        """
+        Nl_total = 0.0
+        Ndj_total = 0.0
+        Ni_total = 0.0
+        for line in self.lines:
+            Nl_total += self._calculate_Nl(line)
+            Ndj_total += self._calculate_Ndj(line)
+            Ni_total += self._calculate_Ni(line)
+        return {
+            "Nl": Nl_total, "Ndj": Ndj_total, "Ni": Ni_total,
+            "N_line": Nl_total + Ndj_total,
+        }
     
     # ========================================
-    # === R4 RISK CALCULATION METHODS ===
+    # === RISKS (formula spec, formulas.py) ===
     # ========================================
     
-    def _calculate_La4(self, z: ZoneParameters) -> float:
-        """Calculate La4 = rt × Lt × (ca/ct) - Equation C.10"""
-        rt_val = z.rt_r4 if z.rt_r4 is not None else z.rt
-        lt_val = z.lt_r4 if z.lt_r4 is not None else z.lt
-        if z.ct == 0:
-            return 0.0
-        return rt_val * lt_val * (z.ca / z.ct)
-    
-    def _calculate_Lb4(self, z: ZoneParameters) -> float:
-        """Calculate Lb4 = rp × rf × Lf4 × (ca+cb+cc+cs)/ct - Equation C.12"""
-        rp_val = z.rp_r4 if z.rp_r4 is not None else z.rp
-        rf_val = z.rf_r4 if z.rf_r4 is not None else z.rf
-        if z.ct == 0:
-            return 0.0
-        return rp_val * rf_val * z.lf4 * ((z.ca + z.cb + z.cc + z.cs) / z.ct)
-    
-    def _calculate_Lc4(self, z: ZoneParameters) -> float:
-        """Calculate Lc4 = Lo4 × (cs/ct) - Equation C.13"""
-        if z.ct == 0:
-            return 0.0
-        return z.lo4 * (z.cs / z.ct)
-
-    
-    def compute_risk_R1(self) -> Dict:
+    def _compute(self, risks, columnar: bool = False, report: bool = True,
+                 frequencies: Optional[tuple] = None) -> Dict[str, Dict]:
+        """
+        Evaluate `risks` zone by zone with the kernels compiled from the formula
+        spec (formulas.RISKS), one kernel per zone variant.
+        `frequencies` (Nd, Nm, Nl, Ndj, Ni, N_line) default to the study's own;
+        report=False leaves out the intermediate values of the zone results
+        """
+        from formulas import scalar_kernel, zone_signature
+        if frequencies is None:
+            lines = self._line_frequencies()
+            frequencies = (self._calculate_Nd(), self._calculate_Nm(),
+                           lines["Nl"], lines["Ndj"], lines["Ni"], lines["N_line"])
+        has_lines = bool(self.lines)
+        stores = [_zone_results_builder(len(self.zones)) if columnar else {} for _ in risks]
+        totals = [0.0] * len(risks)
+        kernels = {}
+        for z in self.zones:
+            signature = zone_signature(z)
+            kernel = kernels.get(signature)
+            if kernel is None:
+                kernel = kernels[signature] = scalar_kernel(risks, signature, has_lines, report)
+            for k, zone_data in enumerate(kernel(z, *frequencies)):
+                totals[k] += zone_data["Total"]
+                if columnar:
+                    stores[k].append(z.name, zone_data)
+                else:
+                    stores[k][z.name] = zone_data
+        if columnar:
+            return {risk: store.finish(total, self.Ad, self.Am)
+                    for risk, store, total in zip(risks, stores, totals)}
+        return {risk: {"total": total, "zones": store, "Ad": self.Ad, "Am": self.Am}
+                for risk, store, total in zip(risks, stores, totals)}
+    
+    def compute_risk_R1(self, columnar: bool = False):
         """
         Compute R1 = Ra1 + Rb1 + Rc1* + Rm1* + Ru1 + Rv1 + Rw1* + Rz1*
+        Components marked with * only calculated for critical zones
+        (explosion risk or hospital)
         Returns detailed breakdown for each zone and component
+        `columnar=True` returns a ZoneResults (results.py) instead of the nested dict
         """
-        total = 0.0
-        zones_output = {}
-        
-        # Common factors (same for all zones)
-        Nd = self._calculate_Nd()
-        Nm = self._calculate_Nm()
-        
-        for z in self.zones:
-            # Check if conditional components are active
-            is_critical = z.is_explosion_risk or z.is_hospital
-            
-            # === 1. Ra = Nd × Pa × La1 ===
-            Pa = self._calculate_Pa(z)
-            La1 = self._calculate_La1(z)
-            Ra = Nd * Pa * La1
-            
-            # === 2. Rb = Nd × Pb × Lb1 ===
-            Pb = z.pb
-            Lb1 = self._calculate_Lb1(z)
-            Rb = Nd * Pb * Lb1
-            
-            # === 3. Rc* = Nd × Pc × Lc1 ===
-            Rc = 0.0
-            Pc = 0.0
-            Lc1 = self._calculate_Lc1(z)
-            if is_critical:
-                Pc = z.pspd * z.cld
-                Rc = Nd * Pc * Lc1
-            
-            # === 4. Rm* = Nm × Pm × Lm1 ===
-            Rm = 0.0
-            Pm = 0.0
-            Pms = 0.0
-            if is_critical:
-                Pms = Calculators.calculate_Pms(z.wm1, z.wm2, z.ks3, z.uw)
-                Pm = z.pspd * Pms
-                Lm1 = Lc1  # Lm1 = Lc1
-                Rm = Nm * Pm * Lm1
-            
-            # === Line-based components ===
-            Ru_sum = 0.0
-            Rv_sum = 0.0
-            Rw_sum = 0.0
-            Rz_sum = 0.0
-            
-            Nl_total = 0.0
-            Ndj_total = 0.0
-            Ni_total = 0.0
-            
-            for line in self.lines:
-                Nl = self._calculate_Nl(line)
-                Ndj = self._calculate_Ndj(line)
-                Ni = self._calculate_Ni(line)
-                
-                Nl_total += Nl
-                Ndj_total += Ndj
-                Ni_total += Ni
-                
-                # === 5. Ru = (Nl + Ndj) × Pu × Lu1 ===
-                Pu = self._calculate_Pu(z)
-                Lu1 = self._calculate_Lu1(z)
-                Ru_sum += (Nl + Ndj) * Pu * Lu1
-                
-                # === 6. Rv = (Nl + Ndj) × Pv × Lv1 ===
-                Pv = self._calculate_Pv(z)
-                Lv1 = Lb1  # Lv1 = Lb1
-                Rv_sum += (Nl + Ndj) * Pv * Lv1
-                
-                # === 7. Rw* = (Nl + Ndj) × Pw × Lw1 ===
-                if is_critical:
-                    Pw = self._calculate_Pw(z)
-                    Lw1 = Lc1  # Lw1 = Lc1
-                    Rw_sum += (Nl + Ndj) * Pw * Lw1
-                
-                # === 8. Rz* = Ni × Pz × Lz1 ===
-                if is_critical:
-                    Pz = self._calculate_Pz(z)
-                    Lz1 = Lc1  # Lz1 = Lc1
-                    Rz_sum += Ni * Pz * Lz1
-            
-            # Total R1 for this zone
-            zone_total = Ra + Rb + Rc + Rm + Ru_sum + Rv_sum + Rw_sum + Rz_sum
-            total += zone_total
-            
-            # Store detailed results
-            zones_output[z.name] = {
-                "Total": zone_total,
-                "is_critical": is_critical,
-                # Component values
-                "Ra": Ra, "Rb": Rb, "Rc": Rc, "Rm": Rm,
-                "Ru": Ru_sum, "Rv": Rv_sum, "Rw": Rw_sum, "Rz": Rz_sum,
-                # Intermediate calculations
-                "Nd": Nd, "Nm": Nm,
-                "Pa": Pa, "La1": La1,
-                "Pb": Pb, "Lb1": Lb1,
-                "Pc": Pc, "Lc1": Lc1,
-                "Pm": Pm, "Pms": Pms,
-                "Nl": Nl_total, "Ndj": Ndj_total, "Ni": Ni_total,
-                "Pu": self._calculate_Pu(z) if self.lines else 0.0,
-                "Lu1": Lu1 if self.lines else 0.0,
-                "Pv": self._calculate_Pv(z) if self.lines else 0.0,
-                "Lv1": Lb1,
-                "Pw": self._calculate_Pw(z) if is_critical and self.lines else 0.0,
-                "Lw1": Lc1 if is_critical else 0.0,
-                "Pz": self._calculate_Pz(z) if is_critical and self.lines else 0.0,
-                "Lz1": Lc1 if is_critical else 0.0,
-            }
-        
-        return {"total": total, "zones": zones_output, "Ad": self.Ad, "Am": self.Am}
+        return self._compute(("R1",), columnar)["R1"]
     
-    def compute_risk_R2(self) -> Dict:
+    def compute_risk_R2(self, columnar: bool = False):
         """
         Compute R2 = Rb2 + Rc2 + Rm2 + Rv2 + Rw2 + Rz2
         R2 is the risk of loss of service to the public
         IMPORTANT: R2 always calculates ALL components (no conditional logic like R1)
-        Returns detailed breakdown for each zone and component
         """
-        total = 0.0
-        zones_output = {}
-        
-        # Common factors (same for all zones, reused from R1)
-        Nd = self._calculate_Nd()
-        Nm = self._calculate_Nm()
-        
-        for z in self.zones:
-            # === 1. Rb2 = Nd × Pb × Lb2 ===
-            Pb = z.pb  # Reused from R1
-            Lb2 = self._calculate_Lb2(z)
-            Rb2 = Nd * Pb * Lb2
-            
-            # === 2. Rc2 = Nd × Pc × Lc2 ===
-            # R2 ALWAYS calculates Rc2 (no conditional)
-            Lc2 = self._calculate_Lc2(z)
-            Pc = z.pspd * z.cld  # Reused from R1
-            Rc2 = Nd * Pc * Lc2
-            
-            # === 3. Rm2 = Nm × Pm × Lm2 ===
-            # R2 ALWAYS calculates Rm2 (no conditional)
-            # Use R2-specific parameters if provided, otherwise use R1 values
-            wm1_val = z.wm1_r2 if z.wm1_r2 is not None else z.wm1
-            wm2_val = z.wm2_r2 if z.wm2_r2 is not None else z.wm2
-            ks3_val = z.ks3_r2 if z.ks3_r2 is not None else z.ks3
-            uw_val = z.uw_r2 if z.uw_r2 is not None else z.uw
-            
-            Pms = Calculators.calculate_Pms(wm1_val, wm2_val, ks3_val, uw_val)
-            Pm = z.pspd * Pms
-            Lm2 = Lc2  # Lm2 = Lc2
-            Rm2 = Nm * Pm * Lm2
-            
-            # === Line-based components ===
-            Rv2_sum = 0.0
-            Rw2_sum = 0.0
-            Rz2_sum = 0.0
-            
-            Nl_total = 0.0
-            Ndj_total = 0.0
-            Ni_total = 0.0
-            
-            for line in self.lines:
-                Nl = self._calculate_Nl(line)
-                Ndj = self._calculate_Ndj(line)
-                Ni = self._calculate_Ni(line)
-                
-                Nl_total += Nl
-                Ndj_total += Ndj
-                Ni_total += Ni
-                
-                # === 4. Rv2 = (Nl + Ndj) × Pv × Lv2 ===
-                Pv = self._calculate_Pv(z)  # Reused from R1
-                Lv2 = Lb2  # Lv2 = Lb2
-                Rv2_sum += (Nl + Ndj) * Pv * Lv2
-                
-                # === 5. Rw2 = (Nl + Ndj) × Pw × Lw2 ===
-                # R2 ALWAYS calculates Rw2 (no conditional)
-                Pw = self._calculate_Pw(z)  # Reused from R1
-                Lw2 = Lc2  # Lw2 = Lc2
-                Rw2_sum += (Nl + Ndj) * Pw * Lw2
-                
-                # === 6. Rz2 = Ni × Pz × Lz2 ===
-                # R2 ALWAYS calculates Rz2 (no conditional)
-                Pz = self._calculate_Pz(z)  # Reused from R1
-                Lz2 = Lc2  # Lz2 = Lc2
-                Rz2_sum += Ni * Pz * Lz2
-            
-            # Total R2 for this zone
-            zone_total = Rb2 + Rc2 + Rm2 + Rv2_sum + Rw2_sum + Rz2_sum
-            total += zone_total
-            
-            # Store detailed results
-            zones_output[z.name] = {
-                "Total": zone_total,
-                # Component values
-                "Rb2": Rb2, "Rc2": Rc2, "Rm2": Rm2,
-                "Rv2": Rv2_sum, "Rw2": Rw2_sum, "Rz2": Rz2_sum,
-                # Intermediate calculations
-                "Nd": Nd, "Nm": Nm,
-                "Pb": Pb, "Lb2": Lb2,
-                "Pc": Pc, "Lc2": Lc2,
-                "Pm": Pm, "Pms": Pms,
-                "Nl": Nl_total, "Ndj": Ndj_total, "Ni": Ni_total,
-                "Pv": self._calculate_Pv(z) if self.lines else 0.0,
-                "Lv2": Lb2,
-                "Pw": self._calculate_Pw(z) if self.lines else 0.0,
-                "Lw2": Lc2,
-                "Pz": self._calculate_Pz(z) if self.lines else 0.0,
-                "Lz2": Lc2,
-            }
-        
-        return {"total": total, "zones": zones_output, "Ad": self.Ad, "Am": self.Am}
+        return self._compute(("R2",), columnar)["R2"]
     
-    def compute_risk_R4(self) -> Dict:
+    def compute_risk_R4(self, columnar: bool = False):
         """
         Compute R4 = Ra4* + Rb4 + Rc4 + Rm4 + Ru4* + Rv4 + Rw4 + Rz4
         R4 is the risk of economic loss (loss of animals)
         Components marked with * only calculated for properties with animal loss
-        Returns detailed breakdown for each zone and component
         """
-        total = 0.0
-        zones_output = {}
-        
-        # Common factors (same for all zones, reused from R1)
-        Nd = self._calculate_Nd()
-        Nm = self._calculate_Nm()
-        
-        for z in self.zones:
-            # Check if animal loss components are active
-            has_animals = z.has_animal_loss
-            
-            # === 1. Ra4* = Nd × Pa × La4 ===
-            # Only calculated if has_animal_loss = True
-            Ra4 = 0.0
-            La4 = 0.0
-            if has_animals:
-                Pa = self._calculate_Pa(z)  # Reused from R1
-                La4 = self._calculate_La4(z)
-                Ra4 = Nd * Pa * La4
-            
-            # === 2. Rb4 = Nd × Pb × Lb4 ===
-            Pb = z.pb  # Reused from R1
-            Lb4 = self._calculate_Lb4(z)
-            Rb4 = Nd * Pb * Lb4
-            
-            # === 3. Rc4 = Nd × Pc × Lc4 ===
-            # Always calculated (no conditional)
-            Lc4 = self._calculate_Lc4(z)
-            Pc = z.pspd * z.cld  # Reused from R1
-            Rc4 = Nd * Pc * Lc4
-            
-            # === 4. Rm4 = Nm × Pm × Lm4 ===
-            # Always calculated (no conditional)
-            # Reuse Pm logic from R1 (uses R1 or R2 parameters if available)
-            wm1_val = z.wm1_r2 if z.wm1_r2 is not None else z.wm1
-            wm2_val = z.wm2_r2 if z.wm2_r2 is not None else z.wm2
-            ks3_val = z.ks3_r2 if z.ks3_r2 is not None else z.ks3
-            uw_val = z.uw_r2 if z.uw_r2 is not None else z.uw
-            
-            Pms = Calculators.calculate_Pms(wm1_val, wm2_val, ks3_val, uw_val)
-            Pm = z.pspd * Pms
-            Lm4 = Lc4  # Lm4 = Lc4
-            Rm4 = Nm * Pm * Lm4
-            
-            # === Line-based components ===
-            Ru4_sum = 0.0
-            Rv4_sum = 0.0
-            Rw4_sum = 0.0
-            Rz4_sum = 0.0
-            
-            Nl_total = 0.0
-            Ndj_total = 0.0
-            Ni_total = 0.0
-            
-            for line in self.lines:
-                Nl = self._calculate_Nl(line)
-                Ndj = self._calculate_Ndj(line)
-                Ni = self._calculate_Ni(line)
-                
-                Nl_total += Nl
-                Ndj_total += Ndj
-                Ni_total += Ni
-                
-                # === 5. Ru4* = (Nl + Ndj) × Pu × Lu4 ===
-                # Only calculated if has_animal_loss = True
-                if has_animals:
-                    Pu = self._calculate_Pu(z)  # Reused from R1
-                    Lu4 = La4  # Lu4 = La4
-                    Ru4_sum += (Nl + Ndj) * Pu * Lu4
-                
-                # === 6. Rv4 = (Nl + Ndj) × Pv × Lv4 ===
-                Pv = self._calculate_Pv(z)  # Reused from R1
-                Lv4 = Lb4  # Lv4 = Lb4
-                Rv4_sum += (Nl + Ndj) * Pv * Lv4
-                
-                # === 7. Rw4 = (Nl + Ndj) × Pw × Lw4 ===
-                # Always calculated (no conditional)
-                Pw = self._calculate_Pw(z)  # Reused from R1
-                Lw4 = Lc4  # Lw4 = Lc4
-                Rw4_sum += (Nl + Ndj) * Pw * Lw4
-                
-                # === 8. Rz4 = Ni × Pz × Lz4 ===
-                # Always calculated (no conditional)
-                Pz = self._calculate_Pz(z)  # Reused from R1
-                Lz4 = Lc4  # Lz4 = Lc4
-                Rz4_sum += Ni * Pz * Lz4
-            
-            # Total R4 for this zone
-            zone_total = Ra4 + Rb4 + Rc4 + Rm4 + Ru4_sum + Rv4_sum + Rw4_sum + Rz4_sum
-            total += zone_total
-            
-            # Store detailed results
-            zones_output[z.name] = {
-                "Total": zone_total,
-                "has_animals": has_animals,
-                # Component values
-                "Ra4": Ra4, "Rb4": Rb4, "Rc4": Rc4, "Rm4": Rm4,
-                "Ru4": Ru4_sum, "Rv4": Rv4_sum, "Rw4": Rw4_sum, "Rz4": Rz4_sum,
-                # Intermediate calculations
-                "Nd": Nd, "Nm": Nm,
-                "Pa": self._calculate_Pa(z) if has_animals else 0.0,
-                "La4": La4,
-                "Pb": Pb, "Lb4": Lb4,
-                "Pc": Pc, "Lc4": Lc4,
-                "Pm": Pm, "Pms": Pms,
-                "Nl": Nl_total, "Ndj": Ndj_total, "Ni": Ni_total,
-                "Pu": self._calculate_Pu(z) if has_animals and self.lines else 0.0,
-                "Lu4": La4 if has_animals else 0.0,
-                "Pv": self._calculate_Pv(z) if self.lines else 0.0,
-                "Lv4": Lb4,
-                "Pw": self._calculate_Pw(z) if self.lines else 0.0,
-                "Lw4": Lc4,
-                "Pz": self._calculate_Pz(z) if self.lines else 0.0,
-                "Lz4": Lc4,
-                # Economic values
-                "ca": z.ca, "cb": z.cb, "cc": z.cc, "cs": z.cs, "ct": z.ct,
-                "lf4": z.lf4, "lo4": z.lo4,
-            }
-        
-        return {"total": total, "zones": zones_output, "Ad": self.Ad, "Am": self.Am}
+        return self._compute(("R4",), columnar)["R4"]
+    
+    def compute_all_risks(self, columnar: bool = False, report: bool = True) -> Dict[str, Dict]:
+        """
+        Compute R1, R2 and R4 in a single pass over the zones (one kernel call
+        per zone). Returns {"R1": ..., "R2": ..., "R4": ...} with the same
+        schema as compute_risk_R1/R2/R4 (ZoneResults values if columnar).
+        report=False: zone results with Total, the condition flag and the components only
+        """
+        return self._compute(("R1", "R2", "R4"), columnar, report)
+    
+    def frequency_coefficients(self) -> Dict:
+        """
+        Risks split into frequency x coefficient, for re-scoring without the engine.
+        Returns {"Ng": Ng,
+                 "frequencies": {source: N / Ng},   (FREQUENCY_SOURCES, geometry and lines only)
+                 "zones": {zone: {risk: {component: P × L}}}}   (zone only)
+        so that component = Ng × Σ frequencies[s] × P × L over the sources s
+        feeding it (SOURCE_COMPONENTS). A new Ng, or new lines through the
+        frequencies, re-scores a study as a dot product. See rescoring.py
+        """
+        unit = EngineIEC62305(replace(self.geom, Ng=1.0), [], self.lines)
+        lines = unit._line_frequencies()
+        frequencies = {
+            "structure": unit._calculate_Nd(), "near": unit._calculate_Nm(),
+            "line": lines["Nl"], "adjacent": lines["Ndj"], "induced": lines["Ni"],
+        }
+        # With unit frequencies (Nd, Nm, Nl, Ndj, Ni, N_line) every component evaluates to its P × L
+        results = self._compute(("R1", "R2", "R4"), report=False, frequencies=(1.0, 1.0, 1.0, 0.0, 1.0, 1.0))
+        zones: Dict[str, Dict] = {}
+        for risk, result in results.items():
+            for name, data in result["zones"].items():
+                zones.setdefault(name, {})[risk] = {k: v for k, v in data.items() if k in _COMPONENT_NAMES}
+        return {"Ng": self.geom.Ng, "frequencies": frequencies, "zones": zones}
+    
+    def sensitivities(self) -> Dict[str, Dict]:
+        """
+        Exact partial derivatives and elasticities of R1, R2 and R4 (totals and
+        zones) with respect to every numeric input. See sensitivity.py
+        """
+        from sensitivity import compute_sensitivities
+        return compute_sensitivities(self)
+
+
+_COMPONENT_NAMES = frozenset(c for comps in SOURCE_COMPONENTS.values() for c in comps)
+
+
+# NumPy-based features: importable from this module, loaded on first access
+_LAZY_ATTRIBUTES = {
+    "BatchEngineIEC62305": "batch_engine",
+    "ZoneTable": "zone_table",
+    "ZoneResults": "results",
+}
+
 
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = globals()[name] = getattr(importlib.import_module(module), name)
+    return value
@@ -0,0 +1,249 @@
+"""
+IEC 62305-2 Incremental Risk Engine - R1, R2 and R4
+Keeps every term, component and total of a study in memory and, when a
+single input changes, refreshes only what depends on it:
+  input field -> terms (Nd, Pa, La1, ...) -> components (Ra, Rb2, ...) -> totals
+The terms, components and their dependencies come from the formula spec
+(formulas.py).
+Results keep the schema of EngineIEC62305.compute_all_risks().
+"""
+from dataclasses import fields, replace
+from operator import attrgetter
+from typing import Dict, List, Optional, Set, Union
+
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters, EngineIEC62305
+from formulas import FLAGS, RISKS, TERMS, conditional, term_kernel
+
+# ========================================
+# === DEPENDENCY GRAPH ===
+# ========================================
+
+GEOM_FIELDS = {f.name for f in fields(GeometricParameters)}
+ZONE_FIELDS = {f.name for f in fields(ZoneParameters)}
+LINE_FIELDS = {f.name for f in fields(LineParameters)}
+
+# Zone-level terms and flags (formulas.py): term -> (input fields, evaluator(z))
+ZONE_TERMS = {name: term_kernel(name) for name in (*FLAGS, *TERMS)}
+
+# Zone fields reported as-is (economic values and R4 table values in the R4 output)
+for _risk in RISKS.values():
+    for _expression in _risk.report.values():
+        _name = conditional(_expression)[0]
+        if _name not in ZONE_TERMS and _name in ZONE_FIELDS:
+            ZONE_TERMS[_name] = ((_name,), attrgetter(_name))
+
+# Study-level terms: term -> (GeometricParameters fields, depends on lines)
+GLOBAL_TERMS = {
+    "Nd": (("Ng", "Cd", "L", "W", "H", "Ad_manual"), False),
+    "Nm": (("Ng", "L", "W", "Am_manual"), False),
+    "Nl": (("Ng",), True),
+    "Ndj": (("Ng",), True),
+    "Ni": (("Ng",), True),
+    "N_line": (("Ng",), True),  # Σ(Nl + Ndj)
+    "has_lines": ((), True),  # Whether the study has any line
+}
+LINE_TERMS = {t for t, (_, from_lines) in GLOBAL_TERMS.items() if from_lines}
+
+# Components: risk -> [(component, (frequency, probability, loss), condition)]
+COMPONENTS = {
+    risk_name: [(c.name, (c.frequency, c.probability, c.loss), c.when) for c in risk.components]
+    for risk_name, risk in RISKS.items()
+}
+
+# Reported intermediates: risk -> [(output key, term, conditions)]
+# An intermediate is 0.0 unless all of its conditions hold
+OUTPUTS = {
+    risk_name: ([(risk.flag, risk.flag, ())] if risk.flag else [])
+    + [(key, *conditional(expression)) for key, expression in risk.report.items()]
+    for risk_name, risk in RISKS.items()
+}
+
+
+def _invert(mapping: Dict[str, tuple]) -> Dict[str, Set[str]]:
+    """term -> inputs  ==>  input -> terms"""
+    out: Dict[str, Set[str]] = {}
+    for term, inputs in mapping.items():
+        for name in inputs:
+            out.setdefault(name, set()).add(term)
+    return out
+
+
+ZONE_FIELD_TERMS = _invert({t: inputs for t, (inputs, _) in ZONE_TERMS.items()})
+GEOM_FIELD_TERMS = _invert({t: inputs for t, (inputs, _) in GLOBAL_TERMS.items()})
+
+
+def affected_components(field: str) -> Dict[str, List[str]]:
+    """Components of each risk that depend on an input field"""
+    if field in ZONE_FIELDS:
+        terms = ZONE_FIELD_TERMS.get(field, set())
+    elif field in GEOM_FIELDS:
+        terms = GEOM_FIELD_TERMS.get(field, set())
+    elif field in LINE_FIELDS:
+        terms = LINE_TERMS
+    else:
+        raise ValueError(f"Unknown parameter '{field}'")
+    return {
+        risk: [name for name, deps, cond in comps if terms.intersection(deps) or cond in terms]
+        for risk, comps in COMPONENTS.items()
+    }
+
+
+# ========================================
+# === ENGINE ===
+# ========================================
+
+class IncrementalEngineIEC62305(EngineIEC62305):
+    """IEC 62305-2 Risk Calculation Engine - stateful, refreshes only affected components"""
+
+    def __init__(self, geom: GeometricParameters, zones: List[ZoneParameters], lines: List[LineParameters]):
+        # Parameters are replaced (not mutated) on update, so keep private lists
+        zones = zones.to_zones() if hasattr(zones, "to_zones") else list(zones)
+        super().__init__(geom, zones, list(lines) if lines else [])
+        self.results = self.compute_all_risks()
+
+        self._global = {}
+        self._refresh_global(set(GLOBAL_TERMS))
+        self._terms = [
+            {t: evaluate(z) for t, (_, evaluate) in ZONE_TERMS.items()}
+            for z in self.zones
+        ]
+        self._outputs = [
+            {risk: self.results[risk]["zones"][z.name] for risk in COMPONENTS}
+            for z in self.zones
+        ]
+
+    # === Public API ===
+
+    def update(self, zone: Optional[Union[int, str]], field: str, value) -> Dict[str, Set[str]]:
+        """
+        Set `field` to `value` and refresh the affected components and totals.
+        `zone` is a zone index or name, or None for a GeometricParameters field.
+        Returns the refreshed components per risk.
+        """
+        if zone is None:
+            if field not in GEOM_FIELDS:
+                raise ValueError(f"'{field}' is not a GeometricParameters field")
+            self.geom = replace(self.geom, **{field: value})
+            if field in ("L", "W", "H", "Ad_manual", "Am_manual"):
+                self._calculate_areas()
+                for risk in COMPONENTS:
+                    self.results[risk]["Ad"] = self.Ad
+                    self.results[risk]["Am"] = self.Am
+            dirty = GEOM_FIELD_TERMS.get(field, set())
+            self._refresh_global(dirty)
+            return self._refresh_all_zones(dirty)
+
+        if field not in ZONE_FIELDS:
+            raise ValueError(f"'{field}' is not a ZoneParameters field")
+        i = self._zone_index(zone)
+        old = self.zones[i]
+        if field == "name" and value != old.name and any(z.name == value for z in self.zones):
+            raise ValueError(f"Zone '{value}' already exists")
+        self.zones[i] = replace(old, **{field: value})
+        if field == "name":
+            self._rename_zone(old.name, value)
+            return {risk: set() for risk in COMPONENTS}
+
+        dirty = ZONE_FIELD_TERMS.get(field, set())
+        terms = self._terms[i]
+        for t in dirty:
+            terms[t] = ZONE_TERMS[t][1](self.zones[i])
+        before = {risk: self._outputs[i][risk]["Total"] for risk in COMPONENTS}
+        refreshed = self._refresh_zone(i, dirty)
+        for risk, names in refreshed.items():
+            if names:
+                # Only zone i changed: shift the study total by its delta instead of summing every zone,
+                # unless the total more than halves (the subtraction would cancel most of its digits)
+                total = self.results[risk]["total"]
+                shifted = total + (self._outputs[i][risk]["Total"] - before[risk])
+                if shifted >= 0.5 * total:
+                    self.results[risk]["total"] = shifted
+                else:
+                    self._refresh_totals({risk: names})
+        return refreshed
+
+    def update_line(self, line: Union[int, str], field: str, value) -> Dict[str, Set[str]]:
+        """Set a LineParameters `field` of a line (index or name) and refresh the line components"""
+        if field not in LINE_FIELDS:
+            raise ValueError(f"'{field}' is not a LineParameters field")
+        j = self._index(self.lines, line, "line")
+        self.lines[j] = replace(self.lines[j], **{field: value})
+        if field == "name":
+            return {risk: set() for risk in COMPONENTS}
+        self._refresh_global(LINE_TERMS)
+        return self._refresh_all_zones(LINE_TERMS)
+
+    # === Internals ===
+
+    @staticmethod
+    def _index(items, key, kind: str) -> int:
+        if isinstance(key, int):
+            if not -len(items) <= key < len(items):
+                raise IndexError(f"{kind} index {key} out of range")
+            return key % len(items)
+        for i, item in enumerate(items):
+            if item.name == key:
+                return i
+        raise KeyError(f"Unknown {kind} '{key}'")
+
+    def _zone_index(self, zone: Union[int, str]) -> int:
+        return self._index(self.zones, zone, "zone")
+
+    def _refresh_global(self, dirty: Set[str]):
+        """Re-evaluate study-level terms"""
+        if "Nd" in dirty:
+            self._global["Nd"] = self._calculate_Nd()
+        if "Nm" in dirty:
+            self._global["Nm"] = self._calculate_Nm()
+        if dirty & LINE_TERMS:
+            self._global.update(self._line_frequencies())
+            self._global["has_lines"] = bool(self.lines)
+
+    def _refresh_all_zones(self, dirty: Set[str]) -> Dict[str, Set[str]]:
+        refreshed = {risk: set() for risk in COMPONENTS}
+        for i in range(len(self.zones)):
+            for risk, names in self._refresh_zone(i, dirty).items():
+                refreshed[risk] |= names
+        self._refresh_totals(refreshed)
+        return refreshed
+
+    def _refresh_zone(self, i: int, dirty: Set[str]) -> Dict[str, Set[str]]:
+        """Recompute the components and intermediates of zone i that read a dirty term"""
+        values = {**self._global, **self._terms[i]}
+        refreshed = {}
+        for risk, comps in COMPONENTS.items():
+            out = self._outputs[i][risk]
+            names = set()
+            for name, (freq, prob, loss), cond in comps:
+                if freq in dirty or prob in dirty or loss in dirty or cond in dirty:
+                    if cond is None or values[cond]:
+                        out[name] = values[freq] * values[prob] * values[loss]
+                    else:
+                        out[name] = 0.0
+                    names.add(name)
+            for key, term, conds in OUTPUTS[risk]:
+                if term in dirty or dirty.intersection(conds):
+                    out[key] = values[term] if all(values[c] for c in conds) else 0.0
+            if names:
+                total = 0.0
+                for name, _, _ in comps:
+                    total += out[name]
+                out["Total"] = total
+            refreshed[risk] = names
+        return refreshed
+
+    def _refresh_totals(self, refreshed: Dict[str, Set[str]]):
+        for risk, names in refreshed.items():
+            if names:
+                total = 0.0
+                for outputs in self._outputs:
+                    total += outputs[risk]["Total"]
+                self.results[risk]["total"] = total
+
+    def _rename_zone(self, old_name: str, new_name: str):
+        """Rename a zone key, keeping the zone order of the results"""
+        for risk in COMPONENTS:
+            zones = self.results[risk]["zones"]
+            self.results[risk]["zones"] = {
+                (new_name if name == old_name else name): data for name, data in zones.items()
+            }
@@ -0,0 +1,446 @@
+"""
+IEC 62305-2 Job Queue - long runs in the background
+A job is a list of items (studies, or optimizer problems) stored in a local
+SQLite file together with its state and per-item results. A dispatcher
+thread takes queued items in chunks, runs them on a process pool and writes
+the results back, so progress survives the client: a UI session can submit
+a job, go away, and poll or page through the results later.
+
+Several dispatchers may share one database (the app's and `python jobs.py
+worker`): a chunk is claimed in one transaction and leased to its
+dispatcher, which renews the lease while the chunk runs. Items whose lease
+ran out (their dispatcher died) are claimed again by any dispatcher.
+An item that cannot be evaluated gets {"id", "error"} as its result. When a
+pool worker dies, the pool is replaced and its chunks run again; the chunk
+whose failure was seen first is charged, and its job fails after
+CRASH_RETRIES runs again.
+
+  queue = JobQueue("jobs.sqlite")                 # submits and runs
+  job = queue.submit(studies)                     # portfolio study dicts
+  queue.status(job)   -> progress, zones done / total, ETA
+  queue.results(job, offset=0, limit=100)
+  queue.cancel(job)
+
+Job kinds (JOB_KINDS):
+  risks     item = portfolio study dict; options {"detail": "totals|zones|full"}
+  optimize  item = {"study": {...}, "costs": {...}, "limits": {...},
+                    "per_zone": bool, "top_k": int, "time_budget": s}
+
+Command line (a standalone dispatcher keeps running jobs independently of the UI):
+  python jobs.py worker --db jobs.sqlite --workers 4
+  python jobs.py submit portfolio.jsonl --db jobs.sqlite
+  python jobs.py status [JOB] | cancel JOB | results JOB --offset 0 --limit 100
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from portfolio import study_from_dict
+
+DEFAULT_DB = "jobs.sqlite"
+CHUNK_SIZE = 50
+POLL_SECONDS = 0.2
+LEASE_SECONDS = 60.0  # Renewed every LEASE_SECONDS / 3 while a chunk runs
+CRASH_RETRIES = 1     # Runs again of a chunk whose worker died before its job fails
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,          -- queued | running | done | cancelled | failed
+    options TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    items_total INTEGER NOT NULL,
+    zones_total INTEGER NOT NULL,
+    items_done INTEGER NOT NULL DEFAULT 0,
+    zones_done INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    zones INTEGER NOT NULL,
+    status TEXT NOT NULL,          -- queued | running | done | cancelled
+    payload TEXT NOT NULL,
+    result TEXT,
+    owner TEXT,                    -- dispatcher running the item
+    lease REAL,                    -- running until then, or claimed again
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, job_id, idx);
+"""
+
+
+# ========================================
+# === JOB KINDS (worker side) ===
+# ========================================
+
+def _run_risks(items: List[Dict], options: Dict) -> List[Dict]:
+    """Invalid studies (and values the engine cannot evaluate) get {"id", "error"}"""
+    from service import evaluate_chunk
+    return evaluate_chunk(items, options.get("detail", "zones"))
+
+
+def _run_optimize(items: List[Dict], options: Dict) -> List[Dict]:
+    from optimizer import ProtectionOptimizer
+    out = []
+    for item in items:
+        study = item.get("study", {})
+        try:
+            s = study_from_dict(study)
+            optimizer = ProtectionOptimizer(s.geom, s.zones, s.lines, item["costs"], item.get("limits"),
+                                             item.get("per_zone", True))
+            designs, stats = optimizer.solve(item.get("top_k", 5), item.get("time_budget", 10.0))
+            out.append({
+                "id": s.id, "stats": stats,
+                "designs": [
+                    {"cost": d.cost, "risks": d.risks,
+                     "choices": [[zone, measure, label] for (zone, measure), label in d.choices.items()]}
+                    for d in designs
+                ],
+            })
+        except (KeyError, ValueError, TypeError) as e:
+            out.append({"id": study.get("id"), "error": str(e)})
+        except ArithmeticError as e:
+            out.append({"id": study.get("id"), "error": f"{type(e).__name__}: {e}"})
+    return out
+
+
+JOB_KINDS = {"risks": _run_risks, "optimize": _run_optimize}
+
+
+def _run_chunk(kind: str, items: List[Dict], options: Dict) -> List[Dict]:
+    return JOB_KINDS[kind](items, options)
+
+
+def _item_zones(kind: str, item: Dict) -> int:
+    study = item.get("study", {}) if kind == "optimize" else item
+    return max(1, len(study.get("zones", []))) if isinstance(study, dict) else 1
+
+
+# ========================================
+# === QUEUE ===
+# ========================================
+
+class JobQueue:
+    """SQLite-backed job queue with an optional in-process dispatcher"""
+
+    def __init__(self, path: str = DEFAULT_DB, workers: Optional[int] = None, start: bool = True,
+                 chunk_size: int = CHUNK_SIZE):
+        """
+        workers: pool processes (default: CPU count; 0 runs chunks on the dispatcher thread)
+        start: run a dispatcher in this process; False for submit/poll-only clients
+        """
+        self.path = path
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(items)")}
+            for column, kind in (("owner", "TEXT"), ("lease", "REAL")):
+                if column not in columns:  # Databases created before leases
+                    db.execute(f"ALTER TABLE items ADD COLUMN {column} {kind}")
+        self.owner = uuid.uuid4().hex[:12]  # This queue's dispatcher in the items table
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30.0)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    # === Client API ===
+
+    def submit(self, items: List[Dict], kind: str = "risks", options: Optional[Dict] = None) -> str:
+        """Queue a job over items; returns its id"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'. Available: {list(JOB_KINDS)}")
+        job_id = uuid.uuid4().hex[:12]
+        zones = [_item_zones(kind, item) for item in items]
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, kind, status, options, created, items_total, zones_total) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(options or {}), time.time(), len(items), sum(zones)))
+            db.executemany(
+                "INSERT INTO items (job_id, idx, zones, status, payload) VALUES (?, ?, ?, 'queued', ?)",
+                ((job_id, k, z, json.dumps(item, ensure_ascii=False)) for k, (item, z) in enumerate(zip(items, zones))))
+            if not items:
+                db.execute("UPDATE jobs SET status = 'done', finished = ? WHERE id = ?", (time.time(), job_id))
+        return job_id
+
+    def status(self, job_id: str) -> Dict:
+        """State, progress (items and zones) and ETA of a job"""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown job '{job_id}'")
+        return self._describe(row)
+
+    def jobs(self) -> List[Dict]:
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM jobs ORDER BY created").fetchall()
+        return [self._describe(row) for row in rows]
+
+    @staticmethod
+    def _describe(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        end = job["finished"] or time.time()
+        elapsed = end - job["started"] if job["started"] else 0.0
+        job["elapsed_s"] = elapsed
+        job["progress"] = job["zones_done"] / job["zones_total"] if job["zones_total"] else 1.0
+        job["eta_s"] = None
+        if job["status"] == "running" and job["zones_done"]:
+            job["eta_s"] = elapsed / job["zones_done"] * (job["zones_total"] - job["zones_done"])
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a queued or running job; chunks already running still store their results"""
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id))
+            db.execute("UPDATE items SET status = 'cancelled' WHERE job_id = ? AND status = 'queued'", (job_id,))
+        return cursor.rowcount > 0
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """Finished item results in input order, one page at a time"""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT result FROM items WHERE job_id = ? AND status = 'done' ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset)).fetchall()
+        return [json.loads(row["result"]) for row in rows]
+
+    # === Dispatcher ===
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+            self._thread.start()
+
+    def close(self, wait_running: bool = True):
+        """Stop the dispatcher; queued items stay on disk for the next start"""
+        self._stop.set()
+        if self._thread is not None and wait_running:
+            self._thread.join()
+        self._thread = None
+
+    def _next_chunk(self, db: sqlite3.Connection):
+        """Claim the next chunk: queued items, or running ones whose lease ran out"""
+        now = time.time()
+        db.commit()
+        db.execute("BEGIN IMMEDIATE")  # Write lock from the first read: claimed by one dispatcher only
+        try:
+            row = db.execute(
+                "SELECT i.job_id, j.kind, j.options FROM items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE (i.status = 'queued' OR (i.status = 'running' AND COALESCE(i.lease, 0) < ?)) "
+                "AND j.status IN ('queued', 'running') "
+                "ORDER BY j.created, i.idx LIMIT 1", (now,)).fetchone()
+            if row is None:
+                db.commit()
+                return None
+            rows = db.execute(
+                "SELECT idx, payload FROM items WHERE job_id = ? "
+                "AND (status = 'queued' OR (status = 'running' AND COALESCE(lease, 0) < ?)) ORDER BY idx LIMIT ?",
+                (row["job_id"], now, self.chunk_size)).fetchall()
+            indices = [r["idx"] for r in rows]
+            db.executemany("UPDATE items SET status = 'running', owner = ?, lease = ? WHERE job_id = ? AND idx = ?",
+                           ((self.owner, now + LEASE_SECONDS, row["job_id"], k) for k in indices))
+            db.execute("UPDATE jobs SET status = 'running', started = COALESCE(started, ?) "
+                       "WHERE id = ? AND status = 'queued'", (now, row["job_id"]))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        return (row["job_id"], row["kind"], json.loads(row["options"]), indices,
+                [json.loads(r["payload"]) for r in rows])
+
+    def _renew(self, db: sqlite3.Connection):
+        """Extend the leases of this dispatcher's running items"""
+        db.execute("UPDATE items SET lease = ? WHERE owner = ? AND status = 'running'",
+                   (time.time() + LEASE_SECONDS, self.owner))
+        db.commit()
+
+    def _release(self, db: sqlite3.Connection):
+        """Queue again the items this dispatcher claimed but did not finish"""
+        db.execute("UPDATE items SET status = 'queued', owner = NULL, lease = NULL "
+                   "WHERE owner = ? AND status = 'running'", (self.owner,))
+        db.commit()
+
+    def _store(self, db: sqlite3.Connection, job_id: str, indices: List[int], results: List[Dict]):
+        # Only items still leased here: one whose lease ran out may be running elsewhere
+        db.executemany("UPDATE items SET status = 'done', result = ?, lease = NULL "
+                       "WHERE job_id = ? AND idx = ? AND owner = ? AND status = 'running'",
+                       ((json.dumps(r, ensure_ascii=False), job_id, k, self.owner)
+                        for k, r in zip(indices, results)))
+        db.execute(
+            "UPDATE jobs SET items_done = (SELECT COUNT(*) FROM items WHERE job_id = ?1 AND status = 'done'), "
+            "zones_done = (SELECT COALESCE(SUM(zones), 0) FROM items WHERE job_id = ?1 AND status = 'done') "
+            "WHERE id = ?1", (job_id,))
+        db.execute(
+            "UPDATE jobs SET status = 'done', finished = ? WHERE id = ? AND status = 'running' AND NOT EXISTS "
+            "(SELECT 1 FROM items WHERE job_id = ? AND status IN ('queued', 'running'))",
+            (time.time(), job_id, job_id))
+        db.commit()
+
+    @staticmethod
+    def _fail(db: sqlite3.Connection, job_id: str, error: str):
+        db.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                   (error, time.time(), job_id))
+        db.execute("UPDATE items SET status = 'cancelled' WHERE job_id = ? AND status IN ('queued', 'running')",
+                   (job_id,))
+        db.commit()
+
+    def _run_here(self, db: sqlite3.Connection, kind: str, items: List[Dict], options: Dict) -> List[Dict]:
+        """A chunk on the dispatcher thread (workers=0), item by item with the leases renewed in between"""
+        results, renewed = [], time.monotonic()
+        for item in items:
+            results.extend(_run_chunk(kind, [item], options))
+            if time.monotonic() - renewed > LEASE_SECONDS / 3:
+                self._renew(db)
+                renewed = time.monotonic()
+        return results
+
+    def _dispatch(self):
+        db = self._connect()
+        renewed = time.monotonic()
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+        broken = False                       # The pool failed a submit and is waiting to be replaced
+        in_flight: Dict[Future, tuple] = {}  # future -> (chunk, attempts, pool)
+        waiting: List[tuple] = []            # (chunk, attempts) to submit again on a new pool
+
+        def submit(chunk: tuple, attempts: int):
+            nonlocal broken
+            _, kind, options, _, items = chunk
+            try:
+                in_flight[pool.submit(_run_chunk, kind, items, options)] = (chunk, attempts, pool)
+            except BrokenProcessPool:
+                broken = True
+                waiting.append((chunk, attempts))
+
+        try:
+            while not self._stop.is_set():
+                if broken and not any(used is pool for _, _, used in in_flight.values()):
+                    # No chunk of the broken pool left to charge (a worker died idle)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool, broken = ProcessPoolExecutor(max_workers=self.workers), False
+                if waiting and not broken:
+                    chunks = list(waiting)
+                    waiting.clear()
+                    for chunk, attempts in chunks:
+                        submit(chunk, attempts)
+                # Keep every worker busy with one chunk in reserve
+                while not broken and len(in_flight) + len(waiting) < max(1, 2 * self.workers):
+                    chunk = self._next_chunk(db)
+                    if chunk is None:
+                        break
+                    job_id, kind, options, indices, items = chunk
+                    if pool is None:
+                        try:
+                            self._store(db, job_id, indices, self._run_here(db, kind, items, options))
+                        except Exception as e:  # A bug in a job kind fails its job, not the dispatcher
+                            self._fail(db, job_id, f"{type(e).__name__}: {e}")
+                        continue
+                    submit(chunk, 0)
+                if not in_flight and not waiting:
+                    self._stop.wait(POLL_SECONDS)
+                    continue
+                if time.monotonic() - renewed > LEASE_SECONDS / 3:
+                    self._renew(db)
+                    renewed = time.monotonic()
+                done, _ = wait(list(in_flight), timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk, attempts, used = in_flight.pop(future)
+                    job_id, indices = chunk[0], chunk[3]
+                    try:
+                        self._store(db, job_id, indices, future.result())
+                    except BrokenProcessPool as e:
+                        if used is pool:
+                            # First chunk seen failing with this pool: the crash is charged to it,
+                            # the pool's other chunks run again with their attempts unchanged
+                            pool.shutdown(wait=False, cancel_futures=True)
+                            pool, broken = ProcessPoolExecutor(max_workers=self.workers), False
+                            if attempts >= CRASH_RETRIES:
+                                self._fail(db, job_id, f"{type(e).__name__}: {e}")
+                                continue
+                            attempts += 1
+                        waiting.append((chunk, attempts))
+                    except Exception as e:
+                        self._fail(db, job_id, f"{type(e).__name__}: {e}")
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            # Chunks that did not finish are queued again for any dispatcher
+            self._release(db)
+            db.close()
+
+
+# ========================================
+# === COMMAND LINE ===
+# ========================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="IEC 62305-2 background jobs")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Job database (SQLite)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("worker", help="Run jobs until interrupted")
+    p.add_argument("--workers", type=int)
+    p = sub.add_parser("submit", help="Queue a portfolio (.jsonl) as a risks job")
+    p.add_argument("input")
+    p.add_argument("--detail", choices=["totals", "zones", "full"], default="zones")
+    p = sub.add_parser("status")
+    p.add_argument("job", nargs="?")
+    p = sub.add_parser("cancel")
+    p.add_argument("job")
+    p = sub.add_parser("results")
+    p.add_argument("job")
+    p.add_argument("--offset", type=int, default=0)
+    p.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        queue = JobQueue(args.db, args.workers)
+        print(f"Running jobs from {args.db} ({queue.workers} workers)", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            queue.close()
+        return 0
+
+    queue = JobQueue(args.db, start=False)
+    try:
+        if args.command == "submit":
+            with open(args.input, encoding="utf-8") as f:
+                items = [json.loads(line) for line in f if line.strip()]
+            print(queue.submit(items, "risks", {"detail": args.detail}))
+        elif args.command == "status":
+            print(json.dumps(queue.status(args.job) if args.job else queue.jobs(), indent=1))
+        elif args.command == "cancel":
+            print("cancelled" if queue.cancel(args.job) else "not running")
+        elif args.command == "results":
+            for result in queue.results(args.job, args.offset, args.limit):
+                print(json.dumps(result, ensure_ascii=False))
+    except (KeyError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+IEC 62305-2 Monte Carlo Uncertainty Engine - R1, R2 and R4
+Any GeometricParameters / ZoneParameters / LineParameters field can be
+given a distribution. Samples are drawn in vectorized blocks, every block
+is evaluated with BatchEngineIEC62305 (one sample = one structure) and
+blocks are spread over a process pool. Block i always uses the i-th child
+of SeedSequence(seed), so results do not depend on the number of workers.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters, TOLERABLE_RISK
+from batch_engine import BatchEngineIEC62305, GEOM_FIELDS, ZONE_FIELDS, LINE_FIELDS, ZONE_FLAGS
+
+RISKS = ("R1", "R2", "R4")
+PERCENTILES = (5, 50, 95, 99)
+
+# Target zone + line rows per block (bounds the memory of one block)
+BLOCK_ROWS = 250_000
+
+
+# ========================================
+# === DISTRIBUTIONS ===
+# ========================================
+
+@dataclass(frozen=True)
+class Uniform:
+    """Uniform distribution on [low, high]"""
+    low: float
+    high: float
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return rng.uniform(self.low, self.high, size)
+
+
+@dataclass(frozen=True)
+class Normal:
+    """Normal distribution, clipped to [low, high]"""
+    mean: float
+    sd: float
+    low: float = -math.inf
+    high: float = math.inf
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return np.clip(rng.normal(self.mean, self.sd, size), self.low, self.high)
+
+
+@dataclass(frozen=True)
+class LogNormal:
+    """Log-normal distribution given its median and the sigma of ln(x)"""
+    median: float
+    sigma: float
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return rng.lognormal(math.log(self.median), self.sigma, size)
+
+
+@dataclass(frozen=True)
+class Triangular:
+    """Triangular distribution on [low, high] with the given mode"""
+    low: float
+    mode: float
+    high: float
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return rng.triangular(self.low, self.mode, self.high, size)
+
+
+@dataclass(frozen=True)
+class Choice:
+    """Discrete distribution over table values (uniform if p is None)"""
+    values: Sequence[float]
+    p: Optional[Sequence[float]] = None
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        return rng.choice(np.asarray(self.values, dtype=float), size, p=self.p)
+
+
+# A field maps to one distribution (every zone/line) or to {name: distribution}
+FieldDistributions = Dict[str, Union[object, Dict[str, object]]]
+
+
+# ========================================
+# === BLOCK EVALUATION (worker side) ===
+# ========================================
+
+def _row_values(rows, name: str):
+    """Column of a field across zones/lines; a scalar when all rows agree"""
+    values = np.array([math.nan if getattr(r, name) is None else getattr(r, name) for r in rows],
+                      dtype=float)
+    if len(values) and np.all((values == values[0]) | (np.isnan(values) & np.isnan(values[0]))):
+        return values[0]
+    return values
+
+
+def _block_columns(rows, names: List[str], dists: FieldDistributions,
+                   rng: np.random.Generator, n: int) -> Dict:
+    """Columns for n samples of `rows`, laid out sample-major (row = sample × len(rows) + k)"""
+    k = len(rows)
+    cols = {}
+    for name in names:
+        base = _row_values(rows, name)
+        dist = dists.get(name)
+        if dist is None:
+            cols[name] = base if np.ndim(base) == 0 else np.tile(base, n)
+        elif isinstance(dist, dict):
+            col = np.tile(np.broadcast_to(np.asarray(base, dtype=float), (k,)), n)
+            for j, row in enumerate(rows):
+                if row.name in dist:
+                    col[j::k] = dist[row.name].sample(rng, n)
+            cols[name] = col
+        else:
+            cols[name] = dist.sample(rng, n * k)
+    return cols
+
+
+def _run_block(args) -> Dict[str, Dict[str, np.ndarray]]:
+    """Evaluate one block of samples; returns per-sample totals and zone totals"""
+    geom, zones, lines, geom_dists, zone_dists, line_dists, n, seed = args
+    rng = np.random.default_rng(seed)
+
+    geom_cols = {}
+    for name in GEOM_FIELDS:
+        value = getattr(geom, name)
+        if name in geom_dists:
+            geom_cols[name] = geom_dists[name].sample(rng, n)
+        else:
+            geom_cols[name] = np.full(n, math.nan if value is None else value)
+
+    zone_cols = _block_columns(zones, ZONE_FIELDS, zone_dists, rng, n)
+    for name in ZONE_FLAGS:
+        zone_cols[name] = np.asarray(zone_cols[name], dtype=bool)
+    line_cols = _block_columns(lines, LINE_FIELDS, line_dists, rng, n)
+
+    engine = BatchEngineIEC62305(
+        geom_cols, zone_cols, line_cols,
+        zone_structure=np.repeat(np.arange(n), len(zones)),
+        line_structure=np.repeat(np.arange(n), len(lines)),
+    )
+    results = engine.compute_all_risks()
+    return {
+        risk: {
+            "total": results[risk]["total"],
+            "zones": np.asarray(results[risk]["zones"]["Total"]).reshape(n, len(zones)),
+        }
+        for risk in RISKS
+    }
+
+
+# ========================================
+# === RESULTS ===
+# ========================================
+
+def _summary(samples: np.ndarray, limit: float) -> Dict[str, float]:
+    out = {"mean": float(np.mean(samples)), "std": float(np.std(samples))}
+    for q, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+        out[f"p{q}"] = float(value)
+    out["p_exceed"] = float(np.mean(samples > limit))
+    return out
+
+
+class MonteCarloResult:
+    """Sampled totals: total[risk] has shape (n,), zones[risk] has shape (n, n_zones)"""
+
+    def __init__(self, zone_names: List[str], total: Dict[str, np.ndarray], zones: Dict[str, np.ndarray]):
+        self.zone_names = zone_names
+        self.total = total
+        self.zones = zones
+
+    @property
+    def n_samples(self) -> int:
+        return len(self.total["R1"])
+
+    def exceedance(self, risk: str = "R1", limit: Optional[float] = None) -> float:
+        """P(R > limit), e.g. P(R1 > 1e-5)"""
+        limit = TOLERABLE_RISK[risk] if limit is None else limit
+        return float(np.mean(self.total[risk] > limit))
+
+    def summary(self, limits: Optional[Dict[str, float]] = None) -> Dict:
+        """
+        Mean, std, percentiles and P(R > limit) of every risk total and zone total
+        {"R1": {"total": {...}, "zones": {name: {...}}}, ...}
+        """
+        limits = {**TOLERABLE_RISK, **(limits or {})}
+        return {
+            risk: {
+                "total": _summary(self.total[risk], limits[risk]),
+                "zones": {
+                    name: _summary(self.zones[risk][:, k], limits[risk])
+                    for k, name in enumerate(self.zone_names)
+                },
+            }
+            for risk in RISKS
+        }
+
+
+# ========================================
+# === ENGINE ===
+# ========================================
+
+class MonteCarloEngineIEC62305:
+    """IEC 62305-2 Monte Carlo Engine - distributions of R1, R2 and R4"""
+
+    def __init__(self, geom: GeometricParameters, zones: List[ZoneParameters], lines: List[LineParameters],
+                 geom_dists: Optional[Dict[str, object]] = None,
+                 zone_dists: Optional[FieldDistributions] = None,
+                 line_dists: Optional[FieldDistributions] = None):
+        self.geom = geom
+        self.zones = list(zones)
+        self.lines = list(lines) if lines else []
+        self.geom_dists = dict(geom_dists or {})
+        self.zone_dists = dict(zone_dists or {})
+        self.line_dists = dict(line_dists or {})
+
+        for dists, known in ((self.geom_dists, GEOM_FIELDS), (self.zone_dists, ZONE_FIELDS),
+                             (self.line_dists, LINE_FIELDS)):
+            unknown = set(dists) - set(known)
+            if unknown:
+                raise ValueError(f"Unknown parameters with a distribution: {sorted(unknown)}")
+        for dists, rows, record in ((self.zone_dists, self.zones, "zone"), (self.line_dists, self.lines, "line")):
+            names = {row.name for row in rows}
+            for field, dist in dists.items():
+                unknown = set(dist) - names if isinstance(dist, dict) else set()
+                if unknown:
+                    raise ValueError(f"Unknown {record} names in the distribution of '{field}': {sorted(unknown)}")
+
+    def run(self, n_samples: int, seed: int = 0, workers: Optional[int] = None,
+            block_size: Optional[int] = None) -> MonteCarloResult:
+        """
+        Draw n_samples studies and evaluate them.
+        workers: processes in the pool (default: CPU count; 1 runs in-process)
+        block_size: samples per block (default: about BLOCK_ROWS zone + line rows)
+        """
+        if n_samples < 1:
+            raise ValueError(f"n_samples must be >= 1, got {n_samples}")
+        if block_size is not None and block_size < 1:
+            raise ValueError(f"block_size must be >= 1, got {block_size}")
+        rows = max(1, len(self.zones) + len(self.lines))
+        block_size = block_size or max(1, BLOCK_ROWS // rows)
+        sizes = [block_size] * (n_samples // block_size)
+        if n_samples % block_size:
+            sizes.append(n_samples % block_size)
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        tasks = [
+            (self.geom, self.zones, self.lines, self.geom_dists, self.zone_dists, self.line_dists, n, s)
+            for n, s in zip(sizes, seeds)
+        ]
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(tasks) == 1:
+            blocks = [_run_block(t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                blocks = list(pool.map(_run_block, tasks))
+
+        return MonteCarloResult(
+            [z.name for z in self.zones],
+            {risk: np.concatenate([b[risk]["total"] for b in blocks]) for risk in RISKS},
+            {risk: np.concatenate([b[risk]["zones"] for b in blocks]) for risk in RISKS},
+        )
@@ -0,0 +1,164 @@
+"""
+IEC 62305-2 Ground Flash Density Raster - Ng by site coordinates
+Looks up Ng (flashes/km²/year) at (lat, lon) in a gridded Ng map stored as a
+memory-mapped binary file, so only the tiles that are actually sampled are
+read from disk. Tiles are kept in an LRU cache and batch lookups are grouped
+by tile, so a batch of sites reads every tile once.
+
+File format (.ngr, little endian):
+  header (64 bytes): magic b"NGRID1\\0\\0", rows (u4), cols (u4),
+                     north, west, cell_lat, cell_lon (f8), nodata (f4)
+  data: rows × cols float32, row-major, row 0 = northern edge
+Cell (i, j) covers lat [north - (i+1)·cell_lat, north - i·cell_lat] and
+lon [west + j·cell_lon, west + (j+1)·cell_lon]; its value sits at the
+cell centre. Use write_ng_grid() to convert a national grid.
+"""
+import math
+import struct
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Tuple
+
+import numpy as np
+
+from iec_62305 import GeometricParameters
+
+MAGIC = b"NGRID1\0\0"
+_HEADER = struct.Struct("<8sII4df")
+HEADER_SIZE = 64
+
+METHODS = ("bilinear", "nearest")
+
+
+def write_ng_grid(path: str, data, north: float, west: float, cell_lat: float, cell_lon: float,
+                  nodata: float = -9999.0):
+    """Write a 2-D Ng array (row 0 = north) in the .ngr format"""
+    data = np.asarray(data, dtype="<f4")
+    if data.ndim != 2:
+        raise ValueError("Ng grid must be a 2-D array")
+    header = _HEADER.pack(MAGIC, data.shape[0], data.shape[1], north, west, cell_lat, cell_lon, nodata)
+    with open(path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(np.nan_to_num(data, nan=nodata).tobytes())
+
+
+class NgRaster:
+    """Memory-mapped Ng grid with nearest/bilinear sampling and an LRU tile cache"""
+
+    def __init__(self, path: str, tile_size: int = 256, cache_tiles: int = 64):
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:8] != MAGIC:
+            raise ValueError(f"'{path}' is not an Ng grid file")
+        _, rows, cols, north, west, cell_lat, cell_lon, nodata = _HEADER.unpack_from(header)
+        self.path = path
+        self.shape = (rows, cols)
+        self.north, self.west = north, west
+        self.cell_lat, self.cell_lon = cell_lat, cell_lon
+        self.nodata = nodata
+        self.tile_size = tile_size
+        self.cache_tiles = cache_tiles
+        self._data = np.memmap(path, dtype="<f4", mode="r", offset=HEADER_SIZE, shape=(rows, cols))
+        self._tiles: "OrderedDict[Tuple[int, int], np.ndarray]" = OrderedDict()
+        self.stats = {"tile_reads": 0, "tile_hits": 0, "lookups": 0}
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(south, west, north, east)"""
+        rows, cols = self.shape
+        return (self.north - rows * self.cell_lat, self.west,
+                self.north, self.west + cols * self.cell_lon)
+
+    # === Tiles ===
+
+    def _tile(self, ti: int, tj: int) -> np.ndarray:
+        """Tile (ti, tj) with one extra row/column so bilinear never crosses tiles"""
+        key = (ti, tj)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            self.stats["tile_hits"] += 1
+            return tile
+        t = self.tile_size
+        tile = np.array(self._data[ti * t:(ti + 1) * t + 1, tj * t:(tj + 1) * t + 1], dtype=float)
+        tile[tile == self.nodata] = math.nan
+        self._tiles[key] = tile
+        self.stats["tile_reads"] += 1
+        if len(self._tiles) > self.cache_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    # === Sampling ===
+
+    def _grid_coords(self, lat: np.ndarray, lon: np.ndarray):
+        """Fractional (row, col) of the points relative to the cell centres"""
+        south, west, north, east = self.bounds
+        outside = (lat < south) | (lat > north) | (lon < west) | (lon > east) | np.isnan(lat) | np.isnan(lon)
+        if np.any(outside):
+            k = int(np.argmax(outside))
+            raise ValueError(f"Site ({lat[k]}, {lon[k]}) is outside the Ng grid {self.bounds}")
+        fi = (self.north - lat) / self.cell_lat - 0.5
+        fj = (lon - self.west) / self.cell_lon - 0.5
+        rows, cols = self.shape
+        return np.clip(fi, 0, rows - 1), np.clip(fj, 0, cols - 1)
+
+    def lookup_many(self, lat, lon, method: str = "bilinear") -> np.ndarray:
+        """
+        Ng at every (lat[k], lon[k]). Points are processed grouped by tile, so
+        each tile is read at most once per batch (given cache_tiles >= 1).
+        Cells holding nodata are skipped by bilinear sampling; NaN when no
+        valid cell is available.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}'. Available: {METHODS}")
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        fi, fj = self._grid_coords(lat, lon)
+        if method == "nearest":
+            i0, j0 = np.floor(fi + 0.5).astype(np.int64), np.floor(fj + 0.5).astype(np.int64)
+        else:
+            i0, j0 = np.floor(fi).astype(np.int64), np.floor(fj).astype(np.int64)
+
+        t = self.tile_size
+        ti, tj = i0 // t, j0 // t
+        order = np.lexsort((tj, ti))  # Spatial locality: row of tiles, then tile
+        key = ti[order] * (self.shape[1] // t + 1) + tj[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+
+        out = np.empty(len(lat))
+        for s, e in zip(starts, ends):
+            idx = order[s:e]
+            tile = self._tile(int(ti[idx[0]]), int(tj[idx[0]]))
+            r, c = i0[idx] - ti[idx[0]] * t, j0[idx] - tj[idx[0]] * t
+            if method == "nearest":
+                out[idx] = tile[r, c]
+                continue
+            r1 = np.minimum(r + 1, tile.shape[0] - 1)
+            c1 = np.minimum(c + 1, tile.shape[1] - 1)
+            di, dj = fi[idx] - i0[idx], fj[idx] - j0[idx]
+            values = np.stack([tile[r, c], tile[r, c1], tile[r1, c], tile[r1, c1]])
+            weights = np.stack([(1 - di) * (1 - dj), (1 - di) * dj, di * (1 - dj), di * dj])
+            valid = ~np.isnan(values)
+            weights = np.where(valid, weights, 0.0)
+            total = weights.sum(axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[idx] = np.where(total > 0, (np.where(valid, values, 0.0) * weights).sum(axis=0) / total,
+                                    math.nan)
+        self.stats["lookups"] += len(lat)
+        return out
+
+    def lookup(self, lat: float, lon: float, method: str = "bilinear") -> float:
+        """Ng at a single site"""
+        return float(self.lookup_many([lat], [lon], method)[0])
+
+    def geometry_at(self, geom: GeometricParameters, lat: float, lon: float,
+                    method: str = "bilinear") -> GeometricParameters:
+        """Copy of geom with Ng taken from the grid at (lat, lon)"""
+        ng = self.lookup(lat, lon, method)
+        if math.isnan(ng):
+            raise ValueError(f"No Ng data at ({lat}, {lon})")
+        return replace(geom, Ng=ng)
+
+    def clear_cache(self):
+        self._tiles.clear()
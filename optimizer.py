@@ -0,0 +1,167 @@
+"""
+IEC 62305-2 Protection-Measure Optimizer
+Searches the table options of the protection measures (LPS, SPDs, fire
+protection, shock protection, internal wiring) for the cheapest designs
+that keep R1 (and optionally R2/R4) within their limits.
+
+Every risk component is a product of non-negative factors, so each risk is
+monotone in every probability/reduction factor. With all undecided measures
+set to their most protective option, the risk is a lower bound for the
+whole branch: if it exceeds a limit the branch is pruned (branch-and-bound).
+"""
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters, TOLERABLE_RISK
+from incremental import IncrementalEngineIEC62305
+from tables import (
+    PB_VALUES, PSPD_VALUES, PEB_VALUES, RP_VALUES, PTA_VALUES, PTU_VALUES, KS3_VALUES,
+)
+
+# Measure -> (table, ZoneParameters fields set by the selected option)
+MEASURES = {
+    "pb": (PB_VALUES, ("pb",)),  # Table B.2 - LPS
+    "pspd": (PSPD_VALUES, ("pspd", "pspd_w", "pspd_z")),  # Table B.3 - Coordinated SPDs
+    "peb": (PEB_VALUES, ("peb", "peb_v")),  # Table B.7 - Equipotential bonding SPDs
+    "rp": (RP_VALUES, ("rp",)),  # Table C.4 - Fire protection
+    "pta": (PTA_VALUES, ("pta",)),  # Table B.1 - Shock protection (structure)
+    "ptu": (PTU_VALUES, ("ptu",)),  # Table B.6 - Shock protection (lines)
+    "ks3": (KS3_VALUES, ("ks3",)),  # Table B.5 - Internal wiring
+}
+
+ALL_ZONES = "*"
+
+
+@dataclass(order=True)
+class Design:
+    """A set of measures: choices[(zone name or "*", measure)] = table option"""
+    cost: float
+    choices: Dict[Tuple[str, str], str] = field(compare=False)
+    risks: Dict[str, float] = field(compare=False)
+
+
+@dataclass
+class _Variable:
+    zone: Optional[int]  # None: the measure applies to every zone
+    measure: str
+    options: List[Tuple[float, str, float]]  # (cost, label, value), cheapest first
+    best_value: float  # Most protective value (lowest probability)
+    min_cost: float
+
+
+class ProtectionOptimizer:
+    """Branch-and-bound search of the cheapest protection measures meeting the risk limits"""
+
+    def __init__(self, geom: GeometricParameters, zones: List[ZoneParameters], lines: List[LineParameters],
+                 costs: Dict[str, Dict[str, float]], limits: Optional[Dict[str, float]] = None,
+                 per_zone: bool = True):
+        """
+        costs: {measure: {table option label: cost}}. Only the listed options are
+            candidates; include the current option (cost 0) to allow keeping it.
+            Measures not listed keep the zone values.
+        limits: {risk: limit}, default {"R1": TOLERABLE_RISK["R1"]}
+        per_zone: choose measures zone by zone (cost counted per zone) or once
+            for the whole structure
+        """
+        self.limits = limits or {"R1": TOLERABLE_RISK["R1"]}
+        unknown = set(self.limits) - set(TOLERABLE_RISK)
+        if unknown:
+            raise ValueError(f"Unknown risks in limits: {sorted(unknown)}")
+
+        self.engine = IncrementalEngineIEC62305(geom, zones, lines)
+        self.variables: List[_Variable] = []
+        targets = range(len(zones)) if per_zone else [None]
+        for zone in targets:
+            for measure, option_costs in costs.items():
+                if measure not in MEASURES:
+                    raise ValueError(f"Unknown measure '{measure}'. Available: {list(MEASURES)}")
+                table = MEASURES[measure][0]
+                missing = set(option_costs) - set(table)
+                if missing:
+                    raise ValueError(f"Unknown options for '{measure}': {sorted(missing)}")
+                options = sorted((cost, label, table[label]) for label, cost in option_costs.items())
+                if not options:
+                    continue
+                self.variables.append(_Variable(
+                    zone=zone, measure=measure, options=options,
+                    best_value=min(value for _, _, value in options),
+                    min_cost=options[0][0],
+                ))
+
+    def _set(self, var: _Variable, value: float):
+        zones = range(len(self.engine.zones)) if var.zone is None else [var.zone]
+        for i in zones:
+            for field_name in MEASURES[var.measure][1]:
+                if getattr(self.engine.zones[i], field_name) != value:
+                    self.engine.update(i, field_name, value)
+
+    def _risks(self) -> Dict[str, float]:
+        return {risk: self.engine.results[risk]["total"] for risk in self.limits}
+
+    def _feasible(self) -> bool:
+        results = self.engine.results
+        return all(results[risk]["total"] <= limit for risk, limit in self.limits.items())
+
+    def solve(self, top_k: int = 5, time_budget: float = 10.0) -> Tuple[List[Design], Dict]:
+        """
+        Return the top_k cheapest feasible designs (cheapest first) and search
+        statistics {"nodes", "pruned", "complete", "elapsed"}. The search stops
+        after time_budget seconds with the best designs found so far.
+        """
+        start = time.perf_counter()
+        deadline = start + time_budget
+        variables = self.variables
+        # Cheapest possible cost of the undecided variables after depth d
+        remaining_cost = list(itertools.accumulate(
+            [v.min_cost for v in reversed(variables)], initial=0.0))[::-1]
+
+        best: List[Tuple[float, int, Design]] = []  # Max-heap on cost (negated)
+        stats = {"nodes": 0, "pruned": 0, "complete": True}
+        counter = itertools.count()
+        chosen: List[Tuple[_Variable, str]] = []
+
+        for var in variables:
+            self._set(var, var.best_value)
+
+        def bound() -> float:
+            return -best[0][0] if len(best) >= top_k else float("inf")
+
+        def search(depth: int, cost: float):
+            if time.perf_counter() > deadline:
+                stats["complete"] = False
+                return
+            stats["nodes"] += 1
+            # Undecided variables sit at their most protective value: lower bound on risk
+            if not self._feasible():
+                stats["pruned"] += 1
+                return
+            if depth == len(variables):
+                choices = {
+                    (ALL_ZONES if v.zone is None else self.engine.zones[v.zone].name, v.measure): label
+                    for v, label in chosen
+                }
+                design = Design(cost, choices, self._risks())
+                heapq.heappush(best, (-cost, next(counter), design))
+                if len(best) > top_k:
+                    heapq.heappop(best)
+                return
+
+            var = variables[depth]
+            for option_cost, label, value in var.options:
+                if cost + option_cost + remaining_cost[depth + 1] >= bound():
+                    stats["pruned"] += 1
+                    break  # Options are sorted by cost
+                self._set(var, value)
+                chosen.append((var, label))
+                search(depth + 1, cost + option_cost)
+                chosen.pop()
+                if not stats["complete"]:
+                    break
+            self._set(var, var.best_value)
+
+        search(0, 0.0)
+        stats["elapsed"] = time.perf_counter() - start
+        return sorted(design for _, _, design in best), stats
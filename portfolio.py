@@ -0,0 +1,572 @@
+"""
+IEC 62305-2 Portfolio Runner - headless, streaming
+Reads structures (geometry, lines, zones) row by row from JSON Lines or
+CSV, evaluates R1, R2 and R4 for each one and streams per-zone breakdowns
+to CSV or JSON Lines. Only one structure is held in memory at a time.
+
+Input values may be numbers or table labels from tables.py
+("LPS Clase II", "Enterrada", ...). Labels are matched through
+table_registry: case, accents, spacing and small misspellings are tolerated.
+
+JSON Lines - one structure per line:
+  {"id": "B-001", "geometry": {"L": 20, "W": 10, "H": 8, "Ng": 2.5, "Cd": "..."},
+   "lines": [{"name": "Línea 1", "length": 1000, "ci": "Enterrada"}],
+   "zones": [{"name": "Zona 1", "pb": "LPS Clase II", "nz": 10, "nt": 50}]}
+
+CSV - a `record` column (structure | line | zone), a `structure_id` column
+and one column per field; rows of a structure must be contiguous and the
+structure row comes first. Empty cells keep the field default.
+
+Binary study files (.i62s, see studyfile.py) are read column-wise from a
+memory map.
+
+Instead of Ng, the geometry may give the site ("lat", "lon"); Ng is then
+read from an Ng grid file (--ng-raster, see ng_raster.py).
+
+Usage:
+  python portfolio.py inventory.jsonl -o results.csv
+  python portfolio.py inventory.jsonl -o results.csv --cache results.sqlite
+  python portfolio.py inventory.jsonl -o results.csv --workers 32 --shard-report shards.jsonl
+
+With --workers other than 1 the structures are evaluated in shards on a
+process pool (see sharding.py); results keep the input order.
+"""
+import csv
+import itertools
+import json
+import sys
+from array import array
+from dataclasses import MISSING, fields, asdict, replace
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from iec_62305 import (
+    GeometricParameters, ZoneParameters, LineParameters, EngineIEC62305, TOLERABLE_RISK,
+)
+from table_registry import CodedTable, FIELD_TABLES
+
+RISK_COMPONENTS = {
+    "R1": ["Ra", "Rb", "Rc", "Rm", "Ru", "Rv", "Rw", "Rz"],
+    "R2": ["Rb2", "Rc2", "Rm2", "Rv2", "Rw2", "Rz2"],
+    "R4": ["Ra4", "Rb4", "Rc4", "Rm4", "Ru4", "Rv4", "Rw4", "Rz4"],
+}
+
+RESULT_COLUMNS = ["structure_id", "zone"] + [
+    column for risk, comps in RISK_COMPONENTS.items() for column in [risk] + comps
+]
+
+_TRUE = {"1", "true", "t", "yes", "y", "si", "sí", "s", "x"}
+_FALSE = {"0", "false", "f", "no", "n", ""}
+
+
+class Study(NamedTuple):
+    """One structure of a portfolio"""
+    id: str
+    geom: GeometricParameters
+    zones: List[ZoneParameters]
+    lines: List[LineParameters]
+    site: Optional[Tuple[float, float]] = None  # (lat, lon): Ng is read from an Ng grid
+
+
+# ========================================
+# === PARSING ===
+# ========================================
+
+def _field_types(cls) -> Dict[str, str]:
+    """field -> "str" | "bool" | "float" | "optional" (float or None)"""
+    out = {}
+    for f in fields(cls):
+        annotation = str(f.type)
+        if f.name == "name":
+            out[f.name] = "str"
+        elif "bool" in annotation:
+            out[f.name] = "bool"
+        elif "Optional" in annotation or f.default is None:
+            out[f.name] = "optional"
+        else:
+            out[f.name] = "float"
+    return out
+
+
+_GEOM_TYPES = _field_types(GeometricParameters)
+_LINE_TYPES = _field_types(LineParameters)
+_ZONE_TYPES = _field_types(ZoneParameters)
+
+
+def parse_value(field: str, raw, kind: str, table: Optional[CodedTable] = None):
+    """Convert a raw input (number, numeric string or table label) for a field"""
+    if kind == "str":
+        return str(raw)
+    if raw is None or (isinstance(raw, str) and raw.strip() == ""):
+        if kind == "bool":
+            return False
+        if kind == "optional":
+            return None
+        raise ValueError(f"'{field}' is empty")
+    if kind == "bool":
+        if isinstance(raw, bool):
+            return raw
+        text = str(raw).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        raise ValueError(f"'{field}': cannot read '{raw}' as true/false")
+    if isinstance(raw, (int, float)) and not isinstance(raw, bool):
+        return float(raw)
+    text = str(raw).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if table is not None:
+        try:
+            return table.value(text)
+        except ValueError as e:
+            raise ValueError(f"'{field}': {e}") from None
+    raise ValueError(f"'{field}': '{raw}' is not a number")
+
+
+_REQUIRED = {
+    cls: [f.name for f in fields(cls) if f.default is MISSING and f.default_factory is MISSING]
+    for cls in (GeometricParameters, LineParameters, ZoneParameters)
+}
+
+
+def _build(cls, types: Dict[str, str], tables: Dict[str, CodedTable], data: Dict, where: str):
+    kwargs = {}
+    for key, raw in data.items():
+        kind = types.get(key)
+        if kind is None:
+            raise ValueError(f"{where}: unknown field '{key}' for {cls.__name__}")
+        # Fast path: JSON numbers for numeric fields need no conversion
+        if (raw.__class__ is float or raw.__class__ is int) and kind in ("float", "optional"):
+            kwargs[key] = float(raw)
+            continue
+        # Empty cells keep the dataclass default
+        if kind in ("float", "str") and (raw is None or raw == ""):
+            continue
+        try:
+            kwargs[key] = parse_value(key, raw, kind, tables.get(key))
+        except ValueError as e:
+            raise ValueError(f"{where}: {e}") from None
+    missing = [name for name in _REQUIRED[cls] if name not in kwargs]
+    if missing:
+        raise ValueError(f"{where}: missing required fields {missing}")
+    return cls(**kwargs)
+
+
+def study_from_dict(data: Dict) -> Study:
+    """Study from {"id", "geometry", "lines", "zones"} (numbers or table labels)"""
+    sid = str(data.get("id", ""))
+    geometry = dict(data.get("geometry", {}))
+    site = None
+    if "lat" in geometry or "lon" in geometry:
+        lat, lon = geometry.pop("lat", None), geometry.pop("lon", None)
+        if lat in (None, "") or lon in (None, ""):
+            raise ValueError(f"structure '{sid}' geometry: give both lat and lon")
+        if geometry.get("Ng") not in (None, ""):
+            raise ValueError(f"structure '{sid}' geometry: give either Ng or lat/lon, not both")
+        site = (float(lat), float(lon))
+    geom = _build(GeometricParameters, _GEOM_TYPES, FIELD_TABLES["geometry"], geometry,
+                  f"structure '{sid}' geometry")
+    lines = [
+        _build(LineParameters, _LINE_TYPES, FIELD_TABLES["line"], {"name": f"Línea {j + 1}", **line},
+               f"structure '{sid}' line {j + 1}")
+        for j, line in enumerate(data.get("lines", []))
+    ]
+    zones = [
+        _build(ZoneParameters, _ZONE_TYPES, FIELD_TABLES["zone"], {"name": f"Zona {i + 1}", **zone},
+               f"structure '{sid}' zone {i + 1}")
+        for i, zone in enumerate(data.get("zones", []))
+    ]
+    check_zone_names(sid, (zone.name for zone in zones))
+    return Study(sid, geom, zones, lines, site)
+
+
+def check_zone_names(sid: str, names: Iterable[str]):
+    """Results are keyed by zone name: a name given twice would hide the results of one of the zones"""
+    seen = set()
+    for name in names:
+        if name in seen:
+            raise ValueError(f"structure '{sid}': zone name '{name}' is used by more than one zone")
+        seen.add(name)
+
+
+def study_to_dict(study: Study) -> Dict:
+    """Inverse of study_from_dict (numeric values)"""
+    geometry = asdict(study.geom)
+    if study.site is not None:
+        del geometry["Ng"]
+        geometry["lat"], geometry["lon"] = study.site
+    return {
+        "id": study.id,
+        "geometry": geometry,
+        "lines": [asdict(line) for line in study.lines],
+        "zones": [asdict(zone) for zone in study.zones],
+    }
+
+
+# ========================================
+# === READERS ===
+# ========================================
+
+def _detect_format(path: str) -> str:
+    path = path.lower()
+    if path.endswith(".csv"):
+        return "csv"
+    return "i62s" if path.endswith(".i62s") else "jsonl"
+
+
+def read_jsonl(stream: TextIO) -> Iterator[Study]:
+    for lineno, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {lineno}: invalid JSON ({e})") from None
+        yield study_from_dict(data)
+
+
+def read_csv(stream: TextIO) -> Iterator[Study]:
+    current: Optional[Dict] = None
+    for lineno, row in enumerate(csv.DictReader(stream), 2):
+        record = (row.pop("record", None) or "").strip().lower()
+        sid = (row.pop("structure_id", None) or "").strip()
+        values = {k: v for k, v in row.items() if k is not None and v not in (None, "")}
+        if record == "structure":
+            if current is not None:
+                yield study_from_dict(current)
+            current = {"id": sid, "geometry": values, "lines": [], "zones": []}
+        elif record in ("line", "zone"):
+            if current is None or current["id"] != sid:
+                raise ValueError(f"row {lineno}: {record} of structure '{sid}' "
+                                 f"is not preceded by its structure row")
+            current[record + "s"].append(values)
+        else:
+            raise ValueError(f"row {lineno}: unknown record type '{record}'")
+    if current is not None:
+        yield study_from_dict(current)
+
+
+def read_studies(stream: TextIO, fmt: str = "jsonl") -> Iterator[Study]:
+    """Stream studies from a JSON Lines or CSV text stream"""
+    if fmt == "csv":
+        return read_csv(stream)
+    if fmt == "jsonl":
+        return read_jsonl(stream)
+    raise ValueError(f"Unknown input format '{fmt}'")
+
+
+def resolve_sites(studies: Iterable[Study], raster, method: str = "bilinear",
+                  chunk: int = 10_000) -> Iterator[Study]:
+    """
+    Fill Ng of studies given by site from an NgRaster. Studies are buffered
+    in chunks so each chunk is looked up in one batch (grouped by tile).
+    """
+    studies = iter(studies)
+    while True:
+        batch = list(itertools.islice(studies, chunk))
+        if not batch:
+            return
+        located = [k for k, s in enumerate(batch) if s.site is not None]
+        if located:
+            if raster is None:
+                raise ValueError(f"structure '{batch[located[0]].id}' is given by lat/lon: "
+                                 f"an Ng grid is required")
+            ng = raster.lookup_many([batch[k].site[0] for k in located],
+                                    [batch[k].site[1] for k in located], method)
+            for k, value in zip(located, ng):
+                if value != value:  # NaN: nodata around the site
+                    raise ValueError(f"structure '{batch[k].id}': no Ng data at {batch[k].site}")
+                batch[k] = batch[k]._replace(geom=replace(batch[k].geom, Ng=float(value)))
+        yield from batch
+
+
+# ========================================
+# === EVALUATION & WRITERS ===
+# ========================================
+
+def zone_rows(study: Study, results: Dict[str, Dict]) -> Iterator[Dict]:
+    """Per-zone result rows (RESULT_COLUMNS) of an evaluated study"""
+    for z in study.zones:
+        row = {"structure_id": study.id, "zone": z.name}
+        for risk, comps in RISK_COMPONENTS.items():
+            data = results[risk]["zones"][z.name]
+            row[risk] = data["Total"]
+            for comp in comps:
+                row[comp] = data[comp]
+        yield row
+
+
+# Errors of data the engine cannot evaluate: the structure is left out and reported
+EVALUATION_ERRORS = (ArithmeticError, TypeError, ValueError)
+
+
+def failure(study: Study, error: Exception) -> Dict[str, str]:
+    """{"structure_id", "error"} of a structure left out (run_portfolio()'s "failed")"""
+    return {"structure_id": study.id, "error": f"{type(error).__name__}: {error}"}
+
+
+def study_values(study: Study) -> List[Tuple]:
+    """Per-zone result rows of a study as tuples in RESULT_COLUMNS order"""
+    results = EngineIEC62305(study.geom, study.zones, study.lines).compute_all_risks(report=False)
+    return [tuple(row[c] for c in RESULT_COLUMNS) for row in zone_rows(study, results)]
+
+
+def evaluate_studies(studies: Iterable[Study], failed: Optional[List[Dict]] = None) -> Iterator[Dict]:
+    """
+    Evaluate studies one at a time and yield per-zone result rows. With
+    failed, a structure the engine cannot evaluate is left out and reported
+    there (failure()) instead of raising
+    """
+    for study in studies:
+        try:
+            results = EngineIEC62305(study.geom, study.zones, study.lines).compute_all_risks()
+        except EVALUATION_ERRORS as e:
+            if failed is None:
+                raise
+            failed.append(failure(study, e))
+            continue
+        yield from zone_rows(study, results)
+
+
+def write_results(rows: Iterable[Dict], stream: TextIO, fmt: str = "csv") -> Dict[str, int]:
+    """Write result rows as they come; returns counters"""
+    stats = {"zones": 0, "structures": 0, "non_compliant": 0}
+    last_structure, structure_r1 = None, 0.0
+
+    def close_structure():
+        if last_structure is not None:
+            stats["structures"] += 1
+            if structure_r1 > TOLERABLE_RISK["R1"]:
+                stats["non_compliant"] += 1
+
+    writer = csv.DictWriter(stream, fieldnames=RESULT_COLUMNS) if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+    for row in rows:
+        if row["structure_id"] != last_structure:
+            close_structure()
+            last_structure, structure_r1 = row["structure_id"], 0.0
+        structure_r1 += row["R1"]
+        if writer:
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+        stats["zones"] += 1
+    close_structure()
+    return stats
+
+
+# ========================================
+# === PERSISTENT CACHE ===
+# ========================================
+
+_CACHE_BATCH = 500  # Studies looked up per cache round trip
+_VALUE_COLUMNS = len(RESULT_COLUMNS) - 2  # Stored per zone: the RESULT_COLUMNS after structure_id and zone
+
+
+def cache_version() -> str:
+    """Version tag of the stored results: ENGINE_VERSION and the stored columns"""
+    from cache import ENGINE_VERSION, source_digest
+    return source_digest(extra=ENGINE_VERSION + repr(RESULT_COLUMNS))
+
+
+def _pack_values(rows: List[Tuple]) -> bytes:
+    """Per-zone component results of study_values() rows, as one little-endian float64 block"""
+    values = array("d", [value for row in rows for value in row[2:]])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_values(study: Study, blob: bytes) -> Optional[List[Tuple]]:
+    """study_values() rows from _pack_values(); None if the block does not fit the study"""
+    values = array("d")
+    values.frombytes(blob)
+    if len(values) != _VALUE_COLUMNS * len(study.zones):
+        return None
+    if sys.byteorder != "little":
+        values.byteswap()
+    values = values.tolist()
+    return [(study.id, zone.name, *values[k * _VALUE_COLUMNS:(k + 1) * _VALUE_COLUMNS])
+            for k, zone in enumerate(study.zones)]
+
+
+def cached_values(studies: Iterable[Study], cache, evaluate: Callable[[List[Study]], Iterable[List[Tuple]]],
+                  window_zones: int = 0) -> Iterator[List[Tuple]]:
+    """
+    study_values() of each study ([] for a structure left out), with the
+    per-zone component results kept in cache (DiskResultCache) under the
+    study_hash() of the study: a study found there is not evaluated.
+    Studies are taken in windows of whole lookup batches (_CACHE_BATCH)
+    holding at least window_zones zones; evaluate(studies) gets the missing
+    studies of a window and yields the study_values() of each.
+    """
+    from cache import study_hash
+    studies = iter(studies)
+    while True:
+        window, missing, zones = [], [], 0  # window: (study, key, stored rows or None) in input order
+        while not window or zones < window_zones:
+            block = list(itertools.islice(studies, _CACHE_BATCH))
+            if not block:
+                break
+            keys = [study_hash(study.geom, study.zones, study.lines) for study in block]
+            found = cache.get_many(keys)
+            for study, key in zip(block, keys):
+                blob = found.get(key)
+                rows = _unpack_values(study, blob) if blob is not None else None
+                window.append((study, key, rows))
+                if rows is None:
+                    missing.append(study)
+                zones += len(study.zones)
+        if not window:
+            return
+        groups = iter(evaluate(missing) if missing else ())
+        computed = []
+        for study, key, rows in window:
+            if rows is None:
+                rows = next(groups)
+                if rows:
+                    computed.append((key, _pack_values(rows)))
+            yield rows
+        if computed:
+            cache.put_many(computed)
+
+
+def run_portfolio(input_path: str, output_path: str, input_format: Optional[str] = None,
+                  output_format: Optional[str] = None, ng_raster: Optional[str] = None,
+                  ng_method: str = "bilinear", cache_path: Optional[str] = None,
+                  cache_bytes: int = 256 * 2**20, workers: int = 1,
+                  shard_zones: Optional[int] = None) -> Dict:
+    """
+    Stream a portfolio file through the engine into a results file ("-" = stdin/stdout).
+    ng_raster: Ng grid file (.ngr) for structures given by lat/lon
+    cache_path: persistent result cache (SQLite) shared by successive runs:
+        a structure with the same inputs (study_hash()) as in a run of the
+        same engine version is not evaluated again (see cached_values). Its
+        counters are returned under "cache"
+    workers: 1 evaluates in this process; any other value shards the portfolio
+        over a process pool of that size (0 = one worker per CPU). The shard
+        statistics are returned under "sharding" and "shards"
+    The structures the engine could not evaluate are left out and returned
+    under "failed" (failure())
+    """
+    input_format = input_format or _detect_format(input_path)
+    output_format = output_format or _detect_format(output_path)
+    if input_format == "i62s":
+        from studyfile import StudyFile
+        src = StudyFile(input_path)
+    else:
+        src = sys.stdin if input_path == "-" else open(input_path, newline="", encoding="utf-8")
+    dst = sys.stdout if output_path == "-" else open(output_path, "w", newline="", encoding="utf-8")
+    cache = executor = None
+    failed: List[Dict] = []
+
+    def checked_values(study: Study) -> List[Tuple]:
+        try:
+            return study_values(study)
+        except EVALUATION_ERRORS as e:
+            failed.append(failure(study, e))
+            return []
+
+    try:
+        raster = None
+        if ng_raster:
+            from ng_raster import NgRaster
+            raster = NgRaster(ng_raster)
+        if workers != 1:
+            from sharding import SHARD_ZONES, ShardedExecutor
+            executor = ShardedExecutor(workers or None, shard_zones or SHARD_ZONES)
+        studies = iter(src) if input_format == "i62s" else read_studies(src, input_format)
+        studies = resolve_sites(studies, raster, ng_method)
+        if cache_path:
+            from cache import DiskResultCache
+            cache = DiskResultCache(cache_path, cache_bytes, cache_version())
+
+            def evaluate(missing: List[Study]) -> Iterable[List[Tuple]]:
+                if executor is None:
+                    return map(checked_values, missing)
+                return executor.evaluate_groups(missing, keep_pool=True)
+
+            window_zones = executor.buffered_zones if executor is not None else 0
+            groups = cached_values(studies, cache, evaluate, window_zones)
+            rows = (dict(zip(RESULT_COLUMNS, values)) for group in groups for values in group)
+        else:
+            rows = evaluate_studies(studies, failed) if executor is None else executor.evaluate(studies)
+        stats = write_results(rows, dst, output_format)
+        if cache is not None:
+            stats["cache"] = cache.info()
+        if executor is not None:
+            stats.update(sharding=executor.summary(), shards=executor.shards)
+            failed = executor.failed
+        stats["failed"] = failed
+        return stats
+    finally:
+        if executor is not None:
+            executor.close()
+        if cache is not None:
+            cache.close()
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse  # Command line only: library imports skip it
+    parser = argparse.ArgumentParser(description="IEC 62305-2 R1/R2/R4 for a portfolio of structures")
+    parser.add_argument("input", help="Inventory file (.jsonl, .csv or .i62s, '-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Results file (.csv or .jsonl, '-' for stdout)")
+    parser.add_argument("--input-format", choices=["jsonl", "csv", "i62s"])
+    parser.add_argument("--output-format", choices=["jsonl", "csv"])
+    parser.add_argument("--ng-raster", help="Ng grid (.ngr) for structures given by lat/lon")
+    parser.add_argument("--ng-method", choices=["bilinear", "nearest"], default="bilinear")
+    parser.add_argument("--cache", help="Persistent result cache (SQLite) reused across runs")
+    parser.add_argument("--cache-size", type=float, default=256, help="Cache size limit in MB")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes; other than 1 shards the portfolio over a pool (0 = one per CPU)")
+    parser.add_argument("--shard-zones", type=int, help="Zones per shard with --workers (default 2000)")
+    parser.add_argument("--shard-report", help="Write per-shard statistics here (JSON Lines)")
+    parser.add_argument("--profile", action="store_true", help="Print engine call counts and timings")
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format or ("csv" if args.output == "-" else None)
+    if args.profile:
+        import profiling
+        profiling.enable()
+    try:
+        stats = run_portfolio(args.input, args.output, args.input_format, output_format,
+                              args.ng_raster, args.ng_method, args.cache, int(args.cache_size * 2**20),
+                              args.workers, args.shard_zones)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.profile:
+            profiling.disable()
+            print(profiling.format_profile(profiling.get_profile()), file=sys.stderr)
+    print(f"{stats['structures']} structures, {stats['zones']} zones, "
+          f"{stats['non_compliant']} with R1 > {TOLERABLE_RISK['R1']:.0e}", file=sys.stderr)
+    if "cache" in stats:
+        info = stats["cache"]
+        print(f"cache: {info['hits']} hits, {info['misses']} misses, {info['evictions']} evictions, "
+              f"{info['bytes'] / 2**20:.1f} MB", file=sys.stderr)
+    if "sharding" in stats:
+        info = stats["sharding"]
+        rates = info.get("shard_zones_per_s", {"min": 0.0, "median": 0.0, "max": 0.0})
+        print(f"{info['shards']} shards on {info['workers']} workers, {info['zones_per_s']:.0f} zones/s; "
+              f"per shard {rates['min']:.0f} / {rates['median']:.0f} / {rates['max']:.0f} zones/s "
+              f"(min / median / max), {info['retried_shards']} retried", file=sys.stderr)
+        if args.shard_report:
+            with open(args.shard_report, "w", encoding="utf-8") as f:
+                for shard in stats["shards"]:
+                    f.write(json.dumps(shard) + "\n")
+    for failed in stats["failed"]:
+        print(f"failed: {failed['structure_id']}: {failed['error']}", file=sys.stderr)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
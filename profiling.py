@@ -0,0 +1,149 @@
+"""
+IEC 62305-2 Engine Profiling - call counters and timers per engine pass and kernel
+enable() wraps the EngineIEC62305 methods (the _calculate_* helpers, the
+line-frequency pass, the zone pass _compute, compute_risk_R1/R2/R4,
+compute_all_risks), the Calculators.calculate_* functions,
+ZoneParameters.__init__ and the zone kernels compiled from the formula spec
+(formulas.scalar_kernel, one "kernel R1+R2+R4"-style label per risk set,
+counted per zone) with counting timers; disable() puts the original
+functions back, so a disabled profiler costs nothing. Subclasses
+(IncrementalEngineIEC62305) are covered through inheritance.
+  with profiling():
+      run_portfolio(...)
+  print(format_profile(get_profile()))
+The risk formulas run inside the kernels, which evaluate every term and
+component of a zone in one generated function: kernel time is not broken
+down per term or component, and the _calculate_* helpers and Calculators
+only show where the engine still calls them (areas, line frequencies).
+Timings are per process and not thread-safe. total_s includes the wrapped
+functions called inside; self_s excludes them, so the self time of
+_compute is the zone signatures and the collection of the zone results.
+"""
+import functools
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import formulas
+from iec_62305 import EngineIEC62305, Calculators, ZoneParameters
+
+# Passes profiled besides the _calculate_* helpers and compute_* methods
+_ENGINE_PASSES = ("_line_frequencies", "_compute")
+
+_originals: Dict[tuple, object] = {}
+_stats: Dict[str, List[float]] = {}  # label -> [calls, total seconds, seconds in wrapped callees]
+_stack: List[float] = []  # Callee time accumulated by each active wrapped call
+
+
+def _targets():
+    """(owner, attribute, label) of every profiled function"""
+    for name, attr in vars(EngineIEC62305).items():
+        if callable(attr) and (name.startswith(("_calculate_", "compute_")) or name in _ENGINE_PASSES):
+            yield EngineIEC62305, name, f"EngineIEC62305.{name}"
+    for name, attr in vars(Calculators).items():
+        if isinstance(attr, staticmethod) and name.startswith("calculate_"):
+            yield Calculators, name, f"Calculators.{name}"
+    yield ZoneParameters, "__init__", "ZoneParameters.__init__"
+    yield formulas, "scalar_kernel", None
+
+
+def _timed(func, label: str):
+    stat = _stats.setdefault(label, [0, 0.0, 0.0])
+    clock = time.perf_counter
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _stack.append(0.0)
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = clock() - start
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] += _stack.pop()
+            if _stack:
+                _stack[-1] += elapsed
+    return wrapper
+
+
+def _timed_kernels(func):
+    """formulas.scalar_kernel returning timed kernels, labelled by risk set"""
+    timed: Dict[object, object] = {}
+
+    @functools.wraps(func)
+    def wrapper(risks, *args, **kwargs):
+        kernel = func(risks, *args, **kwargs)
+        wrapped = timed.get(kernel)
+        if wrapped is None:
+            wrapped = timed[kernel] = _timed(kernel, f"kernel {'+'.join(risks)}")
+        return wrapped
+    return wrapper
+
+
+def enable():
+    """Start counting (idempotent)"""
+    if _originals:
+        return
+    for owner, name, label in _targets():
+        attr = vars(owner)[name]
+        _originals[(owner, name)] = attr
+        if label is None:
+            setattr(owner, name, _timed_kernels(attr))
+        elif isinstance(attr, staticmethod):
+            setattr(owner, name, staticmethod(_timed(attr.__func__, label)))
+        else:
+            setattr(owner, name, _timed(attr, label))
+
+
+def disable():
+    """Restore the original functions; counters are kept until reset()"""
+    for (owner, name), attr in _originals.items():
+        setattr(owner, name, attr)
+    _originals.clear()
+    _stack.clear()
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+def reset():
+    """Zero every counter"""
+    for stat in _stats.values():
+        stat[:] = [0, 0.0, 0.0]
+
+
+@contextmanager
+def profiling(clear: bool = True):
+    """Profile the enclosed block: with profiling(): ..."""
+    if clear:
+        reset()
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def get_profile() -> Dict:
+    """
+    {"enabled": bool, "functions": [{"name", "calls", "total_s", "self_s",
+    "mean_us"}]} for the functions called at least once, by decreasing self time
+    """
+    functions = [
+        {"name": label, "calls": int(calls), "total_s": total, "self_s": total - callees,
+         "mean_us": total / calls * 1e6}
+        for label, (calls, total, callees) in _stats.items() if calls
+    ]
+    functions.sort(key=lambda f: f["self_s"], reverse=True)
+    return {"enabled": is_enabled(), "functions": functions}
+
+
+def format_profile(profile: Dict, top: int = 25) -> str:
+    """Text table of a profile from get_profile()"""
+    rows = [f"{'function':<42} {'calls':>10} {'total s':>10} {'self s':>10} {'mean µs':>10}"]
+    for f in profile["functions"][:top]:
+        rows.append(f"{f['name']:<42} {f['calls']:>10} {f['total_s']:>10.4f} "
+                    f"{f['self_s']:>10.4f} {f['mean_us']:>10.2f}")
+    return "\n".join(rows)
@@ -0,0 +1,479 @@
+"""
+IEC 62305-2 Report - streaming HTML report and tabular exports
+Turns engine results (compute_all_risks) into documents for the study file:
+
+HTML - the inputs of each structure, its totals against the tolerable risk,
+  a zone summary and, zone by zone, every component as N × P × L and every
+  intermediate value of R1, R2 and R4 (Spanish labels, as in the app)
+CSV  - one row per zone, risk and component ("components"), or one wide row
+  per zone with all the values of one risk ("R1", "R2", "R4")
+XLSX - a workbook with the zone summary, the component rows and one sheet
+  per risk, written without third-party packages
+
+Everything is generated zone by zone: iter_html_report() yields one chunk per
+zone and the writers pass rows through as they come, so the rendered
+document is never held in memory (only the results of one structure are).
+Formulas and value columns follow the specification in formulas.py.
+
+  with open("informe.html", "w", encoding="utf-8") as f:
+      write_html_report(f, evaluate(studies))
+  write_xlsx("informe.xlsx", lambda: evaluate(studies))
+
+Usage:
+  python report.py campus.json -o informe.html
+  python report.py inventory.jsonl --csv components.csv --xlsx informe.xlsx --study B-001
+"""
+import csv
+import datetime
+import sys
+import zipfile
+from html import escape
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+from xml.sax.saxutils import escape as xml_escape
+
+from iec_62305 import EngineIEC62305, TOLERABLE_RISK
+from formulas import RISKS
+from portfolio import Study, read_studies, resolve_sites
+
+RISK_TITLES = {
+    "R1": "Pérdida de Vida",
+    "R2": "Pérdida de Servicio",
+    "R4": "Pérdida Económica",
+}
+FLAG_LABELS = {  # flag -> (set, not set)
+    "is_critical": ("Zona crítica (riesgo de explosión u hospital): Rc, Rm, Rw y Rz activos",
+                    "Zona no crítica: Rc = Rm = Rw = Rz = 0"),
+    "has_animals": ("Zona con pérdida de animales: Ra4 y Ru4 activos",
+                    "Zona sin pérdida de animales: Ra4 = Ru4 = 0"),
+}
+# Intermediate values grouped as in the app, by their first letter
+GROUPS = (("N", "Frecuencias (eventos/año)"), ("P", "Probabilidades"), ("L", "Pérdidas"))
+ECONOMIC_GROUP = "Valores económicos"
+FREQUENCY_LABELS = {"N_line": "(Nl + Ndj)"}
+
+COMPONENT_COLUMNS = ["structure_id", "zone", "risk", "component", "formula",
+                     "N", "P", "L", "value", "active"]
+SUMMARY_COLUMNS = ["structure_id", "zone", "R1", "R2", "R4"]
+
+Evaluated = Tuple[Study, Dict[str, Dict]]
+
+
+# ========================================
+# === RESULT LAYOUT ===
+# ========================================
+
+def _probability_key(term: str) -> str:
+    """Name of a probability term in the zone results (Pm_r2 is reported as Pm)"""
+    return term[:-3] if term.endswith("_r2") else term
+
+
+def _formula(component) -> str:
+    frequency = FREQUENCY_LABELS.get(component.frequency, component.frequency)
+    return f"{frequency} × {_probability_key(component.probability)} × {component.loss}"
+
+
+def risk_columns(risk: str) -> List[str]:
+    """Value columns of a risk's zone results: Total, condition flag, components, intermediates"""
+    spec = RISKS[risk]
+    flag = [spec.flag] if spec.flag else []
+    return ["Total"] + flag + [c.name for c in spec.components] + list(spec.report)
+
+
+def _intermediate_groups(risk: str) -> List[Tuple[str, List[str]]]:
+    keys = list(RISKS[risk].report)
+    groups = [(title, [k for k in keys if k[0] == letter]) for letter, title in GROUPS]
+    rest = [k for k in keys if k[0] not in "NPL"]
+    if rest:
+        groups.append((ECONOMIC_GROUP, rest))
+    return [(title, group) for title, group in groups if group]
+
+
+def _frequency(zone_data: Dict, frequency: str) -> float:
+    if frequency == "N_line":
+        return zone_data["Nl"] + zone_data["Ndj"]
+    return zone_data[frequency]
+
+
+def evaluate(studies: Iterable[Study]) -> Iterator[Evaluated]:
+    """(study, compute_all_risks results) one structure at a time"""
+    for study in studies:
+        yield study, EngineIEC62305(study.geom, study.zones, study.lines).compute_all_risks()
+
+
+# ========================================
+# === TABULAR EXPORTS ===
+# ========================================
+
+def summary_rows(evaluated: Iterable[Evaluated]) -> Iterator[Dict]:
+    """One row per zone with its R1, R2 and R4 (SUMMARY_COLUMNS)"""
+    for study, results in evaluated:
+        zones = {risk: results[risk]["zones"] for risk in RISKS}
+        for name in zones["R1"]:
+            row = {"structure_id": study.id, "zone": name}
+            for risk in RISKS:
+                row[risk] = zones[risk][name]["Total"]
+            yield row
+
+
+def component_rows(evaluated: Iterable[Evaluated]) -> Iterator[Dict]:
+    """One row per zone, risk and component with its N, P and L (COMPONENT_COLUMNS)"""
+    for study, results in evaluated:
+        for risk, spec in RISKS.items():
+            formulas = [(c, _formula(c), _probability_key(c.probability)) for c in spec.components]
+            for name, data in results[risk]["zones"].items():
+                for component, formula, probability in formulas:
+                    yield {
+                        "structure_id": study.id, "zone": name, "risk": risk,
+                        "component": component.name, "formula": formula,
+                        "N": _frequency(data, component.frequency), "P": data[probability],
+                        "L": data[component.loss], "value": data[component.name],
+                        "active": component.when is None or bool(data[component.when]),
+                    }
+
+
+def risk_rows(evaluated: Iterable[Evaluated], risk: str) -> Iterator[Dict]:
+    """One wide row per zone with every value of one risk (structure_id, zone, risk_columns())"""
+    columns = risk_columns(risk)
+    for study, results in evaluated:
+        for name, data in results[risk]["zones"].items():
+            row = {"structure_id": study.id, "zone": name}
+            for key in columns:
+                row[key] = data[key]
+            yield row
+
+
+def table(evaluated: Iterable[Evaluated], kind: str) -> Tuple[List[str], Iterator[Dict]]:
+    """Columns and rows of one export: "summary", "components" or a risk ("R1", "R2", "R4")"""
+    if kind == "summary":
+        return SUMMARY_COLUMNS, summary_rows(evaluated)
+    if kind == "components":
+        return COMPONENT_COLUMNS, component_rows(evaluated)
+    if kind in RISKS:
+        return ["structure_id", "zone"] + risk_columns(kind), risk_rows(evaluated, kind)
+    raise ValueError(f"Unknown table '{kind}'")
+
+
+def write_csv(stream: TextIO, evaluated: Iterable[Evaluated], kind: str = "components") -> int:
+    """Write one export as CSV, row by row; returns the number of rows"""
+    columns, rows = table(evaluated, kind)
+    writer = csv.writer(stream)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([row[c] for c in columns])
+        count += 1
+    return count
+
+
+# ========================================
+# === XLSX ===
+# ========================================
+
+XLSX_SHEETS = (("Resumen", "summary"), ("Componentes", "components"),
+               ("R1", "R1"), ("R2", "R2"), ("R4", "R4"))
+XLSX_BLOCK_ROWS = 1000
+_XLSX_ROW_LIMIT = 1_048_576
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{sheets}</Types>'
+)
+_SHEET_TYPE = ('<Override PartName="/xl/worksheets/sheet{n}.xml" '
+               'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}</Relationships>'
+)
+_SHEET_REL = ('<Relationship Id="rId{n}" Target="worksheets/sheet{n}.xml" '
+              'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>')
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+               '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+               'state="frozen"/></sheetView></sheetViews><sheetData>')
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _cell(value) -> str:
+    kind = type(value)
+    if kind is float:
+        if value - value != 0.0:
+            return "<c/>"  # inf and NaN are not representable in a worksheet: left empty
+        return f"<c><v>{value!r}</v></c>"
+    if kind is bool:
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if kind is int:
+        return f"<c><v>{value}</v></c>"
+    if value is None:
+        return "<c/>"
+    return f'<c t="inlineStr"><is><t>{xml_escape(str(value))}</t></is></c>'
+
+
+def _write_sheet(out, columns: Sequence[str], rows: Iterable[Dict]) -> int:
+    """Rows go out in blocks of XLSX_BLOCK_ROWS (cells without references: they follow in order)"""
+    out.write(_SHEET_HEAD.encode())
+    out.write(("<row>" + "".join(map(_cell, columns)) + "</row>").encode())
+    block, count = [], 0
+    for count, row in enumerate(rows, 1):
+        if count >= _XLSX_ROW_LIMIT:
+            raise ValueError(f"more than {_XLSX_ROW_LIMIT - 1} rows in one sheet: export to CSV instead")
+        block.append("<row>" + "".join([_cell(row[name]) for name in columns]) + "</row>")
+        if len(block) == XLSX_BLOCK_ROWS:
+            out.write("".join(block).encode("utf-8"))
+            block = []
+    out.write(("".join(block) + _SHEET_TAIL).encode("utf-8"))
+    return count
+
+
+def write_xlsx(file, evaluated, sheets: Sequence[Tuple[str, str]] = XLSX_SHEETS) -> Dict[str, int]:
+    """
+    Write the exports as an .xlsx workbook (a path or a binary file object),
+    one sheet per (sheet name, table kind); returns the rows per sheet.
+    Each sheet is streamed into the archive as it is generated, so the
+    results are read once per sheet: evaluated is a list of (study, results)
+    or a callable returning a fresh iterator of them (lambda: evaluate(studies))
+    """
+    source = evaluated if callable(evaluated) else (lambda: iter(evaluated))
+    counts = {}
+    with zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        n_sheets = range(1, len(sheets) + 1)
+        zf.writestr("[Content_Types].xml",
+                    _CONTENT_TYPES.format(sheets="".join(_SHEET_TYPE.format(n=n) for n in n_sheets)))
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK.format(sheets="".join(
+            f'<sheet name="{xml_escape(name)}" sheetId="{n}" r:id="rId{n}"/>'
+            for n, (name, _) in zip(n_sheets, sheets))))
+        zf.writestr("xl/_rels/workbook.xml.rels",
+                    _WORKBOOK_RELS.format(sheets="".join(_SHEET_REL.format(n=n) for n in n_sheets)))
+        for n, (name, kind) in zip(n_sheets, sheets):
+            columns, rows = table(source(), kind)
+            with zf.open(f"xl/worksheets/sheet{n}.xml", "w", force_zip64=True) as out:
+                counts[name] = _write_sheet(out, columns, rows)
+    return counts
+
+
+# ========================================
+# === HTML REPORT ===
+# ========================================
+
+SUMMARY_BLOCK_ROWS = 500
+
+_STYLE = """
+body { font-family: sans-serif; font-size: 13px; margin: 2em; color: #222; }
+h1 { font-size: 22px; } h2 { font-size: 18px; margin-top: 2em; border-bottom: 2px solid #444; }
+h3 { font-size: 15px; margin-bottom: 0.3em; } h4 { font-size: 13px; margin: 0.6em 0 0.2em; }
+table { border-collapse: collapse; margin: 0.3em 0 0.8em; }
+th, td { border: 1px solid #bbb; padding: 2px 6px; text-align: right; }
+th { background: #eee; } td.t { text-align: left; }
+.ok { color: #176117; font-weight: bold; } .ko { color: #a31515; font-weight: bold; }
+.off { color: #999; } .note { color: #555; font-style: italic; }
+section.zone { page-break-inside: avoid; }
+"""
+
+
+def _num(value) -> str:
+    if isinstance(value, bool):
+        return "Sí" if value else "No"
+    return f"{value:.3e}"
+
+
+def _row(cells: Iterable[str], tag: str = "td") -> str:
+    return "<tr>" + "".join(f"<{tag}>{c}</{tag}>" for c in cells) + "</tr>"
+
+
+def _verdict(total: float, risk: str) -> str:
+    limit = TOLERABLE_RISK[risk]
+    if total <= limit:
+        return f'<span class="ok">CUMPLE</span> ({total:.3e} ≤ {limit:.0e})'
+    return f'<span class="ko">NO CUMPLE</span> ({total:.3e} &gt; {limit:.0e})'
+
+
+def _structure_head(index: int, study: Study, results: Dict[str, Dict]) -> str:
+    geom = study.geom
+    parts = [f'<h2 id="s{index}">Estructura {escape(str(study.id))}</h2>',
+             "<h3>Datos de entrada</h3><table>",
+             _row(["L (m)", "W (m)", "H (m)", "Ng (1/km²/año)", "Cd", "Ad (m²)", "Am (m²)"], "th"),
+             _row([f"{geom.L:g}", f"{geom.W:g}", f"{geom.H:g}", f"{geom.Ng:g}", f"{geom.Cd:g}",
+                   f"{results['R1']['Ad']:.2f}", f"{results['R1']['Am']:.2f}"]),
+             "</table>"]
+    if study.lines:
+        parts.append("<table>" + _row(["Línea", "Longitud (m)", "Ci", "Ce", "Ct",
+                                       "Lj (m)", "Wj (m)", "Hj (m)", "Cdj"], "th"))
+        for line in study.lines:
+            parts.append(f'<tr><td class="t">{escape(str(line.name))}</td>' + "".join(
+                f"<td>{v:g}</td>" for v in (line.length, line.ci, line.ce, line.ct,
+                                           line.Lj, line.Wj, line.Hj, line.Cdj)) + "</tr>")
+        parts.append("</table>")
+    else:
+        parts.append('<p class="note">Sin líneas entrantes</p>')
+    parts.append("<h3>Riesgo total</h3><table>" + _row(["Riesgo", "Total", "Tolerable RT", "Resultado"], "th"))
+    for risk in RISKS:
+        total = results[risk]["total"]
+        parts.append(f'<tr><td class="t">{risk} ({RISK_TITLES[risk]})</td><td>{total:.3e}</td>'
+                     f'<td>{TOLERABLE_RISK[risk]:.0e}</td><td class="t">{_verdict(total, risk)}</td></tr>')
+    parts.append("</table>")
+    return "".join(parts)
+
+
+def _zone_summary(index: int, results: Dict[str, Dict]) -> Iterator[str]:
+    """Zone summary table, in blocks of SUMMARY_BLOCK_ROWS rows"""
+    zones = {risk: results[risk]["zones"] for risk in RISKS}
+    block = ["<h3>Resumen por zona</h3><table>" + _row(["Zona", "R1", "R2", "R4"], "th")]
+    for k, name in enumerate(zones["R1"]):
+        block.append(f'<tr><td class="t"><a href="#s{index}-z{k}">{escape(str(name))}</a></td>'
+                     + "".join(f"<td>{zones[risk][name]['Total']:.3e}</td>" for risk in RISKS) + "</tr>")
+        if len(block) == SUMMARY_BLOCK_ROWS:
+            yield "".join(block)
+            block = []
+    block.append("</table>")
+    yield "".join(block)
+
+
+def _zone_section(anchor: str, name: str, results: Dict[str, Dict], layouts: Dict) -> str:
+    parts = [f'<section class="zone"><h2 id="{anchor}">{escape(str(name))}</h2>']
+    for risk, (spec, formulas, groups) in layouts.items():
+        data = results[risk]["zones"][name]
+        parts.append(f"<h3>{risk} ({RISK_TITLES[risk]}) = {data['Total']:.3e}</h3>")
+        if spec.flag:
+            on, off = FLAG_LABELS[spec.flag]
+            parts.append(f'<p class="note">{on if data[spec.flag] else off}</p>')
+        parts.append("<table>" + _row(["Componente", "Fórmula", "N", "P", "L", "Valor"],
+                                      "th"))
+        for component, formula, probability in formulas:
+            active = component.when is None or data[component.when]
+            css = "" if active else ' class="off"'
+            parts.append(f'<tr{css}><td class="t">{component.name}</td><td class="t">{formula}</td>'
+                         f"<td>{_num(_frequency(data, component.frequency))}</td>"
+                         f"<td>{_num(data[probability])}</td><td>{_num(data[component.loss])}</td>"
+                         f"<td>{_num(data[component.name])}</td></tr>")
+        parts.append("</table>")
+        for title, keys in groups:
+            parts.append(f"<h4>{title}</h4><table>" + _row(keys, "th")
+                         + _row(_num(data[k]) for k in keys) + "</table>")
+    parts.append("</section>")
+    return "".join(parts)
+
+
+def iter_html_report(evaluated: Iterable[Evaluated], title: Optional[str] = None) -> Iterator[str]:
+    """
+    The HTML report, in chunks: the document head, then per structure its
+    inputs, totals and zone summary, then one chunk per zone
+    """
+    layouts = {risk: (spec, [(c, _formula(c), _probability_key(c.probability)) for c in spec.components],
+                      _intermediate_groups(risk))
+               for risk, spec in RISKS.items()}
+    title = escape(title or "Informe de riesgo IEC 62305-2")
+    stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    yield (f'<!DOCTYPE html>\n<html lang="es"><head><meta charset="utf-8"><title>{title}</title>'
+           f"<style>{_STYLE}</style></head><body><h1>{title}</h1>"
+           f'<p class="note">Generado el {stamp}. Componentes R = N × P × L (IEC 62305-2); '
+           f"los componentes en gris no aplican a la zona.</p>")
+    for index, (study, results) in enumerate(evaluated):
+        yield _structure_head(index, study, results)
+        yield from _zone_summary(index, results)
+        for k, name in enumerate(results["R1"]["zones"]):
+            yield _zone_section(f"s{index}-z{k}", name, results, layouts)
+    yield "</body></html>\n"
+
+
+def write_html_report(stream: TextIO, evaluated: Iterable[Evaluated], title: Optional[str] = None) -> int:
+    """Write the HTML report chunk by chunk; returns the number of characters written"""
+    written = 0
+    for chunk in iter_html_report(evaluated, title):
+        stream.write(chunk)
+        written += len(chunk)
+    return written
+
+
+# ========================================
+# === COMMAND LINE ===
+# ========================================
+
+def _open_studies(path: str) -> Iterable[Study]:
+    """
+    Studies of a study file (.json, .i62s) or a portfolio inventory (.jsonl,
+    .csv); structures given by lat/lon are rejected (no Ng grid here)
+    """
+    lower = path.lower()
+    if lower.endswith((".json", ".i62s")):
+        import studyfile
+        studies = studyfile.load(path)
+        return _Reopen(lambda: resolve_sites(studies, None))
+
+    def stream():
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from resolve_sites(read_studies(f, "csv" if lower.endswith(".csv") else "jsonl"), None)
+    return _Reopen(stream)
+
+
+class _Reopen:
+    """A study stream that is read again from the file each time it is iterated"""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __iter__(self):
+        return self.factory()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse  # Command line only: library imports skip it
+    parser = argparse.ArgumentParser(description="IEC 62305-2 report and tabular exports of R1/R2/R4")
+    parser.add_argument("input", help="Study file (.json, .i62s) or inventory (.jsonl, .csv)")
+    parser.add_argument("-o", "--output", help="HTML report ('-' for stdout)")
+    parser.add_argument("--csv", help="CSV export")
+    parser.add_argument("--table", default="components", choices=["summary", "components"] + list(RISKS),
+                        help="Rows of the CSV export (default: one per zone, risk and component)")
+    parser.add_argument("--xlsx", help="XLSX workbook (summary, components and one sheet per risk)")
+    parser.add_argument("--study", action="append", help="Only this structure id (repeatable)")
+    parser.add_argument("--title", help="Report title")
+    args = parser.parse_args(argv)
+    if not (args.output or args.csv or args.xlsx):
+        parser.error("nothing to write: give -o, --csv and/or --xlsx")
+
+    try:
+        studies = _open_studies(args.input)
+        if args.study:
+            wanted, source = set(args.study), studies
+            studies = _Reopen(lambda: (s for s in source if s.id in wanted))
+        if args.output:
+            dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+            try:
+                size = write_html_report(dst, evaluate(studies), args.title)
+            finally:
+                if dst is not sys.stdout:
+                    dst.close()
+            print(f"report: {size / 2**20:.1f} MB", file=sys.stderr)
+        if args.csv:
+            with open(args.csv, "w", newline="", encoding="utf-8") as f:
+                rows = write_csv(f, evaluate(studies), args.table)
+            print(f"csv: {rows} rows", file=sys.stderr)
+        if args.xlsx:
+            counts = write_xlsx(args.xlsx, lambda: evaluate(studies))
+            print("xlsx: " + ", ".join(f"{name} {n} rows" for name, n in counts.items()), file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
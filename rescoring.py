@@ -0,0 +1,248 @@
+"""
+IEC 62305-2 Rescoring - risks as a dot product over stored coefficients
+Every component is N × P × L and every frequency N is proportional to Ng:
+  structure  Nd  = Ng × Ad × Cd × 1e-6                       Ra Rb Rc (Rb2 Rc2 Ra4 Rb4 Rc4)
+  near       Nm  = Ng × Am × 1e-6                            Rm (Rm2 Rm4)
+  line       Nl  = Ng × Σ 40·Ll × Ci × Ce × Ct × 1e-6        Ru Rv Rw (Rv2 Rw2 Ru4 Rv4 Rw4)
+  adjacent   Ndj = Ng × Σ Adj × Cdj × Ct × 1e-6              same as line
+  induced    Ni  = Ng × Σ 100·Ll × Ci × Ce × Ct × 1e-6       Rz (Rz2 Rz4)
+so a zone risk is Ng × Σ_s f_s × K_s, where the frequencies f_s = N_s / Ng
+only depend on the geometry and the lines and K_s (Σ P × L of the
+components fed by source s) only on the zone. The engine evaluates them
+once (EngineIEC62305.frequency_coefficients); a CoefficientTable keeps them
+for a whole portfolio, so a new Ng map or new line data re-scores every
+zone without the engine:
+  table = CoefficientTable.from_studies(studies)
+  table.zone_risks(ng=new_ng)                       (n_zones, 3) R1 R2 R4
+  table.set_lines(k, geom, new_lines)               one structure's frequencies
+  table.save("coefficients.npz")
+
+Usage:
+  python rescoring.py build inventory.jsonl -o coefficients.npz
+  python rescoring.py apply coefficients.npz -o results.csv --ng-raster ng_2025.ngr
+"""
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from iec_62305 import EngineIEC62305, FREQUENCY_SOURCES, SOURCE_COMPONENTS, GeometricParameters, LineParameters
+from portfolio import RISK_COMPONENTS, Study
+
+RISKS = list(RISK_COMPONENTS)
+SOURCES = list(FREQUENCY_SOURCES)
+COMPONENTS = [comp for comps in RISK_COMPONENTS.values() for comp in comps]
+
+# INCIDENCE[s, c] = 1 if source s feeds component c
+INCIDENCE = np.array([[float(comp in SOURCE_COMPONENTS[source]) for comp in COMPONENTS]
+                      for source in SOURCES])
+# RISK_OF[c, r] = 1 if component c belongs to risk r
+RISK_OF = np.array([[float(comp in RISK_COMPONENTS[risk]) for risk in RISKS] for comp in COMPONENTS])
+
+
+def study_frequencies(geom: GeometricParameters, lines: List[LineParameters]) -> np.ndarray:
+    """Ng-normalized frequencies (SOURCES order) of a geometry and its lines"""
+    frequencies = EngineIEC62305(geom, [], lines).frequency_coefficients()["frequencies"]
+    return np.array([frequencies[source] for source in SOURCES])
+
+
+def rescore_study(coefficients: Dict, ng: Optional[float] = None,
+                  frequencies: Optional[Dict[str, float]] = None) -> Dict[str, Dict]:
+    """
+    Risks from EngineIEC62305.frequency_coefficients() with a new Ng and/or
+    new frequencies ({source: N / Ng}, e.g. of new lines).
+    Returns {risk: {"total", "zones": {zone: {"Total", component...}}}}
+    """
+    ng = coefficients["Ng"] if ng is None else ng
+    f = dict(coefficients["frequencies"], **(frequencies or {}))
+    weight = {comp: ng * sum(f[s] for s in SOURCES if comp in SOURCE_COMPONENTS[s]) for comp in COMPONENTS}
+    out = {risk: {"total": 0.0, "zones": {}} for risk in RISKS}
+    for name, risks in coefficients["zones"].items():
+        for risk, comps in risks.items():
+            data = {comp: weight[comp] * pl for comp, pl in comps.items()}
+            data["Total"] = sum(data.values())
+            out[risk]["zones"][name] = data
+            out[risk]["total"] += data["Total"]
+    return out
+
+
+class CoefficientTable:
+    """
+    Frequencies per structure and P × L per zone and component of a portfolio.
+    structure[z] is the structure (row of ids, ng, frequencies) of zone z.
+    """
+
+    def __init__(self, ids: Sequence[str], ng: np.ndarray, frequencies: np.ndarray, sites: np.ndarray,
+                 zone_names: Sequence[str], structure: np.ndarray, coefficients: np.ndarray):
+        self.ids = list(ids)
+        self.ng = np.asarray(ng, dtype=np.float64)                    # (n_structures,) NaN: given by site
+        self.frequencies = np.asarray(frequencies, dtype=np.float64)  # (n_structures, SOURCES)
+        self.sites = np.asarray(sites, dtype=np.float64)              # (n_structures, 2) lat/lon or NaN
+        self.zone_names = list(zone_names)
+        self.structure = np.asarray(structure, dtype=np.intp)         # (n_zones,)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)  # (n_zones, COMPONENTS)
+        # K[z, r, s]: Σ P × L of the components of risk r fed by source s
+        self._by_source = np.einsum("zc,sc,cr->zrs", self.coefficients, INCIDENCE, RISK_OF)
+
+    @classmethod
+    def from_studies(cls, studies: Iterable[Study]) -> "CoefficientTable":
+        ids, ng, frequencies, sites = [], [], [], []
+        zone_names, structure, rows = [], [], []
+        for k, study in enumerate(studies):
+            engine = EngineIEC62305(study.geom, study.zones, study.lines)
+            coeffs = engine.frequency_coefficients()
+            ids.append(study.id)
+            ng.append(np.nan if study.site is not None else study.geom.Ng)
+            sites.append(study.site if study.site is not None else (np.nan, np.nan))
+            frequencies.append([coeffs["frequencies"][source] for source in SOURCES])
+            for z in study.zones:
+                zone = coeffs["zones"][z.name]
+                zone_names.append(z.name)
+                structure.append(k)
+                rows.append([zone[risk][comp] for risk, comps in RISK_COMPONENTS.items() for comp in comps])
+        return cls(ids, ng, np.reshape(frequencies, (-1, len(SOURCES))), np.reshape(sites, (-1, 2)),
+                   zone_names, structure, np.reshape(rows, (-1, len(COMPONENTS))))
+
+    def __len__(self) -> int:
+        return len(self.zone_names)
+
+    def set_lines(self, k: int, geom: GeometricParameters, lines: List[LineParameters]):
+        """New frequencies of structure k from its geometry and (changed) lines"""
+        self.frequencies[k] = study_frequencies(geom, lines)
+
+    def _inputs(self, ng, frequencies):
+        ng = self.ng if ng is None else np.broadcast_to(np.asarray(ng, dtype=np.float64), self.ng.shape)
+        if np.isnan(ng).any():
+            k = int(np.flatnonzero(np.isnan(ng))[0])
+            raise ValueError(f"structure '{self.ids[k]}' is given by lat/lon: an Ng is required")
+        frequencies = self.frequencies if frequencies is None else np.asarray(frequencies, dtype=np.float64)
+        return ng, frequencies
+
+    def zone_risks(self, ng=None, frequencies=None) -> np.ndarray:
+        """(n_zones, 3) R1, R2, R4 per zone; ng / frequencies per structure (default: stored)"""
+        ng, frequencies = self._inputs(ng, frequencies)
+        risks = np.einsum("zrs,zs->zr", self._by_source, frequencies[self.structure])
+        return risks * ng[self.structure, None]
+
+    def structure_risks(self, ng=None, frequencies=None) -> np.ndarray:
+        """(n_structures, 3) R1, R2, R4 per structure"""
+        zone = self.zone_risks(ng, frequencies)
+        out = np.zeros((len(self.ids), len(RISKS)))
+        np.add.at(out, self.structure, zone)
+        return out
+
+    def components(self, ng=None, frequencies=None) -> np.ndarray:
+        """(n_zones, COMPONENTS) every component of every zone"""
+        ng, frequencies = self._inputs(ng, frequencies)
+        weight = (frequencies @ INCIDENCE) * ng[:, None]
+        return self.coefficients * weight[self.structure]
+
+    def rows(self, ng=None, frequencies=None) -> Iterator[Dict]:
+        """Per-zone result rows (portfolio.RESULT_COLUMNS)"""
+        comps = self.components(ng, frequencies)
+        risks = comps @ RISK_OF
+        for z, name in enumerate(self.zone_names):
+            row = {"structure_id": self.ids[self.structure[z]], "zone": name}
+            values = comps[z].tolist()
+            c = 0
+            for r, (risk, names) in enumerate(RISK_COMPONENTS.items()):
+                row[risk] = float(risks[z, r])
+                for comp in names:
+                    row[comp] = values[c]
+                    c += 1
+            yield row
+
+    def save(self, path: str):
+        np.savez(path, ids=np.array(self.ids, dtype=str), ng=self.ng, frequencies=self.frequencies,
+                 sites=self.sites, zone_names=np.array(self.zone_names, dtype=str),
+                 structure=self.structure, coefficients=self.coefficients,
+                 sources=np.array(SOURCES), components=np.array(COMPONENTS))
+
+    @classmethod
+    def load(cls, path: str) -> "CoefficientTable":
+        with np.load(path) as data:
+            if data["sources"].tolist() != SOURCES or data["components"].tolist() != COMPONENTS:
+                raise ValueError(f"{path}: coefficients of another component layout")
+            return cls(data["ids"].tolist(), data["ng"], data["frequencies"], data["sites"],
+                       data["zone_names"].tolist(), data["structure"], data["coefficients"])
+
+    def __repr__(self):
+        return f"CoefficientTable({len(self.ids)} structures, {len(self)} zones)"
+
+
+# ========================================
+# === COMMAND LINE ===
+# ========================================
+
+def _read(path: str, fmt: Optional[str]) -> CoefficientTable:
+    from portfolio import _detect_format, read_studies
+    fmt = fmt or _detect_format(path)
+    if fmt == "i62s":
+        from studyfile import StudyFile
+        with StudyFile(path) as src:
+            return CoefficientTable.from_studies(src)
+    src = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        return CoefficientTable.from_studies(read_studies(src, fmt))
+    finally:
+        if src is not sys.stdin:
+            src.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    import time
+    from portfolio import write_results
+    parser = argparse.ArgumentParser(description="IEC 62305-2 re-scoring from stored Ng coefficients")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="Evaluate the coefficients of a portfolio")
+    p.add_argument("input", help="Inventory file (.jsonl, .csv or .i62s)")
+    p.add_argument("-o", "--output", required=True, help="Coefficient file (.npz)")
+    p.add_argument("--input-format", choices=["jsonl", "csv", "i62s"])
+    p = sub.add_parser("apply", help="Re-score a portfolio from its coefficients")
+    p.add_argument("coefficients")
+    p.add_argument("-o", "--output", default="-", help="Results file (.csv or .jsonl, '-' for stdout)")
+    p.add_argument("--output-format", choices=["jsonl", "csv"])
+    p.add_argument("--ng-raster", help="New Ng grid (.ngr) for the structures given by lat/lon")
+    p.add_argument("--ng-method", choices=["bilinear", "nearest"], default="bilinear")
+    p.add_argument("--ng-scale", type=float, default=1.0, help="Factor applied to every Ng")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            start = time.perf_counter()
+            table = _read(args.input, args.input_format)
+            table.save(args.output)
+            print(f"{table}: {time.perf_counter() - start:.2f} s", file=sys.stderr)
+            return 0
+        table = CoefficientTable.load(args.coefficients)
+        ng = table.ng.copy()
+        if args.ng_raster:
+            from ng_raster import NgRaster
+            located = np.flatnonzero(~np.isnan(table.sites[:, 0]))
+            ng[located] = NgRaster(args.ng_raster).lookup_many(table.sites[located, 0], table.sites[located, 1],
+                                                               args.ng_method)
+            if np.isnan(ng[located]).any():
+                k = int(located[np.isnan(ng[located])][0])
+                raise ValueError(f"structure '{table.ids[k]}': no Ng data at {tuple(table.sites[k])}")
+        start = time.perf_counter()
+        risks = table.zone_risks(ng * args.ng_scale)
+        elapsed = time.perf_counter() - start
+        output_format = args.output_format or ("csv" if args.output == "-" or args.output.endswith(".csv")
+                                               else "jsonl")
+        dst = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+        try:
+            stats = write_results(table.rows(ng * args.ng_scale), dst, output_format)
+        finally:
+            if dst is not sys.stdout:
+                dst.close()
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"{stats['structures']} structures, {stats['zones']} zones re-scored in {elapsed * 1e3:.1f} ms "
+          f"(R1 sum {risks[:, 0].sum():.3e})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+IEC 62305-2 Columnar Results - one column per component and intermediate
+Optional result form of compute_risk_R1/R2/R4(columnar=True): the per-zone
+values live in a numpy structured array indexed by zone (one field per
+component / intermediate, bool for the condition flags) instead of one dict
+per zone. Values shared by all zones (Nd, Nm, Nl, Ndj, Ni) are stored once.
+  res = engine.compute_risk_R1(columnar=True)
+  res["Rb"]            column view (no copy)
+  res[10:20]           zones 10..19 (no copy)
+  res.sort_by("Total") zones by decreasing total
+  res.to_dict()        the nested dict returned by compute_risk_R1()
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Values equal for every zone of a study: stored once, not per zone
+SHARED_KEYS = ("Nd", "Nm", "Nl", "Ndj", "Ni")
+
+
+class ZoneResults:
+    """Per-zone results of one risk as a structured array, plus total, Ad and Am"""
+
+    def __init__(self, names: List[str], data: np.ndarray, scalars: Dict[str, float],
+                 keys: Sequence[str], total: float, Ad: float, Am: float):
+        self.names = names
+        self.data = data
+        self.scalars = scalars
+        self.keys = tuple(keys)  # Key order of the per-zone dicts
+        self.total = total
+        self.Ad = Ad
+        self.Am = Am
+        self._index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.data.dtype.names or ())
+
+    def column(self, key: str) -> np.ndarray:
+        """Values of key for every zone (shared values are broadcast, read-only)"""
+        if key in self.scalars:
+            return np.broadcast_to(np.float64(self.scalars[key]), (len(self),))
+        return self.data[key]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        if isinstance(key, slice):
+            return self._subset(self.data[key], self.names[key])
+        raise TypeError("ZoneResults indices are column names or slices; use zone() or select()")
+
+    def _subset(self, data: np.ndarray, names: List[str]) -> "ZoneResults":
+        total = float(data["Total"].sum()) if len(names) else 0.0
+        return ZoneResults(names, data, self.scalars, self.keys, total, self.Ad, self.Am)
+
+    def select(self, selector) -> "ZoneResults":
+        """Zones picked by a boolean mask or an index array (copies the rows)"""
+        idx = np.flatnonzero(selector) if np.asarray(selector).dtype == bool else np.asarray(selector)
+        return self._subset(self.data[idx], [self.names[i] for i in idx])
+
+    def sort_by(self, key: str = "Total", descending: bool = True) -> "ZoneResults":
+        order = np.argsort(self.column(key), kind="stable")
+        return self.select(order[::-1] if descending else order)
+
+    def zone(self, name: str) -> Dict:
+        """Result dict of one zone (same keys as compute_risk_R1/R2/R4 zones)"""
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.names)}
+        row = self.data[self._index[name]]
+        return {k: self.scalars[k] if k in self.scalars else row[k].item() for k in self.keys}
+
+    def to_dict(self) -> Dict:
+        """The nested dict form {"total", "zones": {name: {...}}, "Ad", "Am"}"""
+        values = {k: self.data[k].tolist() for k in self.columns}
+        zones = {}
+        for i, name in enumerate(self.names):
+            zones[name] = {k: self.scalars[k] if k in self.scalars else values[k][i] for k in self.keys}
+        return {"total": self.total, "zones": zones, "Ad": self.Ad, "Am": self.Am}
+
+    def __repr__(self):
+        return f"ZoneResults({len(self)} zones, total={self.total:.3e})"
+
+
+class ZoneResultsBuilder:
+    """Fills a ZoneResults zone by zone from the engine's per-zone dicts"""
+
+    def __init__(self, n_zones: int):
+        self.n_zones = n_zones
+        self.names: List[str] = []
+        self.data: Optional[np.ndarray] = None
+        self.keys: List[str] = []
+        self.columns: List[str] = []
+        self.scalars: Dict[str, float] = {}
+
+    def _allocate(self, zone_data: Dict):
+        self.keys = list(zone_data)
+        self.columns = [k for k in self.keys if k not in SHARED_KEYS]
+        self.scalars = {k: zone_data[k] for k in self.keys if k in SHARED_KEYS}
+        dtype = [(k, np.bool_ if isinstance(zone_data[k], bool) else np.float64) for k in self.columns]
+        self.data = np.empty(self.n_zones, dtype=dtype)
+
+    def append(self, name: str, zone_data: Dict):
+        if self.data is None:
+            self._allocate(zone_data)
+        self.data[len(self.names)] = tuple([zone_data[k] for k in self.columns])
+        self.names.append(name)
+
+    def finish(self, total: float, Ad: float, Am: float) -> ZoneResults:
+        data = self.data if self.data is not None else np.empty(0, dtype=[("Total", np.float64)])
+        return ZoneResults(self.names, data, self.scalars, self.keys, total, Ad, Am)
@@ -0,0 +1,181 @@
+"""
+IEC 62305-2 Sensitivity Analysis - exact partial derivatives and elasticities
+Every input parameter is seeded as a dual number (value + sparse gradient)
+and the regular EngineIEC62305 formulas are evaluated once on those duals.
+Products, quotients, powers, clamps (min) and overrides propagate exact
+derivatives, so no finite differencing or re-runs are needed. At a clamp
+boundary (e.g. Ks4 = min(1/Uw, 1) at Uw = 1 kV) the derivative is that of
+the branch the engine takes.
+  derivative = ∂R/∂p
+  elasticity = ∂R/∂p × p / R   (% change of R per % change of p)
+"""
+from dataclasses import fields, replace
+from typing import Dict, List, Tuple
+
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters, EngineIEC62305
+
+RISKS = ("R1", "R2", "R4")
+
+
+class Dual:
+    """Forward-mode dual number: value and sparse gradient {parameter: ∂value/∂parameter}"""
+    __slots__ = ("value", "grad")
+
+    def __init__(self, value: float, grad: Dict[str, float] = None):
+        self.value = float(value)
+        self.grad = grad if grad is not None else {}
+
+    @staticmethod
+    def _combine(ga: Dict[str, float], ca: float, gb: Dict[str, float], cb: float) -> Dict[str, float]:
+        """ca·ga + cb·gb"""
+        out = {k: ca * v for k, v in ga.items()} if ca else {}
+        if cb:
+            for k, v in gb.items():
+                out[k] = out.get(k, 0.0) + cb * v
+        return out
+
+    # === Arithmetic ===
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value, self._combine(self.grad, 1.0, other.grad, 1.0))
+        return Dual(self.value + other, self.grad)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value - other.value, self._combine(self.grad, 1.0, other.grad, -1.0))
+        return Dual(self.value - other, self.grad)
+
+    def __rsub__(self, other):
+        return Dual(other - self.value, self._combine(self.grad, -1.0, {}, 0.0))
+
+    def __neg__(self):
+        return Dual(-self.value, self._combine(self.grad, -1.0, {}, 0.0))
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value * other.value,
+                        self._combine(self.grad, other.value, other.grad, self.value))
+        return Dual(self.value * other, self._combine(self.grad, other, {}, 0.0))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            q = self.value / other.value
+            return Dual(q, self._combine(self.grad, 1.0 / other.value, other.grad, -q / other.value))
+        return Dual(self.value / other, self._combine(self.grad, 1.0 / other, {}, 0.0))
+
+    def __rtruediv__(self, other):
+        q = other / self.value
+        return Dual(q, self._combine(self.grad, -q / self.value, {}, 0.0))
+
+    def __pow__(self, n):
+        # Only constant exponents appear in the engine (H**2, (...)**2)
+        return Dual(self.value ** n, self._combine(self.grad, n * self.value ** (n - 1), {}, 0.0))
+
+    # === Comparisons (on values, so branches and min() follow the scalar engine) ===
+
+    def __eq__(self, other):
+        return self.value == (other.value if isinstance(other, Dual) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return self.value < (other.value if isinstance(other, Dual) else other)
+
+    def __le__(self, other):
+        return self.value <= (other.value if isinstance(other, Dual) else other)
+
+    def __gt__(self, other):
+        return self.value > (other.value if isinstance(other, Dual) else other)
+
+    def __ge__(self, other):
+        return self.value >= (other.value if isinstance(other, Dual) else other)
+
+    def __bool__(self):
+        return self.value != 0
+
+    def __float__(self):
+        return self.value
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Dual({self.value!r}, {len(self.grad)} partials)"
+
+
+def _seed(obj, prefix: str):
+    """Copy of a parameter dataclass with every numeric field as a seeded Dual"""
+    changes = {}
+    for f in fields(obj):
+        value = getattr(obj, f.name)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        key = f"{prefix}{f.name}"
+        changes[f.name] = Dual(value, {key: 1.0})
+    return replace(obj, **changes)
+
+
+def parameter_value(geom: GeometricParameters, zones: List[ZoneParameters],
+                    lines: List[LineParameters]) -> Dict[str, float]:
+    """Current value of every parameter key used in the sensitivity report"""
+    out = {}
+    prefixed = [(geom, "")] + [(l, f"line:{l.name}.") for l in lines] + [(z, f"zone:{z.name}.") for z in zones]
+    for obj, prefix in prefixed:
+        for f in fields(obj):
+            value = getattr(obj, f.name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                out[f"{prefix}{f.name}"] = float(value)
+    return out
+
+
+def _report(value, params: Dict[str, float]) -> Dict:
+    """Derivative and elasticity of one risk value for every parameter it depends on"""
+    if not isinstance(value, Dual):
+        return {"value": float(value), "parameters": {}}
+    R = value.value
+    out = {}
+    for key, d in value.grad.items():
+        p = params[key]
+        out[key] = {"derivative": d, "elasticity": d * p / R if R else 0.0}
+    return {"value": R, "parameters": out}
+
+
+def compute_sensitivities(engine) -> Dict:
+    """
+    Sensitivities of R1, R2 and R4 (totals and zones) for an EngineIEC62305.
+    Parameter keys: geometric fields by name ("Ng", "Cd", "H", ...), line and
+    zone fields as "line:<name>.<field>" / "zone:<name>.<field>"
+    ("line:Línea Principal.length", "zone:Zona 1.pb"), so a line and a zone
+    with the same name do not share keys.
+    Returns {"R1": {"total": report, "zones": {name: report}}, ...} where
+    report = {"value": R, "parameters": {key: {"derivative", "elasticity"}}}
+    """
+    # A ZoneTable is seeded through plain ZoneParameters copies of its rows
+    engine_zones = engine.zones.to_zones() if hasattr(engine.zones, "to_zones") else engine.zones
+    geom = _seed(engine.geom, "")
+    lines = [_seed(l, f"line:{l.name}.") for l in engine.lines]
+    zones = [_seed(z, f"zone:{z.name}.") for z in engine_zones]
+    params = parameter_value(engine.geom, engine_zones, engine.lines)
+
+    results = EngineIEC62305(geom, zones, lines).compute_all_risks()
+    return {
+        risk: {
+            "total": _report(results[risk]["total"], params),
+            "zones": {name: _report(data["Total"], params)
+                      for name, data in results[risk]["zones"].items()},
+        }
+        for risk in RISKS
+    }
+
+
+def rank_parameters(report: Dict, top: int = 10) -> List[Tuple[str, float, float]]:
+    """Tornado ranking: [(parameter, elasticity, derivative)] by decreasing |elasticity|"""
+    items = [(key, s["elasticity"], s["derivative"]) for key, s in report["parameters"].items()
+             if s["derivative"] != 0.0]
+    items.sort(key=lambda item: abs(item[1]), reverse=True)
+    return items[:top]
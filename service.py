@@ -0,0 +1,257 @@
+"""
+IEC 62305-2 Calculation Service - local HTTP/JSON
+Serves R1, R2 and R4 to other processes on the same host (standard library
+http.server, no framework). Studies use the portfolio JSON form
+({"id", "geometry", "lines", "zones"}, numbers or table labels).
+
+  POST /v1/risks          one study            -> result
+  POST /v1/risks/batch    {"studies": [...]}   -> {"results": [...]} (input order)
+  GET  /v1/health
+  GET  /v1/stats          request counts, studies/s, latency percentiles
+
+?detail=totals|zones|full selects the result size: risk totals and
+compliance, plus per-zone component rows (default), or the full engine
+breakdown. Single studies are evaluated on the request thread; batches are
+split into chunks for a process pool that is started and warmed up with the
+server. In a batch, an invalid study yields {"id", "error"} in its slot.
+
+Usage:
+  python service.py --port 8062 --workers 4
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from iec_62305 import EngineIEC62305, TOLERABLE_RISK
+from portfolio import study_from_dict, zone_rows
+
+DETAILS = ("totals", "zones", "full")
+ENDPOINTS = ("/v1/risks", "/v1/risks/batch")  # Keys of /v1/stats; any other path counts as "other"
+MAX_BODY = 64 * 2**20
+CHUNKS_PER_WORKER = 4
+MAX_CHUNK = 500
+LATENCY_WINDOW = 10_000  # Latencies kept per endpoint for the percentiles
+PERCENTILES = (50, 90, 99)
+
+
+# ========================================
+# === EVALUATION (request thread or worker) ===
+# ========================================
+
+def evaluate(data: Dict, detail: str = "zones") -> Dict:
+    """
+    Result of one study dict; raises ValueError or TypeError on invalid input
+    and ArithmeticError on values the engine cannot evaluate (nt = 0, ...)
+    """
+    study = study_from_dict(data)
+    results = EngineIEC62305(study.geom, study.zones, study.lines).compute_all_risks()
+    out = {"id": study.id}
+    for risk in ("R1", "R2", "R4"):
+        out[risk] = results[risk]["total"]
+    out["compliant"] = {risk: results[risk]["total"] <= limit for risk, limit in TOLERABLE_RISK.items()}
+    if detail == "zones":
+        out["zones"] = [{k: v for k, v in row.items() if k != "structure_id"}
+                        for row in zone_rows(study, results)]
+    elif detail == "full":
+        out["results"] = results
+    return out
+
+
+def evaluate_chunk(studies: List[Dict], detail: str) -> List[Dict]:
+    out = []
+    for data in studies:
+        try:
+            out.append(evaluate(data, detail))
+        except (ValueError, TypeError) as e:
+            out.append({"id": _study_id(data), "error": str(e)})
+        except ArithmeticError as e:
+            out.append({"id": _study_id(data), "error": f"{type(e).__name__}: {e}"})
+    return out
+
+
+def _study_id(data) -> Optional[str]:
+    return data.get("id") if isinstance(data, dict) else None
+
+
+def _warm_up(_: int) -> int:
+    return os.getpid()
+
+
+# ========================================
+# === STATISTICS ===
+# ========================================
+
+class LatencyStats:
+    """Request counts and latency percentiles per endpoint (thread-safe)"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, seconds: float, studies: int, ok: bool):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            counts = self._counts.setdefault(endpoint, {"requests": 0, "errors": 0, "studies": 0})
+            counts["requests"] += 1
+            counts["errors"] += not ok
+            counts["studies"] += studies
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            uptime = time.time() - self.started
+            endpoints = {}
+            for endpoint, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                entry = dict(self._counts[endpoint])
+                for q in PERCENTILES:
+                    rank = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+                    entry[f"p{q}_ms"] = ordered[rank] * 1e3
+                entry["studies_per_s"] = entry["studies"] / uptime if uptime else 0.0
+                endpoints[endpoint] = entry
+            return {"uptime_s": uptime, "endpoints": endpoints}
+
+
+# ========================================
+# === SERVER ===
+# ========================================
+
+class RiskService(ThreadingHTTPServer):
+    """HTTP server holding the warm process pool and the statistics"""
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8062, workers: Optional[int] = None):
+        super().__init__((host, port), _Handler)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+        if self.pool is not None:
+            # Start every worker now so the first batch does not pay for process start-up
+            list(self.pool.map(_warm_up, range(self.workers)))
+        self.stats = LatencyStats()
+
+    def evaluate_batch(self, studies: List[Dict], detail: str) -> List[Dict]:
+        if self.pool is None or len(studies) < 2:
+            return evaluate_chunk(studies, detail)
+        size = max(1, min(MAX_CHUNK, math.ceil(len(studies) / (self.workers * CHUNKS_PER_WORKER))))
+        chunks = [studies[k:k + size] for k in range(0, len(studies), size)]
+        results = []
+        for part in self.pool.map(evaluate_chunk, chunks, [detail] * len(chunks)):
+            results.extend(part)
+        return results
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive: clients reuse the connection
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+    server: RiskService
+
+    def log_message(self, format, *args):
+        pass  # Per-request logging would dominate small requests; see /v1/stats
+
+    def _send(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        raw = self.headers.get("Content-Length") or "0"
+        try:
+            length = int(raw)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True  # The body cannot be delimited
+            raise ValueError(f"Invalid Content-Length '{raw}'")
+        if length > MAX_BODY:
+            raise _BodyTooLarge(f"Request body larger than {MAX_BODY} bytes")
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/v1/health":
+            self._send(200, {"status": "ok", "workers": self.server.workers})
+        elif path == "/v1/stats":
+            self._send(200, self.server.stats.snapshot())
+        else:
+            self._send(404, {"error": f"Unknown endpoint {path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        detail = parse_qs(url.query).get("detail", ["zones"])[0]
+        studies, status = 0, 200
+        try:
+            data = self._read_json()
+            if detail not in DETAILS:
+                raise ValueError(f"Unknown detail '{detail}'. Options: {DETAILS}")
+            if url.path == "/v1/risks":
+                if not isinstance(data, dict):
+                    raise ValueError("Expected a study object")
+                studies = 1
+                payload = evaluate(data, detail)
+            elif url.path == "/v1/risks/batch":
+                if not isinstance(data, dict) or not isinstance(data.get("studies"), list):
+                    raise ValueError('Expected {"studies": [...]}')
+                studies = len(data["studies"])
+                payload = {"results": self.server.evaluate_batch(data["studies"], detail)}
+            else:
+                status, payload = 404, {"error": f"Unknown endpoint {url.path}"}
+        except _BodyTooLarge as e:
+            status, payload = 413, {"error": str(e)}
+            self.close_connection = True  # The body was not read
+        except (ValueError, TypeError) as e:  # json.JSONDecodeError is a ValueError
+            status, payload = 400, {"error": str(e)}
+        except ArithmeticError as e:  # Values the engine cannot evaluate (nt = 0, ...)
+            status, payload = 400, {"error": f"{type(e).__name__}: {e}"}
+        except Exception as e:  # Answer and count the request instead of dropping the connection
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        try:
+            self._send(status, payload)
+        finally:
+            endpoint = url.path if url.path in ENDPOINTS else "other"
+            self.server.stats.record(endpoint, time.perf_counter() - start, studies, status == 200)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="IEC 62305-2 R1/R2/R4 HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8062)
+    parser.add_argument("--workers", type=int, help="Batch worker processes (default: CPU count, 0: none)")
+    args = parser.parse_args(argv)
+
+    server = RiskService(args.host, args.port, args.workers)
+    print(f"Serving on http://{args.host}:{server.server_port} ({server.workers} workers)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+IEC 62305-2 Sharded Portfolio Executor - one portfolio over a process pool
+The structure stream is cut into shards of about SHARD_ZONES zones (the cost
+of a structure grows with its zones, not with the structure count; a
+structure is never split) and the shards are evaluated on a process pool.
+Per-zone result rows come back in input order, with a bounded number of
+shards in flight or waiting for an earlier one, so memory does not grow with
+the portfolio.
+
+Failures stay in their shard:
+  - a structure that the engine cannot evaluate (invalid data) is skipped
+    and reported in `failed`; the rest of its shard is kept
+  - a shard whose worker raised or died (out of memory, killed) is
+    retried up to `retries` times, on a new pool if the old one broke,
+    and then reported in `failed` structure by structure
+
+  executor = ShardedExecutor(workers=32, shard_zones=2000)
+  for row in executor.evaluate(studies): ...      # portfolio.RESULT_COLUMNS rows
+  for rows in executor.evaluate_groups(studies): ...  # study_values() of each study
+  executor.shards    -> per-shard structures, zones, seconds, zones/s, attempts, pid
+  executor.summary() -> totals and the spread of shard throughput
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from portfolio import EVALUATION_ERRORS, RESULT_COLUMNS, Study, failure, study_values
+
+SHARD_ZONES = 2000
+RETRIES = 2
+IN_FLIGHT_PER_WORKER = 2   # Shards submitted per worker (one running, one queued)
+BUFFERED_PER_WORKER = 8    # Shards in flight or finished but waiting for an earlier one
+
+
+# ========================================
+# === SHARDS ===
+# ========================================
+
+def make_shards(studies: Iterable[Study], shard_zones: int = SHARD_ZONES) -> Iterator[List[Study]]:
+    """Consecutive groups of whole structures holding at least shard_zones zones (the last one may hold fewer)"""
+    if shard_zones < 1:
+        raise ValueError("shard_zones must be >= 1")
+    shard, zones = [], 0
+    for study in studies:
+        shard.append(study)
+        zones += len(study.zones)
+        if zones >= shard_zones:
+            yield shard
+            shard, zones = [], 0
+    if shard:
+        yield shard
+
+
+# ========================================
+# === WORKER SIDE ===
+# ========================================
+
+def evaluate_shard(studies: List[Study]) -> Dict:
+    """
+    Rows (tuples in RESULT_COLUMNS order, cheaper to send back than dicts) of
+    one shard with the row count of each study (0 if it failed), the
+    structures that failed and the shard timings
+    """
+    start = time.perf_counter()
+    rows, counts, errors = [], [], []
+    for study in studies:
+        try:
+            values = study_values(study)
+        except EVALUATION_ERRORS as e:
+            errors.append(failure(study, e))
+            values = []
+        rows.extend(values)
+        counts.append(len(values))
+    return {"rows": rows, "counts": counts, "errors": errors, "seconds": time.perf_counter() - start,
+            "pid": os.getpid()}
+
+
+# ========================================
+# === EXECUTOR ===
+# ========================================
+
+class ShardedExecutor:
+    """Evaluates a stream of studies shard by shard on a process pool, yielding rows in input order"""
+
+    def __init__(self, workers: Optional[int] = None, shard_zones: int = SHARD_ZONES,
+                 retries: int = RETRIES):
+        """workers: pool size (None = one per CPU, 0 = evaluate in this process)"""
+        if shard_zones < 1:
+            raise ValueError("shard_zones must be >= 1")
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.shard_zones = shard_zones
+        self.retries = retries
+        self.shards: List[Dict] = []   # Per-shard statistics, in input order
+        self.failed: List[Dict] = []   # {"structure_id", "error"} of the structures left out
+        self.wall_s = 0.0
+        self.pools_started = 0
+        self._pool: Optional[ProcessPoolExecutor] = None  # Kept between calls (evaluate_groups(keep_pool=True))
+
+    @property
+    def buffered_zones(self) -> int:
+        """Zones the executor reads ahead of the first unfinished shard"""
+        return BUFFERED_PER_WORKER * max(self.workers, 1) * self.shard_zones
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        self.pools_started += 1
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _record(self, index: int, shard: List[Study], attempts: int, out: Optional[Dict],
+                error: Optional[str] = None) -> List[List[Tuple]]:
+        """Shard statistics; returns the rows of each of its studies (none if it failed)"""
+        zones = sum(len(s.zones) for s in shard)
+        stats = {"shard": index, "first_id": shard[0].id, "structures": len(shard), "zones": zones,
+                 "attempts": attempts}
+        if out is None:
+            stats.update(seconds=0.0, zones_per_s=0.0, pid=None, errors=len(shard), error=error)
+            self.failed.extend({"structure_id": s.id, "error": error} for s in shard)
+            rows = []
+        else:
+            seconds = out["seconds"]
+            stats.update(seconds=seconds, zones_per_s=zones / seconds if seconds > 0 else 0.0,
+                         pid=out["pid"], errors=len(out["errors"]))
+            self.failed.extend(out["errors"])
+            rows, groups, first = out["rows"], [], 0
+            for count in out["counts"]:
+                groups.append(rows[first:first + count])
+                first += count
+        self.shards.append(stats)
+        return groups if out is not None else [[] for _ in shard]
+
+    def evaluate(self, studies: Iterable[Study]) -> Iterator[Dict]:
+        """Per-zone result rows (portfolio.RESULT_COLUMNS) of all studies, in input order"""
+        for rows in self.evaluate_groups(studies):
+            for values in rows:
+                yield dict(zip(RESULT_COLUMNS, values))
+
+    def evaluate_groups(self, studies: Iterable[Study], keep_pool: bool = False) -> Iterator[List[Tuple]]:
+        """
+        study_values() of each study, in input order ([] for a structure left
+        out). keep_pool: leave the pool running for the next call (see close())
+        """
+        start = time.perf_counter()
+        shards = enumerate(make_shards(studies, self.shard_zones), len(self.shards))
+        try:
+            if self.workers == 0:
+                for index, shard in shards:
+                    yield from self._record(index, shard, 1, evaluate_shard(shard))
+            else:
+                yield from self._evaluate_pool(shards, keep_pool)
+        finally:
+            self.wall_s += time.perf_counter() - start
+
+    def close(self):
+        """Stops a pool kept by evaluate_groups(keep_pool=True)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def _evaluate_pool(self, shards: Iterator[Tuple[int, List[Study]]],
+                       keep_pool: bool) -> Iterator[List[Tuple]]:
+        pool, self._pool = self._pool or self._new_pool(), None
+        next_index = len(self.shards)
+        pending: Dict[Future, Tuple[int, List[Study], int, ProcessPoolExecutor]] = {}
+        finished: Dict[int, Tuple] = {}  # index -> (shard, attempts, out, error), waiting for earlier shards
+        exhausted = False
+        broken = False                          # The pool failed a submit and is waiting to be replaced
+        waiting: List[Tuple[int, List[Study], int]] = []  # to submit again on a new pool
+
+        def submit(index: int, shard: List[Study], attempts: int):
+            nonlocal broken
+            try:
+                pending[pool.submit(evaluate_shard, shard)] = (index, shard, attempts, pool)
+            except BrokenProcessPool:
+                broken = True
+                waiting.append((index, shard, attempts))
+
+        try:
+            while True:
+                if broken and not any(used is pool for *_, used in pending.values()):
+                    # No shard of the broken pool left to charge (a worker died idle)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool, broken = self._new_pool(), False
+                if waiting and not broken:
+                    retry = list(waiting)
+                    waiting.clear()
+                    for item in retry:
+                        submit(*item)
+                while (not broken and not exhausted and len(pending) < IN_FLIGHT_PER_WORKER * self.workers
+                       and len(pending) + len(finished) < BUFFERED_PER_WORKER * self.workers):
+                    item = next(shards, None)
+                    if item is None:
+                        exhausted = True
+                    else:
+                        submit(item[0], item[1], 1)
+                while next_index in finished:
+                    yield from self._record(next_index, *finished.pop(next_index))
+                    next_index += 1
+                if not pending:
+                    if exhausted and not finished and not waiting:
+                        break
+                    continue
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, shard, attempts, used_pool = pending.pop(future)
+                    try:
+                        finished[index] = (shard, attempts, future.result(), None)
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            if used_pool is not pool:
+                                # Another shard of this pool was charged for the crash
+                                submit(index, shard, attempts)
+                                continue
+                            # First shard seen failing with this pool: the crash is charged to it,
+                            # the pool's other shards run again with their attempts unchanged
+                            pool.shutdown(wait=False, cancel_futures=True)
+                            pool, broken = self._new_pool(), False
+                        if attempts <= self.retries:
+                            submit(index, shard, attempts + 1)
+                        else:
+                            finished[index] = (shard, attempts, None, f"{type(e).__name__}: {e}")
+        finally:
+            if keep_pool and not pending and not broken:
+                self._pool = pool
+            else:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def summary(self) -> Dict:
+        """Totals of the run and the spread of per-shard throughput (zones/s in a worker)"""
+        zones = sum(s["zones"] for s in self.shards)
+        rates = sorted(s["zones_per_s"] for s in self.shards if s["pid"] is not None)
+        out = {
+            "workers": self.workers, "shards": len(self.shards), "zones": zones,
+            "wall_s": self.wall_s, "zones_per_s": zones / self.wall_s if self.wall_s > 0 else 0.0,
+            "retried_shards": sum(s["attempts"] > 1 for s in self.shards),
+            "failed_shards": sum(s.get("error") is not None for s in self.shards),
+            "failed_structures": len(self.failed), "pools_started": self.pools_started,
+        }
+        if rates:
+            out["shard_zones_per_s"] = {"min": rates[0], "median": rates[len(rates) // 2], "max": rates[-1]}
+        return out
@@ -0,0 +1,422 @@
+"""
+IEC 62305-2 Study Files - versioned JSON and binary columnar formats
+A study file holds one or more studies (geometry, lines, zones; the
+portfolio Study tuple) in one of two variants:
+
+JSON (.json) - readable, the portfolio study dicts in an envelope:
+  {"format": "iec62305-study", "version": 2, "studies": [{"id", "geometry", "lines", "zones"}]}
+
+Binary (.i62s) - columnar, one array per field and record type:
+  header   "<8sIIQ"  magic b"I62305S\\0", version, reserved, manifest size
+  manifest JSON: counts and, per column, dtype, encoding and location
+  columns  64-byte aligned blocks
+Column encodings: "raw" (memory-mapped, no copy), "zlib" (inflated on
+first access) and "const" (a column with one value, kept in the manifest:
+fields left at their default cost nothing). None is stored as NaN, names
+and ids as NUL-separated UTF-8. Since version 2, a table-valued column whose
+values are all options of its table (table_registry) is stored as one uint8
+code per row, with the option values in the manifest ("codes").
+
+Opening a binary file maps it and reads the manifest only, so a portfolio
+of a million zones opens in milliseconds; studies are built on access, and
+zone_table() hands out ZoneTable views over the mapped columns.
+  save("portfolio.i62s", studies, compression="zlib")
+  with StudyFile("portfolio.i62s") as f:
+      study = f[10]                     # Study with ZoneParameters
+      table = f.zone_table(10)          # same zones as a ZoneTable (no copy)
+"""
+import itertools
+import json
+import math
+import mmap
+import struct
+import zlib
+from dataclasses import fields
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from iec_62305 import GeometricParameters, ZoneParameters, LineParameters
+from portfolio import Study, check_zone_names, study_from_dict, study_to_dict
+from table_registry import FIELD_TABLES, NO_CODE, CodedTable
+from zone_table import ZoneTable
+
+FORMAT = "iec62305-study"
+FORMAT_VERSION = 2  # 2: category code columns
+MAGIC = b"I62305S\0"
+BINARY_SUFFIX = ".i62s"
+COMPRESSIONS = (None, "zlib")
+
+_HEADER = struct.Struct("<8sIIQ")
+_ALIGN = 64
+_SEPARATOR = "\0"
+
+
+def _kinds(cls) -> List[Tuple[str, str]]:
+    """[(field, "str" | "bool" | "float" | "optional")] of a parameter class"""
+    out = []
+    for f in fields(cls):
+        annotation = str(f.type)
+        if f.name == "name":
+            kind = "str"
+        elif "bool" in annotation:
+            kind = "bool"
+        elif "Optional" in annotation or f.default is None:
+            kind = "optional"
+        else:
+            kind = "float"
+        out.append((f.name, kind))
+    return out
+
+
+# Record type -> parameter class fields stored as columns
+_SCHEMAS = {
+    "structure": _kinds(GeometricParameters),
+    "line": _kinds(LineParameters),
+    "zone": _kinds(ZoneParameters),
+}
+
+
+# ========================================
+# === JSON VARIANT ===
+# ========================================
+
+def to_json(studies: Iterable[Study]) -> Dict:
+    return {"format": FORMAT, "version": FORMAT_VERSION,
+            "studies": [study_to_dict(_with_zone_list(s)) for s in studies]}
+
+
+def from_json(data: Dict) -> List[Study]:
+    """Studies of a JSON study document; raises ValueError on another format or a newer version"""
+    if not isinstance(data, dict) or data.get("format") != FORMAT:
+        raise ValueError(f"Not an {FORMAT} document")
+    _check_version(data.get("version"))
+    return [study_from_dict(s) for s in data.get("studies", [])]
+
+
+def _check_version(version):
+    if not isinstance(version, int) or not 1 <= version <= FORMAT_VERSION:
+        raise ValueError(f"Unsupported {FORMAT} version {version!r} (this version reads 1..{FORMAT_VERSION})")
+
+
+def _with_zone_list(study: Study) -> Study:
+    if hasattr(study.zones, "to_zones"):
+        return study._replace(zones=study.zones.to_zones())
+    return study
+
+
+# ========================================
+# === BINARY VARIANT: WRITER ===
+# ========================================
+
+def _column_arrays(studies: Sequence[Study]) -> Dict[str, np.ndarray]:
+    """{"record.field": array} of every column; names as lists of str"""
+    columns: Dict[str, object] = {}
+    geoms = [s.geom for s in studies]
+    columns["structure.id"] = [s.id for s in studies]
+    for name, kind in _SCHEMAS["structure"]:
+        columns[f"structure.{name}"] = _values(geoms, name, kind)
+    columns["structure.lat"] = np.array([math.nan if s.site is None else s.site[0] for s in studies])
+    columns["structure.lon"] = np.array([math.nan if s.site is None else s.site[1] for s in studies])
+    columns["structure.n_zones"] = np.array([len(s.zones) for s in studies], dtype="<i8")
+    columns["structure.n_lines"] = np.array([len(s.lines) for s in studies], dtype="<i8")
+
+    lines = [line for s in studies for line in s.lines]
+    for name, kind in _SCHEMAS["line"]:
+        columns[f"line.{name}"] = _values(lines, name, kind)
+
+    # Consecutive studies with zone lists become one table, built column by column over all their zones
+    tables = []
+    for columnar, run in itertools.groupby(studies, key=lambda s: hasattr(s.zones, "columns")):
+        if columnar:
+            tables.extend(s.zones for s in run)
+        else:
+            tables.append(ZoneTable.from_zones([z for s in run for z in s.zones]))
+    columns["zone.name"] = [name for table in tables for name in table.names]
+    for name, kind in _SCHEMAS["zone"]:
+        if kind != "str":
+            parts = [table.column(name) for table in tables]
+            columns[f"zone.{name}"] = (np.concatenate(parts) if parts
+                                       else np.empty(0, dtype=bool if kind == "bool" else "<f8"))
+    return columns
+
+
+def _values(objects: Sequence, name: str, kind: str):
+    if kind == "str":
+        return [getattr(o, name) for o in objects]
+    if kind == "bool":
+        return np.array([getattr(o, name) for o in objects], dtype=bool)
+    if kind == "optional":
+        return np.array([math.nan if getattr(o, name) is None else getattr(o, name) for o in objects], dtype="<f8")
+    return np.array([getattr(o, name) for o in objects], dtype="<f8")
+
+
+# Binary record type -> table-valued fields
+_RECORD_TABLES = {"structure": FIELD_TABLES["geometry"], "line": FIELD_TABLES["line"], "zone": FIELD_TABLES["zone"]}
+
+
+def _encode(values, compression: Optional[str], table: Optional[CodedTable] = None) -> Tuple[Dict, bytes]:
+    """(manifest entry, data block) of one column"""
+    if isinstance(values, list):
+        for text in values:
+            if _SEPARATOR in text:
+                raise ValueError(f"Name {text!r} contains a NUL character")
+        entry, data = {"dtype": "str", "length": len(values)}, _SEPARATOR.join(values).encode("utf-8")
+    else:
+        values = np.ascontiguousarray(values)
+        values = values.astype(values.dtype.newbyteorder("<"), copy=False)
+        entry = {"dtype": values.dtype.str}
+        first = values[:1]
+        if len(values) and (np.array_equal(values, np.broadcast_to(first, values.shape), equal_nan=True)
+                            if values.dtype.kind == "f" else bool((values == first).all())):
+            value = values[0].item()
+            entry.update(encoding="const", value=None if value != value else value, length=len(values))
+            return entry, b""
+        codes = table.codes_for_values(values) if table is not None else None
+        if codes is not None and not (codes == NO_CODE).any():
+            entry.update(table=table.name, codes=table.values.tolist())
+            data = codes.tobytes()
+        else:
+            data = values.tobytes()
+    if compression == "zlib":
+        entry["encoding"] = "zlib"
+        return entry, zlib.compress(data, 1)
+    entry["encoding"] = "raw"
+    return entry, data
+
+
+def dumps_binary(studies: Iterable[Study], compression: Optional[str] = None) -> bytes:
+    """Binary study file contents"""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}'. Options: {COMPRESSIONS}")
+    studies = list(studies)
+    blocks, manifest_columns = [], {}
+    for key, values in _column_arrays(studies).items():
+        record, field = key.split(".")
+        entry, data = _encode(values, compression, _RECORD_TABLES[record].get(field))
+        manifest_columns[key] = entry
+        blocks.append((entry, data))
+    counts = {"studies": len(studies), "lines": sum(len(s.lines) for s in studies),
+              "zones": sum(len(s.zones) for s in studies)}
+
+    # Block offsets depend on the manifest size, which depends on the offsets: fix its width first
+    for entry, data in blocks:
+        entry.setdefault("offset", 0)
+        entry["nbytes"] = len(data)
+    manifest = {"format": FORMAT, "version": FORMAT_VERSION, "compression": compression,
+                "counts": counts, "columns": manifest_columns}
+    width = len(json.dumps(manifest).encode("utf-8")) + 16 * len(blocks) + _ALIGN
+    position = _aligned(_HEADER.size + width)
+    for entry, data in blocks:
+        if entry["encoding"] != "const":
+            entry["offset"] = position
+            position = _aligned(position + len(data))
+    text = json.dumps(manifest).encode("utf-8")
+    text += b" " * (width - len(text))
+
+    out = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, width))
+    out += text
+    for entry, data in blocks:
+        if entry["encoding"] != "const":
+            out += b"\0" * (entry["offset"] - len(out))
+            out += data
+    return bytes(out)
+
+
+def _aligned(position: int) -> int:
+    return -(-position // _ALIGN) * _ALIGN
+
+
+# ========================================
+# === BINARY VARIANT: READER ===
+# ========================================
+
+class StudyFile:
+    """Read-only binary study file: a sequence of Study built on access"""
+
+    def __init__(self, source: Union[str, bytes]):
+        """source: path of a .i62s file (memory-mapped) or its contents"""
+        self._file = self._map = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buffer = np.frombuffer(source, dtype=np.uint8)
+        else:
+            self._file = open(source, "rb")
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty file
+                self._file.close()
+                raise ValueError(f"{source}: not a binary study file") from None
+            self._buffer = np.frombuffer(self._map, dtype=np.uint8)
+        if len(self._buffer) < _HEADER.size:
+            raise ValueError("Not a binary study file")
+        magic, version, _, width = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError("Not a binary study file")
+        _check_version(version)
+        self.version = version
+        manifest = json.loads(self._buffer[_HEADER.size:_HEADER.size + width].tobytes())
+        self.compression = manifest["compression"]
+        self.counts: Dict[str, int] = manifest["counts"]
+        self._entries: Dict[str, Dict] = manifest["columns"]
+        self._columns: Dict[str, object] = {}
+        self._zone_start = self._line_start = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._columns.clear()
+        self._buffer = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:  # Arrays handed out still use the mapping; it closes with them
+                pass
+            self._file.close()
+            self._map = self._file = None
+
+    def column(self, key: str):
+        """Column "record.field" as a read-only array (names and ids: list of str)"""
+        column = self._columns.get(key)
+        if column is None:
+            column = self._columns[key] = self._read(self._entries[key])
+        return column
+
+    def _read(self, entry: Dict):
+        encoding = entry["encoding"]
+        if encoding == "const":
+            value = math.nan if entry["value"] is None else entry["value"]
+            return np.broadcast_to(np.array(value, dtype=entry["dtype"]), (entry["length"],))
+        data = self._buffer[entry["offset"]:entry["offset"] + entry["nbytes"]]
+        if encoding == "zlib":
+            data = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+        if entry["dtype"] == "str":
+            text = data.tobytes().decode("utf-8")
+            return text.split(_SEPARATOR) if text or entry["length"] == 1 else []
+        if "codes" in entry:
+            array = np.array(entry["codes"], dtype=entry["dtype"])[data]
+        else:
+            array = data.view(entry["dtype"])
+        array.flags.writeable = False
+        return array
+
+    def __len__(self) -> int:
+        return self.counts["studies"]
+
+    @property
+    def ids(self) -> List[str]:
+        return self.column("structure.id")
+
+    def _starts(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._zone_start is None:
+            self._zone_start = np.concatenate(([0], np.cumsum(self.column("structure.n_zones"))))
+            self._line_start = np.concatenate(([0], np.cumsum(self.column("structure.n_lines"))))
+        return self._zone_start, self._line_start
+
+    def zone_table(self, index: Optional[int] = None) -> ZoneTable:
+        """Zones of study index (all zones when None) as a ZoneTable over the file columns"""
+        if index is None:
+            start, stop = 0, self.counts["zones"]
+        else:
+            starts = self._starts()[0]
+            index = range(len(self))[index]
+            start, stop = int(starts[index]), int(starts[index + 1])
+        columns = {name: self.column(f"zone.{name}")[start:stop]
+                   for name, kind in _SCHEMAS["zone"] if kind != "str"}
+        return ZoneTable(self.column("zone.name")[start:stop], columns)
+
+    def study(self, index: int, columnar: bool = False) -> Study:
+        """Study index; columnar=True gives its zones as a ZoneTable"""
+        index = range(len(self))[index]
+        zone_starts, line_starts = self._starts()
+        geom = GeometricParameters(**{name: self._value("structure", name, kind, index)
+                                      for name, kind in _SCHEMAS["structure"]})
+        lines = [
+            LineParameters(**{name: self._value("line", name, kind, j) for name, kind in _SCHEMAS["line"]})
+            for j in range(int(line_starts[index]), int(line_starts[index + 1]))
+        ]
+        start, stop = int(zone_starts[index]), int(zone_starts[index + 1])
+        if columnar:
+            zones = self.zone_table(index)
+        else:
+            # Field lists in ZoneParameters order, zipped into positional arguments
+            values = [self._values("zone", name, kind, start, stop) for name, kind in _SCHEMAS["zone"]]
+            zones = [ZoneParameters(*args) for args in zip(*values)]
+        check_zone_names(self.ids[index], zones.names if columnar else (zone.name for zone in zones))
+        lat, lon = self.column("structure.lat")[index], self.column("structure.lon")[index]
+        site = None if lat != lat else (float(lat), float(lon))
+        return Study(self.ids[index], geom, zones, lines, site)
+
+    def _values(self, record: str, name: str, kind: str, start: int, stop: int) -> List:
+        values = self.column(f"{record}.{name}")[start:stop]
+        if kind == "str":
+            return values
+        values = values.tolist()
+        if kind == "optional":
+            return [None if v != v else v for v in values]
+        return values
+
+    def _value(self, record: str, name: str, kind: str, index: int):
+        value = self.column(f"{record}.{name}")[index]
+        if kind == "str":
+            return value
+        if kind == "bool":
+            return bool(value)
+        value = float(value)
+        return None if kind == "optional" and value != value else value
+
+    def __getitem__(self, index: int) -> Study:
+        return self.study(index)
+
+    def __iter__(self) -> Iterator[Study]:
+        return (self.study(k) for k in range(len(self)))
+
+    def __repr__(self):
+        return f"StudyFile({self.counts['studies']} studies, {self.counts['zones']} zones)"
+
+
+# ========================================
+# === FILES ===
+# ========================================
+
+def _detect(path: str) -> str:
+    return "binary" if path.lower().endswith(BINARY_SUFFIX) else "json"
+
+
+def dumps(studies: Iterable[Study], fmt: str = "json", compression: Optional[str] = None) -> bytes:
+    """Study file contents in the "json" or "binary" variant"""
+    if fmt == "binary":
+        return dumps_binary(studies, compression)
+    if fmt == "json":
+        return json.dumps(to_json(studies), ensure_ascii=False, indent=1).encode("utf-8")
+    raise ValueError(f"Unknown study file format '{fmt}'")
+
+
+def loads(data: bytes) -> Sequence[Study]:
+    """Studies of a study file's contents (either variant, detected from the content)"""
+    if data[:len(MAGIC)] == MAGIC:
+        return StudyFile(data)
+    try:
+        document = json.loads(data)
+    except ValueError as e:  # Includes UnicodeDecodeError
+        raise ValueError(f"Not a study file: {e}") from None
+    return from_json(document)
+
+
+def save(path: str, studies: Iterable[Study], fmt: Optional[str] = None, compression: Optional[str] = None):
+    """Write a study file; the variant follows the suffix (.i62s: binary) unless fmt is given"""
+    with open(path, "wb") as f:
+        f.write(dumps(studies, fmt or _detect(path), compression))
+
+
+def load(path: str) -> Sequence[Study]:
+    """Studies of a study file: a StudyFile (memory-mapped) or a list for JSON"""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return StudyFile(path)
+    with open(path, "rb") as f:
+        return loads(f.read())
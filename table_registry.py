@@ -0,0 +1,147 @@
+"""
+IEC 62305-2 Table Registry - integer codes for the options of tables.py
+Every option table of tables.py (the *_VALUES* / *_FACTOR dicts) is compiled
+into a CodedTable: the option labels with a small integer code each (the
+position of the option in its table, so codes stay stable as long as new
+options are appended), a float64 array of the values indexed by code and a
+label index that tolerates case, accent, spacing and small spelling
+differences:
+  pb = TABLES["PB_VALUES"]
+  pb.code("lps clase ii")        -> code of "LPS Clase II"
+  pb.gather(codes)               -> values of a uint8 code array
+  FIELD_TABLES["zone"]["pspd_w"] -> TABLES["PSPD_VALUES"]
+Codes fit in one byte (CODE_DTYPE); NO_CODE marks a value that is not an
+option of the table. Label lookups are plain Python: NumPy is imported the
+first time an array method (values, encode, gather, codes_for_values) is used.
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import tables
+
+CODE_DTYPE = "uint8"
+NO_CODE = 255
+FUZZY_CUTOFF = 0.85  # difflib similarity needed for a misspelt label
+
+_PUNCTUATION_SPACE = re.compile(r"\s*([/(),;:<>=+-])\s*")
+
+
+def normalize_label(label: str) -> str:
+    """Case-, accent- and spacing-insensitive form of a label"""
+    text = unicodedata.normalize("NFKD", str(label))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = " ".join(text.casefold().split())
+    return _PUNCTUATION_SPACE.sub(r"\1", text)
+
+
+class CodedTable:
+    """Options of one table with integer codes, value array and label index"""
+    __slots__ = ("name", "labels", "floats", "_codes", "_normalized", "_fuzzy", "_values", "_sorted")
+
+    def __init__(self, name: str, options: Dict[str, float]):
+        if len(options) >= NO_CODE:
+            raise ValueError(f"{name}: {len(options)} options do not fit in a {CODE_DTYPE} code")
+        self.name = name
+        self.labels = tuple(options)
+        self.floats = tuple(float(v) for v in options.values())
+        self._codes = {label: code for code, label in enumerate(self.labels)}
+        self._normalized: Dict[str, int] = {}
+        for code, label in enumerate(self.labels):
+            key = normalize_label(label)
+            if key in self._normalized:
+                raise ValueError(f"{name}: labels '{self.labels[self._normalized[key]]}' and '{label}' "
+                                 f"only differ in case, accents or spacing")
+            self._normalized[key] = code
+        self._fuzzy: Dict[str, int] = {}
+        self._values = self._sorted = None
+
+    @property
+    def values(self):
+        """Read-only float64 array of the option values, indexed by code"""
+        if self._values is None:
+            import numpy as np
+            values = np.array(self.floats, dtype=np.float64)
+            values.flags.writeable = False
+            self._values = values
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def code(self, label: str) -> int:
+        """Code of a label: exact, then normalized, then closest spelling; ValueError if none"""
+        code = self._codes.get(label)
+        if code is not None:
+            return code
+        key = normalize_label(label)
+        code = self._normalized.get(key, self._fuzzy.get(key))
+        if code is not None:
+            return code
+        import difflib
+        matches = difflib.get_close_matches(key, list(self._normalized), n=2, cutoff=FUZZY_CUTOFF)
+        if len(matches) == 1:
+            code = self._fuzzy[key] = self._normalized[matches[0]]
+            return code
+        hint = "ambiguous" if matches else "unknown"
+        raise ValueError(f"{hint} option '{label}'. Options: {list(self.labels)}")
+
+    def value(self, label: str) -> float:
+        return self.floats[self.code(label)]
+
+    def label(self, code: int) -> str:
+        return self.labels[code]
+
+    def encode(self, labels: Iterable[str]):
+        """Code array of labels"""
+        import numpy as np
+        return np.array([self.code(label) for label in labels], dtype=CODE_DTYPE)
+
+    def decode(self, codes: Iterable[int]) -> List[str]:
+        return [self.labels[code] for code in codes]
+
+    def gather(self, codes):
+        """Values of a code array"""
+        import numpy as np
+        return self.values[np.asarray(codes, dtype=np.intp)]
+
+    def codes_for_values(self, values):
+        """Code of each value (first option with exactly that value), NO_CODE where none"""
+        import numpy as np
+        if self._sorted is None:
+            order = np.argsort(self.values, kind="stable")
+            self._sorted = (self.values[order], order.astype(CODE_DTYPE))
+        sorted_values, sorted_codes = self._sorted
+        values = np.asarray(values, dtype=np.float64)
+        pos = np.clip(np.searchsorted(sorted_values, values), 0, len(sorted_values) - 1)
+        found = sorted_values[pos] == values
+        return np.where(found, sorted_codes[pos], NO_CODE).astype(CODE_DTYPE)
+
+    def __repr__(self):
+        return f"CodedTable({self.name}, {len(self)} options)"
+
+
+def _option_tables() -> Dict[str, CodedTable]:
+    compiled = {}
+    for name, options in vars(tables).items():
+        if (("_VALUES" in name or "_FACTOR" in name) and not name.startswith("DEFAULT_")
+                and isinstance(options, dict)):
+            compiled[name] = CodedTable(name, options)
+    return compiled
+
+
+TABLES: Dict[str, CodedTable] = _option_tables()
+
+_BY_OPTIONS = {id(getattr(tables, name)): table for name, table in TABLES.items()}
+
+# Record type -> field -> table, from the field mappings of tables.py
+FIELD_TABLES: Dict[str, Dict[str, CodedTable]] = {
+    record: {field: _BY_OPTIONS[id(options)] for field, options in mapping.items()}
+    for record, mapping in (("geometry", tables.GEOMETRY_TABLES), ("line", tables.LINE_TABLES),
+                            ("zone", tables.ZONE_TABLES))
+}
+
+
+def table_for(record: str, field: str) -> Optional[CodedTable]:
+    """Table of a geometry / line / zone field, None for free numeric fields"""
+    return FIELD_TABLES[record].get(field)
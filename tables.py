@@ -233,3 +233,36 @@ DEFAULT_ECONOMIC_VALUES = {
     "cs": 75,     # Valor de los sistemas internos incluidas sus actividades de la zona
     "ct": 500,    # Valor total de la estructura
 }
+
+# --- Field -> Table mapping (for inputs given as table labels) ---
+
+GEOMETRY_TABLES = {
+    "Cd": CD_FACTOR,
+}
+
+LINE_TABLES = {
+    "ci": CI_FACTOR,
+    "ce": CE_LINE_FACTOR,
+    "ct": CT_FACTOR,
+    "Cdj": CD_FACTOR,
+}
+
+# Note: labels for pli are read from the power line table (PLI_VALUES_LP);
+# give a numeric value for communication lines.
+ZONE_TABLES = {
+    "pta": PTA_VALUES, "pb": PB_VALUES,
+    "rt": RT_VALUES, "rt_u": RT_VALUES, "rt_r4": RT_VALUES,
+    "lt": LT_VALUES, "lt_u": LT_VALUES, "lt_r4": LT_VALUES,
+    "rp": RP_VALUES, "rp_r4": RP_VALUES,
+    "rf": RF_VALUES, "rf_r4": RF_VALUES,
+    "hz": HZ_VALUES, "lf1": LF1_VALUES, "lo1": LO1_VALUES,
+    "pspd": PSPD_VALUES, "pspd_w": PSPD_VALUES, "pspd_z": PSPD_VALUES,
+    "cld": CLD_VALUES, "cld_u": CLD_VALUES, "cld_v": CLD_VALUES, "cld_w": CLD_VALUES, "cli": CLD_VALUES,
+    "ks3": KS3_VALUES, "ks3_r2": KS3_VALUES,
+    "ptu": PTU_VALUES,
+    "peb": PEB_VALUES, "peb_v": PEB_VALUES,
+    "pld": PLD_VALUES, "pld_v": PLD_VALUES, "pld_w": PLD_VALUES,
+    "pli": PLI_VALUES_LP,
+    "lf2": LF2_VALUES, "lo2": LO2_VALUES,
+    "lf4": LF4_VALUES, "lo4": LO4_VALUES,
+}
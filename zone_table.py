@@ -0,0 +1,138 @@
+"""
+IEC 62305-2 Zone Table - columnar storage of ZoneParameters
+Every ZoneParameters field is one typed array (float64, or bool for the
+condition flags; None is stored as NaN), so a zone costs a few hundred bytes
+instead of a Python object per field. Indexing hands out ZoneRow views that
+read the columns on attribute access and behave like ZoneParameters for the
+engine:
+  table = ZoneTable.from_zones(zones)
+  EngineIEC62305(geom, table, lines).compute_all_risks()
+Slicing (table[a:b]) shares the column memory. The columns use the same
+names and None/NaN convention as BatchEngineIEC62305, so table.columns can
+be passed to it directly.
+"""
+import math
+from dataclasses import MISSING, fields
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from iec_62305 import ZoneParameters
+
+FIELDS = [f.name for f in fields(ZoneParameters) if f.name != "name"]
+FLAG_FIELDS = [f.name for f in fields(ZoneParameters) if isinstance(f.default, bool)]
+OPTIONAL_FIELDS = [f.name for f in fields(ZoneParameters) if f.name != "name" and f.default is None]
+DEFAULTS = {
+    f.name: (math.nan if f.default is None else f.default)
+    for f in fields(ZoneParameters) if f.default is not MISSING
+}
+
+
+def _make_getter(name: str):
+    if name in FLAG_FIELDS:
+        def get(self):
+            return bool(self._columns[name][self._index])
+    elif name in OPTIONAL_FIELDS:
+        def get(self):
+            value = self._columns[name][self._index]
+            return None if value != value else float(value)
+    else:
+        def get(self):
+            return float(self._columns[name][self._index])
+    return property(get)
+
+
+class ZoneRow:
+    """Read-only view of one zone of a ZoneTable with the ZoneParameters attributes"""
+    __slots__ = ("_columns", "_index", "name")
+
+    def __init__(self, columns: Dict[str, np.ndarray], index: int, name: str):
+        self._columns = columns
+        self._index = index
+        self.name = name
+
+    def to_parameters(self) -> ZoneParameters:
+        return ZoneParameters(self.name, **{name: getattr(self, name) for name in FIELDS})
+
+    def __repr__(self):
+        return f"ZoneRow({self.name!r}, index={self._index})"
+
+
+for _name in FIELDS:
+    setattr(ZoneRow, _name, _make_getter(_name))
+
+
+class ZoneTable:
+    """Zones of a study as typed array columns, indexed by zone"""
+
+    def __init__(self, names: Sequence[str], columns: Optional[Dict[str, object]] = None):
+        """
+        names: zone names (one per zone)
+        columns: {field: array or scalar}; missing fields take the
+            ZoneParameters default, NaN in an optional field means None
+        """
+        self.names = list(names)
+        n = len(self.names)
+        columns = columns or {}
+        unknown = set(columns) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown zone fields: {sorted(unknown)}")
+        self._columns: Dict[str, np.ndarray] = {}
+        for name in FIELDS:
+            dtype = bool if name in FLAG_FIELDS else np.float64
+            value = columns.get(name, DEFAULTS[name])
+            if value is None:
+                value = math.nan
+            column = np.asarray(value, dtype=dtype)
+            if column.ndim == 0:
+                column = np.full(n, column, dtype=dtype)
+            if column.shape != (n,):
+                raise ValueError(f"Column '{name}' has shape {column.shape}, expected ({n},)")
+            column = column.view()
+            column.flags.writeable = False
+            self._columns[name] = column
+
+    @classmethod
+    def from_zones(cls, zones: Sequence[ZoneParameters]) -> "ZoneTable":
+        names = [z.name for z in zones]
+        columns = {
+            name: [math.nan if getattr(z, name) is None else getattr(z, name) for z in zones]
+            for name in FIELDS
+        }
+        return cls(names, columns)
+
+    def to_zones(self) -> List[ZoneParameters]:
+        return [row.to_parameters() for row in self]
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        """{field: read-only array} (BatchEngineIEC62305 zone layout)"""
+        return dict(self._columns)
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns"""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[ZoneRow]:
+        columns = self._columns
+        return (ZoneRow(columns, i, name) for i, name in enumerate(self.names))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            # Basic slicing of numpy arrays returns views: no column is copied
+            table = ZoneTable.__new__(ZoneTable)
+            table.names = self.names[key]
+            table._columns = {name: column[key] for name, column in self._columns.items()}
+            return table
+        index = range(len(self.names))[key]
+        return ZoneRow(self._columns, index, self.names[index])
+
+    def __repr__(self):
+        return f"ZoneTable({len(self)} zones)"